@@ -1,21 +1,58 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.db.models import Q
 from django_summernote.admin import SummernoteModelAdmin
+
+from core.changelist import EstimatedCountPaginator, case_insensitive_prefix_search
 from .models import Post, Like
 
 
+def title_prefix(term):
+    """Posts whose title starts with term, in any case, matched on the LOWER(title) index"""
+    return case_insensitive_prefix_search('title', term)
+
+
+def user_named(term):
+    return User.objects.filter(username=term).values('pk')
+
+
 @admin.register(Post)
 class PostAdmin(SummernoteModelAdmin):
-    list_display = ['title', 'author', 'category', 'status', 'created_at']
+    list_display = ['title', 'author', 'category', 'status', 'like_count', 'created_at']
     list_filter = ['status', 'category', 'created_at']
-    search_fields = ['title', 'content', 'author__username']
+    # Matched against indexed columns only, see get_search_results
+    search_fields = ['title', 'author__username']
+    search_help_text = 'Title prefix or exact author username'
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = ['created_at', 'updated_at']
     summernote_fields = ('content',)
-    list_editable = ['status']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['publish', 'unpublish']
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('author')
+        return qs.select_related('author').with_like_count()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(title_prefix(term) | Q(author__in=user_named(term))), False
+
+    @admin.display(description='Likes', ordering='like_count')
+    def like_count(self, obj):
+        return obj.like_count
+
+    @admin.action(description='Publish selected posts')
+    def publish(self, request, queryset):
+        changed = queryset.set_status('published')
+        self.message_user(request, f'Published {changed} posts.', messages.SUCCESS)
+
+    @admin.action(description='Unpublish selected posts (back to draft)')
+    def unpublish(self, request, queryset):
+        changed = queryset.set_status('draft')
+        self.message_user(request, f'Unpublished {changed} posts.', messages.SUCCESS)
 
 
 @admin.register(Like)
@@ -23,8 +60,20 @@ class LikeAdmin(admin.ModelAdmin):
     list_display = ['user', 'post', 'created_at']
     list_filter = ['created_at']
     search_fields = ['user__username', 'post__title']
+    search_help_text = 'Exact username, or post title prefix'
     readonly_fields = ['created_at']
+    # Id order matches creation order and is served by the primary key
+    ordering = ['-pk']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('user', 'post')
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        posts = Post.objects.filter(title_prefix(term)).values('pk')
+        return queryset.filter(Q(user__in=user_named(term)) | Q(post__in=posts)), False
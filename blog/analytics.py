@@ -0,0 +1,156 @@
+"""
+Buffered page-view counting.
+
+Hits are aggregated in memory per worker process, deduplicated per visitor
+within VIEW_COUNT_DEDUP_SECONDS, and flushed as batched increments into the
+hourly and daily rollup tables. A flush is due every
+VIEW_COUNT_FLUSH_SECONDS (or sooner once VIEW_COUNT_FLUSH_SIZE distinct
+counters are pending); the request that finds it due starts it on a
+background thread rather than waiting for it. The process also flushes when
+it exits. A flush that fails (e.g. the database is locked) puts its counts
+back into the buffer for the next one.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Post, PostViewDaily, PostViewHourly
+
+logger = logging.getLogger(__name__)
+
+# Keys per UPDATE statement when applying increments
+FLUSH_BATCH_SIZE = 200
+
+
+def get_visitor_key(request):
+    """Identify a visitor by user, session or client IP, in that order"""
+    if request.user.is_authenticated:
+        return f"u:{request.user.pk}"
+    session_key = getattr(request, 'session', None) and request.session.session_key
+    if session_key:
+        return f"s:{session_key}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+class ViewCounter:
+    """Thread-safe in-memory buffer of per-hour view increments"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._seen = {}
+        self._last_flush = time.monotonic()
+        self._flushing = False
+
+    def record(self, post_id, visitor_key):
+        """Count a hit unless the same visitor viewed the post within the dedup window"""
+        dedup_seconds = getattr(settings, 'VIEW_COUNT_DEDUP_SECONDS', 1800)
+        flush_seconds = getattr(settings, 'VIEW_COUNT_FLUSH_SECONDS', 60)
+        flush_size = getattr(settings, 'VIEW_COUNT_FLUSH_SIZE', 500)
+        now = time.monotonic()
+
+        with self._lock:
+            seen_key = (post_id, visitor_key)
+            last_seen = self._seen.get(seen_key)
+            if last_seen is not None and now - last_seen < dedup_seconds:
+                return False
+            self._seen[seen_key] = now
+
+            hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+            self._pending[(post_id, hour)] += 1
+
+            due = now - self._last_flush >= flush_seconds or len(self._pending) >= flush_size
+
+        if due:
+            self.flush_in_background()
+        return True
+
+    def flush_in_background(self):
+        """Start a flush on a worker thread, unless one is already running"""
+        with self._lock:
+            if self._flushing:
+                return
+            self._flushing = True
+        threading.Thread(target=self._background_flush, name='view-counter-flush', daemon=True).start()
+
+    def _background_flush(self):
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flushing = False
+            # The worker thread's own connection
+            connection.close()
+
+    def flush(self):
+        """Write pending increments to the rollup tables; returns the number of views written"""
+        dedup_seconds = getattr(settings, 'VIEW_COUNT_DEDUP_SECONDS', 1800)
+        now = time.monotonic()
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            self._last_flush = now
+            self._seen = {key: seen for key, seen in self._seen.items() if now - seen < dedup_seconds}
+
+        if not pending:
+            return 0
+
+        daily = defaultdict(int)
+        for (post_id, hour), count in pending.items():
+            daily[(post_id, hour.date())] += count
+
+        try:
+            # Posts deleted since the hit was recorded would violate the foreign key
+            live_ids = set(Post.objects.filter(id__in={post_id for post_id, _ in pending}).values_list('id', flat=True))
+
+            with transaction.atomic():
+                _apply_increments(PostViewHourly, 'hour', pending, live_ids)
+                _apply_increments(PostViewDaily, 'day', daily, live_ids)
+        except DatabaseError:
+            # Nothing was written: keep the counts for the next flush
+            with self._lock:
+                for key, count in pending.items():
+                    self._pending[key] += count
+            logger.exception('Could not write %s buffered page views; retrying at the next flush', sum(pending.values()))
+            return 0
+
+        return sum(count for (post_id, _), count in pending.items() if post_id in live_ids)
+
+
+def _apply_increments(model, period_field, increments, live_ids):
+    """Add counts to rollup rows: insert missing rows, then one UPDATE per batch"""
+    items = [(key, count) for key, count in increments.items() if key[0] in live_ids]
+    model.objects.bulk_create(
+        [model(post_id=post_id, **{period_field: period}, views=0) for (post_id, period), _ in items],
+        ignore_conflicts=True,
+        batch_size=FLUSH_BATCH_SIZE,
+    )
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        matches = [Q(post_id=post_id, **{period_field: period}) for (post_id, period), _ in batch]
+        increment = Case(
+            *[When(match, then=Value(count)) for match, (_, count) in zip(matches, batch)],
+            default=Value(0),
+        )
+        model.objects.filter(reduce(or_, matches)).update(views=F('views') + increment)
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
+
+
+def record_view(request, post):
+    """Record a page view of a published post"""
+    # Warm-up and pre-render requests are not reader traffic
+    if post.status != 'published' or request.META.get('HTTP_X_WARMUP') or request.META.get('HTTP_X_PRERENDER'):
+        return False
+    return view_counter.record(post.pk, get_visitor_key(request))
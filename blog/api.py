@@ -0,0 +1,211 @@
+"""
+Read-only JSON API over published posts and their authors.
+
+Rows are read with values() and turned into dicts directly, so a page of
+posts costs one query and no model instances. Clients choose columns with
+?fields=, page with the opaque ?cursor= from the previous response, and can
+revalidate with If-None-Match against the ETag of every response.
+"""
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, set_response_etag
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Post, excerpt_from, reading_time_from
+
+# Field name -> database columns it is built from
+POST_FIELDS = {
+    'id': ('id',),
+    'title': ('title',),
+    'slug': ('slug',),
+    'url': ('slug',),
+    'category': ('category',),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+    'content': ('content',),
+    'excerpt': ('content',),
+    'reading_time': ('content',),
+    'image': ('image',),
+    'author': ('author__username', 'author__first_name', 'author__last_name'),
+    'like_count': (),
+}
+
+DEFAULT_LIST_FIELDS = ('id', 'title', 'slug', 'url', 'category', 'excerpt', 'image', 'author', 'created_at', 'like_count')
+DEFAULT_DETAIL_FIELDS = DEFAULT_LIST_FIELDS + ('content', 'reading_time', 'updated_at')
+
+
+class ApiError(Exception):
+    pass
+
+
+def _author(row):
+    return {
+        'username': row['author__username'],
+        'name': f"{row['author__first_name']} {row['author__last_name']}".strip(),
+        'url': reverse('api_author', args=[row['author__username']]),
+    }
+
+
+# Field name -> function building its value from a values() row
+POST_RENDERERS = {
+    'url': lambda row: reverse('post_detail', args=[row['slug']]),
+    'created_at': lambda row: row['created_at'].isoformat(),
+    'updated_at': lambda row: row['updated_at'].isoformat(),
+    'excerpt': lambda row: excerpt_from(row['content']),
+    'reading_time': lambda row: reading_time_from(row['content']),
+    'image': lambda row: default_storage.url(row['image']) if row['image'] else None,
+    'author': _author,
+}
+
+
+def parse_fields(request, default):
+    value = request.GET.get('fields')
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def select_fields(queryset, fields, extra=()):
+    """Restrict a Post queryset to the columns needed to render fields"""
+    columns = list(extra)
+    for field in fields:
+        columns.extend(POST_FIELDS[field])
+    if 'like_count' in fields:
+        queryset = queryset.with_like_count()
+        columns.append('like_count')
+    return queryset.values(*dict.fromkeys(columns))
+
+
+def render_post(row, fields):
+    return {
+        field: POST_RENDERERS[field](row) if field in POST_RENDERERS else row[field]
+        for field in fields
+    }
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['created_at'].isoformat(), row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk = json.loads(raw)
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError, binascii.Error):
+        created_at = None
+    if created_at is None or not isinstance(pk, int):
+        raise ApiError('Invalid cursor.')
+    return created_at, pk
+
+
+def api_response(request, data, status=200):
+    """JSON response with an ETag, answered with 304 when the client copy is current"""
+    response = JsonResponse(data, status=status)
+    if status != 200:
+        return response
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def error_response(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+@require_GET
+def post_list_api_view(request):
+    """Published posts, newest first, paged by cursor"""
+    try:
+        fields = parse_fields(request, DEFAULT_LIST_FIELDS)
+        limit = min(int(request.GET.get('limit', 20)), getattr(settings, 'API_MAX_PAGE_SIZE', 100))
+        if limit < 1:
+            raise ValueError
+    except ApiError as e:
+        return error_response(str(e))
+    except ValueError:
+        return error_response('limit must be a positive integer.')
+
+    posts = Post.objects.filter(status='published')
+
+    category = request.GET.get('category')
+    if category:
+        posts = posts.filter(category=category)
+
+    author = request.GET.get('author')
+    if author:
+        posts = posts.filter(author__username=author)
+
+    # Keyset pagination: continue strictly after the last (created_at, id) seen
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            created_at, pk = decode_cursor(cursor)
+        except ApiError as e:
+            return error_response(str(e))
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+    posts = select_fields(posts.order_by('-created_at', '-id'), fields, extra=('id', 'created_at'))
+    rows = list(posts[:limit + 1])
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    data = {
+        'results': [render_post(row, fields) for row in rows[:limit]],
+        'next_cursor': next_cursor,
+    }
+
+    return api_response(request, data)
+
+
+@require_GET
+def post_detail_api_view(request, slug):
+    """One published post"""
+    try:
+        fields = parse_fields(request, DEFAULT_DETAIL_FIELDS)
+    except ApiError as e:
+        return error_response(str(e))
+
+    try:
+        row = select_fields(Post.objects.filter(status='published', slug=slug), fields).get()
+    except Post.DoesNotExist:
+        return error_response('Post not found.', status=404)
+
+    return api_response(request, render_post(row, fields))
+
+
+@require_GET
+def author_api_view(request, username):
+    """Public profile of an author with their published post count"""
+    try:
+        row = User.objects.filter(username=username).values(
+            'username', 'first_name', 'last_name', 'date_joined',
+            'profile__bio', 'profile__profile_image', 'profile__published_posts',
+        ).get()
+    except User.DoesNotExist:
+        return error_response('Author not found.', status=404)
+
+    data = {
+        'username': row['username'],
+        'name': f"{row['first_name']} {row['last_name']}".strip(),
+        'bio': row['profile__bio'] or '',
+        'profile_image': default_storage.url(row['profile__profile_image']) if row['profile__profile_image'] else None,
+        'date_joined': row['date_joined'].isoformat(),
+        'post_count': row['profile__published_posts'],
+        'posts_url': f"{reverse('api_post_list')}?{urlencode({'author': row['username']})}",
+    }
+
+    return api_response(request, data)
@@ -0,0 +1,129 @@
+"""
+Date archives and the category/month sidebar.
+
+Post counts per (status, category, month) live in PostAggregate and are
+adjusted incrementally from Post save/delete signals, so the sidebar is one
+small query (or a cache hit) instead of GROUP BY queries over Post. The
+rebuild_post_aggregates command recomputes the table if it ever drifts.
+"""
+from collections import Counter, OrderedDict
+from datetime import date, datetime, time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.coherence import invalidate_cache
+from .models import Post, PostAggregate
+
+SIDEBAR_CACHE_KEY = 'blog:sidebar'
+SIDEBAR_CACHE_SECONDS = 60 * 60
+
+
+def month_of(created_at):
+    return timezone.localtime(created_at).date().replace(day=1)
+
+
+def month_bounds(year, month):
+    """Aware datetimes delimiting a calendar month (or a whole year when month is None)"""
+    start = date(year, month or 1, 1)
+    if month is None or month == 12:
+        end = date(year + 1, 1, 1)
+    else:
+        end = date(year, month + 1, 1)
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(end, time.min)),
+    )
+
+
+def adjust(status, category, created_at, delta):
+    """Add delta to one aggregate row, creating it when missing"""
+    key = {'status': status, 'category': category, 'month': month_of(created_at)}
+    with transaction.atomic():
+        PostAggregate.objects.bulk_create([PostAggregate(**key, count=0)], ignore_conflicts=True)
+        PostAggregate.objects.filter(**key).update(count=F('count') + delta)
+    invalidate_cache(SIDEBAR_CACHE_KEY)
+
+
+def post_saved(post, previous, created):
+    """Move a post's contribution when its status, category or month changed"""
+    current = (post.status, post.category, month_of(post.created_at))
+    if previous and not created:
+        before = (previous['status'], previous['category'], month_of(previous['created_at']))
+        if before == current:
+            return
+        adjust(previous['status'], previous['category'], previous['created_at'], -1)
+    adjust(post.status, post.category, post.created_at, 1)
+
+
+def post_deleted(post):
+    adjust(post.status, post.category, post.created_at, -1)
+
+
+def posts_status_changed(changes, status):
+    """Move the contributions of posts whose status was changed in bulk"""
+    deltas = Counter()
+    for change in changes:
+        month = month_of(change['created_at'])
+        deltas[(change['status'], change['category'], month)] -= 1
+        deltas[(status, change['category'], month)] += 1
+    keys = [key for key, delta in deltas.items() if delta]
+    with transaction.atomic():
+        PostAggregate.objects.bulk_create(
+            [PostAggregate(status=s, category=category, month=month, count=0) for s, category, month in keys],
+            ignore_conflicts=True,
+        )
+        for s, category, month in keys:
+            PostAggregate.objects.filter(status=s, category=category, month=month).update(
+                count=F('count') + deltas[(s, category, month)]
+            )
+    invalidate_cache(SIDEBAR_CACHE_KEY)
+
+
+def rebuild():
+    """Recompute every aggregate from the Post table; returns the number of rows written"""
+    rows = (
+        Post.objects.order_by()
+        .annotate(month=TruncMonth('created_at'))
+        .values('status', 'category', 'month')
+        .annotate(count=Count('id'))
+    )
+    aggregates = [
+        PostAggregate(
+            status=row['status'],
+            category=row['category'],
+            month=row['month'].date() if hasattr(row['month'], 'date') else row['month'],
+            count=row['count'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        PostAggregate.objects.all().delete()
+        PostAggregate.objects.bulk_create(aggregates, batch_size=500)
+    invalidate_cache(SIDEBAR_CACHE_KEY)
+    return len(aggregates)
+
+
+def _build_sidebar():
+    categories = OrderedDict((value, {'value': value, 'label': label, 'count': 0}) for value, label in Post.CATEGORY_CHOICES)
+    months = OrderedDict()
+    for category, month, count in (
+        PostAggregate.objects.filter(status='published', count__gt=0)
+        .order_by('-month')
+        .values_list('category', 'month', 'count')
+    ):
+        categories[category]['count'] += count
+        months.setdefault(month, 0)
+        months[month] += count
+    return {
+        'categories': list(categories.values()),
+        'months': [{'month': month, 'count': count} for month, count in months.items()],
+    }
+
+
+def get_sidebar():
+    """Published post counts per category and per month, newest month first"""
+    return cache.get_or_set(SIDEBAR_CACHE_KEY, _build_sidebar, SIDEBAR_CACHE_SECONDS)
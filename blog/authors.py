@@ -0,0 +1,68 @@
+"""
+Per-author statistics shown on profile pages.
+
+Each UserProfile caches its author's published post count, the likes those
+posts received and the date of the latest one. A like or unlike adjusts the
+total with one UPDATE. Publishing, unpublishing, deleting or reassigning a
+post recomputes the affected authors' three values in one UPDATE, from the
+author and like indexes. The rebuild_author_stats command recomputes every
+profile if the values ever drift (e.g. after bulk-creating likes).
+"""
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import UserProfile
+from .models import Like, Post
+
+
+def stats_expressions():
+    """Subqueries computing a profile's stats from its user's published posts"""
+    published = Post.objects.filter(author=OuterRef('user_id'), status='published').order_by().values('author')
+    likes = (
+        Like.objects.filter(post__author=OuterRef('user_id'), post__status='published')
+        .order_by().values('post__author')
+    )
+    return {
+        'published_posts': Coalesce(Subquery(published.annotate(count=Count('pk')).values('count')), 0),
+        'likes_received': Coalesce(Subquery(likes.annotate(count=Count('pk')).values('count')), 0),
+        'latest_post_at': Subquery(published.annotate(latest=Max('created_at')).values('latest')),
+    }
+
+
+def refresh(author_ids=None):
+    """Recompute the stats of these authors (all of them when None); returns the number of profiles updated"""
+    profiles = UserProfile.objects.all()
+    if author_ids is not None:
+        profiles = profiles.filter(user_id__in=set(author_ids))
+    return profiles.update(**stats_expressions())
+
+
+def post_saved(post, previous, created):
+    """Refresh the authors whose published posts changed"""
+    was_published = bool(previous) and previous['status'] == 'published'
+    if post.status != 'published' and not was_published:
+        return
+    if was_published and post.status == 'published' and (previous['author_id'], previous['created_at']) == (post.author_id, post.created_at):
+        # An edit that changes neither who published it nor when
+        return
+    refresh({post.author_id, previous['author_id']} if previous else {post.author_id})
+
+
+def post_deleted(post):
+    # Its likes are gone by now, so the refresh sees the totals without it. The instance's
+    # status may be out of date (e.g. after a queryset set_status), so it is not trusted.
+    refresh([post.author_id])
+
+
+def posts_status_changed(changes):
+    refresh(change['author_id'] for change in changes)
+
+
+def like_changed(like, delta):
+    """Add delta to the likes received by the author of the liked post, if it is published"""
+    author = Post.objects.filter(pk=like.post_id, status='published').values('author')
+    profiles = UserProfile.objects.filter(user_id=Subquery(author))
+    if delta < 0:
+        # Never below zero, even if the total drifted
+        profiles = profiles.filter(likes_received__gte=-delta)
+    profiles.update(likes_received=F('likes_received') + delta)
@@ -1,11 +1,20 @@
 from django import forms
+from django.utils import timezone
 from django_summernote.widgets import SummernoteWidget
+from core.models import UploadSession
 from .models import Post
 
 
 class PostForm(forms.ModelForm):
     """Form for creating and editing blog posts with Summernote editor"""
 
+    # Set by the page's script when the image was sent through the chunked upload endpoints
+    image_upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+
     class Meta:
         model = Post
         fields = ['title', 'category', 'created_at', 'content', 'image', 'status']
@@ -44,7 +53,31 @@ class PostForm(forms.ModelForm):
             'status': 'Status *',
         }
         help_texts = {
-            'created_at': 'Select the date and time for this post.',
+            'created_at': 'Select the date and time for this post. Scheduled posts go live at this time.',
             'content': 'Use the rich text editor to format your content.',
-            'status': 'Draft posts are only visible to you. Published posts are visible to everyone and will trigger newsletter notifications.',
+            'status': 'Draft posts are only visible to you. Published posts are visible to everyone and will trigger newsletter notifications. Scheduled posts are published, and notified, at their publication date.',
         }
+
+    def clean_image_upload(self):
+        upload_id = self.cleaned_data.get('image_upload')
+        if upload_id is None:
+            return None
+        upload = UploadSession.objects.filter(
+            pk=upload_id,
+            user=self.user,
+            kind=UploadSession.KIND_IMAGE,
+        ).exclude(stored_name='').first()
+        if upload is None:
+            raise forms.ValidationError('The image upload did not finish; choose the image again.')
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = cleaned_data.get('image_upload')
+        if upload is not None:
+            # The verified file is already in storage; the model field just points at it
+            cleaned_data['image'] = upload.stored_name
+        created_at = cleaned_data.get('created_at')
+        if cleaned_data.get('status') == 'scheduled' and created_at and created_at <= timezone.now():
+            self.add_error('created_at', 'Choose a future date to schedule this post, or publish it now.')
+        return cleaned_data
@@ -0,0 +1,74 @@
+import itertools
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from blog import suggest
+
+
+class Command(BaseCommand):
+    help = 'Build the search-suggestion index over synthetic titles and report its size and lookup latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100000)
+        parser.add_argument('--authors', type=int, default=500)
+        parser.add_argument('--lookups', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Zipf-like vocabulary: a few very common words, a long tail of rare ones
+        vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10))) for _ in range(30000)]
+        weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+        now = datetime.now(timezone.utc)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        entries = suggest.category_entries()
+        author_posts = Counter()
+        for post_id in range(1, options['titles'] + 1):
+            title = ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(3, 9))).capitalize()
+            username = f'author{post_id % options["authors"]}'
+            entries.append(suggest.post_entry(post_id, title, f'post-{post_id}', now - timedelta(minutes=post_id), username))
+            author_posts[username] += 1
+        entries += [suggest.author_entry(username, '', '') for username in author_posts]
+        built = time.perf_counter()
+        index = suggest.Index(suggest.Snapshot(entries), author_posts)
+        build_seconds = time.perf_counter() - built
+        del entries
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        generate_seconds = built - start
+
+        queries = []
+        for _ in range(options['lookups']):
+            word = rng.choices(vocabulary, cum_weights=weights)[0]
+            prefix = word[:rng.randint(2, len(word))]
+            if rng.random() < 0.3:
+                prefix = f'{rng.choices(vocabulary, cum_weights=weights)[0]} {prefix}'
+            queries.append(prefix)
+
+        timings = []
+        found = 0
+        for query in queries:
+            start = time.perf_counter()
+            found += bool(index.search(query, 8))
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+
+        self.stdout.write(
+            f"{options['titles']} titles, {len(index.snapshot.words)} distinct words, "
+            f"{len(index.snapshot.postings)} postings"
+        )
+        self.stdout.write(f'Generated in {generate_seconds:.2f}s, index built in {build_seconds:.2f}s')
+        self.stdout.write(f'Index memory: {current / 1024 / 1024:.1f} MB (titles and slugs included)')
+        self.stdout.write(
+            f'{len(queries)} lookups, {found} with results: '
+            f'median {statistics.median(timings):.0f} us, '
+            f'p99 {timings[int(len(timings) * 0.99)]:.0f} us, max {timings[-1]:.0f} us'
+        )
@@ -0,0 +1,39 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from blog import prerender
+
+
+class Command(BaseCommand):
+    help = 'Rebuild every pre-rendered public page in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        urls = prerender.all_urls()
+        batch_size = options['batch_size']
+        batches = [urls[start:start + batch_size] for start in range(0, len(urls), batch_size)]
+
+        root = prerender.get_root()
+        existing = {str(path) for path in root.rglob('index.html')} if root.exists() else set()
+
+        connections.close_all()
+        written = set()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(options['workers'], mp_context=context, initializer=prerender.init_worker) as pool:
+            for paths in pool.map(prerender.render_batch, batches):
+                written.update(paths)
+
+        # Pages of posts that were deleted or unpublished since the last build
+        for stale in existing - written:
+            os.remove(stale)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Pre-rendered {len(written)} pages into {root} ({len(existing - written)} stale pages removed).'
+        ))
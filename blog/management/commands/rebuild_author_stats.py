@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.authors import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the post count, likes received and latest post date cached on every author profile'
+
+    def handle(self, *args, **options):
+        profiles = refresh()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the stats of {profiles} author profiles.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.archive import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per (status, category, month) post counts behind the archive sidebar'
+
+    def handle(self, *args, **options):
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} post aggregate rows.'))
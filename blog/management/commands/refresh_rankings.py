@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blog.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Fold likes created and removed since the last run into the trending and top post rankings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every ranking from scratch',
+        )
+
+    def handle(self, *args, **options):
+        processed = refresh_rankings(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Rankings refreshed ({processed} likes processed).'))
@@ -0,0 +1,31 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from blog import scheduling
+
+
+class Command(BaseCommand):
+    help = 'Publish scheduled posts when they fall due and send their newsletter notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Publish the posts due now, send their notifications and exit (for cron)',
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            published = scheduling.publish_due()
+            notified = scheduling.send_pending_notifications()
+            self.stdout.write(self.style.SUCCESS(f'Published {published} scheduled posts; notified subscribers of {notified}.'))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stop.set())
+        self.stdout.write('Scheduler running; press Ctrl+C to stop.')
+        scheduling.run(stop)
+        self.stdout.write(self.style.SUCCESS('Scheduler stopped.'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_alter_post_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_like_id', models.BigIntegerField(default=0)),
+                ('epoch', models.DateTimeField()),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Ranking State',
+                'verbose_name_plural': 'Ranking State',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostRanking',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='blog.post')),
+                ('trending_score', models.FloatField(default=0)),
+                ('like_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Post Ranking',
+                'verbose_name_plural': 'Post Rankings',
+                'indexes': [models.Index(fields=['-trending_score'], name='blog_postra_trendin_d5810b_idx'), models.Index(fields=['-like_count'], name='blog_postra_like_co_addac4_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LikeRemoval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('like_id', models.BigIntegerField()),
+                ('liked_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Like Removal',
+                'verbose_name_plural': 'Like Removals',
+            },
+        ),
+    ]
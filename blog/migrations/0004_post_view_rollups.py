@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Daily Post Views',
+                'verbose_name_plural': 'Daily Post Views',
+                'unique_together': {('post', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_views', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Hourly Post Views',
+                'verbose_name_plural': 'Hourly Post Views',
+                'unique_together': {('post', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_published_at(apps, schema_editor):
+    # Best guess for posts published before the field existed
+    Post = apps.get_model('blog', 'Post')
+    Post.objects.filter(status='published').update(published_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_view_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='published_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['published_at'], name='post_published_at_idx'),
+        ),
+        migrations.RunPython(backfill_published_at, migrations.RunPython.noop),
+    ]
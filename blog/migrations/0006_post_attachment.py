@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:25
+
+import re
+from urllib.parse import unquote
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_attachments(apps, schema_editor):
+    # Same extraction as core.media.embedded_media at the time of writing
+    pattern = re.compile(re.escape(settings.MEDIA_URL) + r'([^\s"\'<>?#]+)')
+    Post = apps.get_model('blog', 'Post')
+    PostAttachment = apps.get_model('blog', 'PostAttachment')
+    for post_id, content in Post.objects.filter(content__contains=settings.MEDIA_URL).values_list('id', 'content').iterator():
+        names = {unquote(path) for path in pattern.findall(content)}
+        PostAttachment.objects.bulk_create(
+            [PostAttachment(post_id=post_id, name=name) for name in names if len(name) <= 255],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_post_published_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAttachment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='blog.post')),
+            ],
+            options={
+                'verbose_name': 'Post Attachment',
+                'verbose_name_plural': 'Post Attachments',
+                'indexes': [models.Index(fields=['name'], name='blog_postat_name_a04295_idx')],
+                'unique_together': {('post', 'name')},
+            },
+        ),
+        migrations.RunPython(record_attachments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:08
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def build_aggregates(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostAggregate = apps.get_model('blog', 'PostAggregate')
+    rows = (
+        Post.objects.order_by()
+        .annotate(month=TruncMonth('created_at'))
+        .values('status', 'category', 'month')
+        .annotate(count=Count('id'))
+    )
+    PostAggregate.objects.bulk_create([
+        PostAggregate(status=row['status'], category=row['category'], month=row['month'].date(), count=row['count'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_post_attachment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('published', 'Published')], max_length=10)),
+                ('category', models.CharField(choices=[('technology', 'Technology'), ('politics', 'Politics'), ('life', 'Life'), ('advice', 'Advice'), ('others', 'Others')], max_length=20)),
+                ('month', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Post Aggregate',
+                'verbose_name_plural': 'Post Aggregates',
+                'unique_together': {('status', 'category', 'month')},
+            },
+        ),
+        migrations.RunPython(build_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_columns(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    PostRanking = apps.get_model('blog', 'PostRanking')
+    post = Post.objects.filter(pk=OuterRef('post_id'))
+    PostRanking.objects.update(
+        status=Subquery(post.values('status')[:1]),
+        category=Subquery(post.values('category')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_aggregate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_status_02ce19_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='blog_post_categor_ded810_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='postranking',
+            name='blog_postra_trendin_d5810b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='postranking',
+            name='blog_postra_like_co_addac4_idx',
+        ),
+        migrations.AddField(
+            model_name='postranking',
+            name='category',
+            field=models.CharField(choices=[('technology', 'Technology'), ('politics', 'Politics'), ('life', 'Life'), ('advice', 'Advice'), ('others', 'Others')], default='others', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='postranking',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('published', 'Published')], default='draft', max_length=10),
+        ),
+        migrations.RunPython(copy_post_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-created_at', '-id'], name='post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['category', '-created_at', '-id'], name='post_published_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postaggregate',
+            index=models.Index(fields=['status', '-month'], name='blog_postag_status_4bcce4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postranking',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-trending_score', '-post'], name='ranking_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postranking',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['category', '-trending_score', '-post'], name='ranking_trending_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postranking',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['-like_count', '-post'], name='ranking_top_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postranking',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['category', '-like_count', '-post'], name='ranking_top_category_idx'),
+        ),
+    ]
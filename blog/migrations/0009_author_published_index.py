@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_query_plan_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('status', 'published')), fields=['author', '-created_at', '-id'], name='post_author_published_idx'),
+        ),
+    ]
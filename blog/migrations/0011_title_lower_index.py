@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:59
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_scheduled_publishing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='post_title_lower_idx'),
+        ),
+    ]
@@ -1,11 +1,80 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
+from django.dispatch import Signal
+from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 import re
 from html import unescape
 
 
+def reading_time_from(content):
+    """Reading time in minutes for HTML content, at 200 words per minute"""
+    # Strip HTML tags from content
+    text = re.sub(r'<[^>]+>', '', content)
+    word_count = len(text.split())
+    return max(1, round(word_count / 200))
+
+
+def excerpt_from(content):
+    """First 150 characters of HTML content, tags stripped and entities unescaped"""
+    text = unescape(re.sub(r'<[^>]+>', '', content))
+    if len(text) > 150:
+        return text[:150] + '...'
+    return text
+
+
+PUBLISHED = models.Q(status='published')
+SCHEDULED = models.Q(status='scheduled')
+
+# Sent by PostQuerySet.set_status with the previous state of every post it
+# changed; a bulk UPDATE bypasses post_save, so the receivers in
+# blog/signals.py bring aggregates, rankings and caches up to date instead
+posts_status_changed = Signal()
+
+# Posts updated per statement in bulk status changes
+BULK_UPDATE_CHUNK_SIZE = 500
+
+
+class PostQuerySet(models.QuerySet):
+    def with_likes(self):
+        """Prefetch likes unordered; Like's default ordering would force a sort of every like"""
+        return self.prefetch_related(models.Prefetch('likes', queryset=Like.objects.order_by()))
+
+    def with_like_count(self, name='like_count'):
+        """
+        Annotate like counts with a correlated subquery on the like index,
+        so the outer query needs no GROUP BY and keeps its index ordering
+        """
+        likes = Like.objects.filter(post=models.OuterRef('pk')).order_by().values('post')
+        count = likes.annotate(count=models.Count('pk')).values('count')
+        return self.annotate(**{name: Coalesce(models.Subquery(count), 0)})
+
+    def set_status(self, status, **fields):
+        """
+        Change the status of every post in the queryset with bulk UPDATEs,
+        also setting any extra `fields`; returns the number changed
+        """
+        changes = list(
+            self.exclude(status=status)
+            .order_by()
+            .values('pk', 'slug', 'status', 'category', 'created_at', 'image', 'author_id', 'author__username')
+        )
+        for change in changes:
+            change['author'] = change.pop('author__username')
+        ids = [change['pk'] for change in changes]
+        now = timezone.now()
+        if status == 'published':
+            fields.setdefault('published_at', Coalesce('published_at', models.Value(now)))
+        with transaction.atomic():
+            for start in range(0, len(ids), BULK_UPDATE_CHUNK_SIZE):
+                Post.objects.filter(pk__in=ids[start:start + BULK_UPDATE_CHUNK_SIZE]).update(status=status, updated_at=now, **fields)
+            if changes:
+                posts_status_changed.send(sender=Post, changes=changes, status=status)
+        return len(changes)
+
+
 class Post(models.Model):
     CATEGORY_CHOICES = [
         ('technology', 'Technology'),
@@ -17,6 +86,7 @@ class Post(models.Model):
 
     STATUS_CHOICES = [
         ('draft', 'Draft'),
+        ('scheduled', 'Scheduled'),
         ('published', 'Published'),
     ]
 
@@ -27,15 +97,34 @@ class Post(models.Model):
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='others')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    # Publication date; a scheduled post goes live at this time
     created_at = models.DateTimeField(db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When the post first went live (created_at can be set to any date); digests select on this
+    published_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Published by the scheduler, subscribers not yet notified
+    notification_pending = models.BooleanField(default=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
-            models.Index(fields=['category']),
+            # Public listings: published posts newest first, optionally by category
+            # (id breaks created_at ties, matching the API's keyset order)
+            models.Index(fields=['-created_at', '-id'], condition=PUBLISHED, name='post_published_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=PUBLISHED, name='post_published_category_idx'),
+            # Dashboards, and profile pages (published posts only)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], condition=PUBLISHED, name='post_author_published_idx'),
+            # The scheduler's next-due lookup and its queue of notifications to send
+            models.Index(fields=['created_at'], condition=SCHEDULED, name='post_scheduled_idx'),
+            models.Index(fields=['id'], condition=models.Q(notification_pending=True), name='post_notification_idx'),
+            # Newsletter digests: posts that went live since a subscriber's last send
+            models.Index(fields=['published_at'], condition=PUBLISHED, name='post_published_at_idx'),
+            # Case-insensitive title prefix search in the admin
+            models.Index(Lower('title'), name='post_title_lower_idx'),
         ]
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
@@ -46,6 +135,10 @@ class Post(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self.generate_unique_slug()
+        if self.status == 'published' and self.published_at is None:
+            self.published_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'published_at'}
         super().save(*args, **kwargs)
 
     def generate_unique_slug(self):
@@ -62,22 +155,11 @@ class Post(models.Model):
 
     def get_reading_time(self):
         """Calculate reading time based on 200 words per minute"""
-        # Strip HTML tags from content
-        text = re.sub(r'<[^>]+>', '', self.content)
-        word_count = len(text.split())
-        reading_time = max(1, round(word_count / 200))
-        return reading_time
+        return reading_time_from(self.content)
 
     def get_excerpt(self):
         """Generate excerpt from content (150 characters, HTML-stripped)"""
-        # Strip HTML tags
-        text = re.sub(r'<[^>]+>', '', self.content)
-        # Unescape HTML entities
-        text = unescape(text)
-        # Return first 150 characters
-        if len(text) > 150:
-            return text[:150] + '...'
-        return text
+        return excerpt_from(self.content)
 
     def get_like_count(self):
         """Get total number of likes for this post"""
@@ -103,3 +185,127 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user.username} likes {self.post.title}"
+
+
+class PostRanking(models.Model):
+    """Materialized like-based ranking for a post, maintained by refresh_rankings"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='ranking')
+    # Sum of exp(decay * (like_time - epoch)) over the post's likes. Scores share one
+    # epoch so their relative order is stable and never needs decaying in place.
+    trending_score = models.FloatField(default=0)
+    like_count = models.PositiveIntegerField(default=0)
+    # Copies of the post's columns (kept in sync by blog.signals) so a filtered
+    # ranking is read straight off these indexes instead of sorting every post
+    status = models.CharField(max_length=10, choices=Post.STATUS_CHOICES, default='draft')
+    category = models.CharField(max_length=20, choices=Post.CATEGORY_CHOICES, default='others')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-trending_score', '-post'], condition=PUBLISHED, name='ranking_trending_idx'),
+            models.Index(fields=['category', '-trending_score', '-post'], condition=PUBLISHED, name='ranking_trending_category_idx'),
+            models.Index(fields=['-like_count', '-post'], condition=PUBLISHED, name='ranking_top_idx'),
+            models.Index(fields=['category', '-like_count', '-post'], condition=PUBLISHED, name='ranking_top_category_idx'),
+        ]
+        verbose_name = 'Post Ranking'
+        verbose_name_plural = 'Post Rankings'
+
+    def __str__(self):
+        return f"Ranking for {self.post_id}"
+
+
+class RankingState(models.Model):
+    """Single-row bookmark of how far refresh_rankings has consumed the Like table"""
+    last_like_id = models.BigIntegerField(default=0)
+    epoch = models.DateTimeField()
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Ranking State'
+        verbose_name_plural = 'Ranking State'
+
+    def __str__(self):
+        return f"Rankings refreshed at {self.refreshed_at}"
+
+
+class PostAttachment(models.Model):
+    """A media file a post's body links to, recorded on save so media access checks are index lookups"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='attachments')
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = ('post', 'name')
+        indexes = [
+            # get_access_rule: the posts an editor attachment appears in
+            models.Index(fields=['name']),
+        ]
+        verbose_name = 'Post Attachment'
+        verbose_name_plural = 'Post Attachments'
+
+    def __str__(self):
+        return f"{self.name} in {self.post_id}"
+
+
+class LikeRemoval(models.Model):
+    """A deleted like whose weight refresh_rankings still has to take off its post's ranking"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    like_id = models.BigIntegerField()
+    # The like's own creation time, which fixed its weight
+    liked_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Like Removal'
+        verbose_name_plural = 'Like Removals'
+
+    def __str__(self):
+        return f"Like {self.like_id} removed from {self.post_id}"
+
+
+class PostViewHourly(models.Model):
+    """Page views of a post rolled up per hour, written in batches by blog.analytics"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='hourly_views')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'hour')
+        verbose_name = 'Hourly Post Views'
+        verbose_name_plural = 'Hourly Post Views'
+
+    def __str__(self):
+        return f"{self.post_id} @ {self.hour}: {self.views}"
+
+
+class PostViewDaily(models.Model):
+    """Page views of a post rolled up per day, written in batches by blog.analytics"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='daily_views')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'day')
+        verbose_name = 'Daily Post Views'
+        verbose_name_plural = 'Daily Post Views'
+
+    def __str__(self):
+        return f"{self.post_id} @ {self.day}: {self.views}"
+
+
+class PostAggregate(models.Model):
+    """Number of posts per (status, category, month), maintained from Post signals by blog.archive"""
+    status = models.CharField(max_length=10, choices=Post.STATUS_CHOICES)
+    category = models.CharField(max_length=20, choices=Post.CATEGORY_CHOICES)
+    month = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('status', 'category', 'month')
+        indexes = [
+            # Sidebar: one status, newest months first
+            models.Index(fields=['status', '-month']),
+        ]
+        verbose_name = 'Post Aggregate'
+        verbose_name_plural = 'Post Aggregates'
+
+    def __str__(self):
+        return f"{self.status}/{self.category}/{self.month:%Y-%m}: {self.count}"
@@ -0,0 +1,195 @@
+"""
+Static pre-rendering of public pages.
+
+When PRERENDER_ENABLED is on, the anonymous versions of post pages, the home
+page, category listings and author profiles are written as index.html files
+under PRERENDER_ROOT so that the web server can serve them without Django
+(see README). Saving or deleting a Post regenerates only the pages that show
+it, on a worker thread once the change is committed, so the author's request
+never waits for it; the prerender command rebuilds everything in a process
+pool. Pages are rendered by passing requests built with RequestFactory
+through the middleware stack, as a real anonymous request would be.
+"""
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+# Marks pre-render requests so views can skip per-reader work such as view counting
+PRERENDER_HEADER = 'HTTP_X_PRERENDER'
+
+# One thread, so refreshes run in the order their changes were committed
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prerender')
+
+
+def is_enabled():
+    return getattr(settings, 'PRERENDER_ENABLED', False)
+
+
+def get_root():
+    return Path(getattr(settings, 'PRERENDER_ROOT', settings.BASE_DIR / 'prerendered'))
+
+
+def home_url(category=None):
+    url = reverse('home')
+    return f'{url}?category={category}' if category else url
+
+
+def output_path(url):
+    """Map a page URL to its file, e.g. /post/x/ -> post/x/index.html, /?category=life -> category/life/index.html"""
+    path, _, query = url.partition('?')
+    if query.startswith('category='):
+        path = f"/category/{query.split('=', 1)[1]}/"
+    return get_root() / path.strip('/') / 'index.html'
+
+
+class PageRenderer:
+    """Renders pages as an anonymous reader through the middleware stack"""
+
+    def __init__(self, header=PRERENDER_HEADER):
+        # Set on every request so views can tell these renders from reader traffic
+        self.header = header
+        self.factory = RequestFactory(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+        self.handler = BaseHandler()
+        self.handler.load_middleware()
+
+    def get(self, url):
+        request = self.factory.get(url, secure=not settings.DEBUG, **{self.header: '1'})
+        # Errors come back as 500 responses
+        return self.handler.get_response(request)
+
+
+def render_page(url, renderer=None):
+    """Render one page as an anonymous reader and write it atomically; returns False if it is not public"""
+    renderer = renderer or PageRenderer()
+    response = renderer.get(url)
+    target = output_path(url)
+    if response.status_code != 200:
+        if response.status_code >= 500:
+            logger.error('Pre-rendering %s failed with status %s', url, response.status_code)
+        remove_page(url)
+        return False
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as temp_file:
+        temp_file.write(response.content)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, target)
+    return True
+
+
+def remove_page(url):
+    try:
+        output_path(url).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def affected_urls(state, previous=None):
+    """Pages that show a post in `state` now or showed it in its `previous` state"""
+    states = [s for s in (previous, state) if s and s['status'] == 'published']
+    urls = {home_url()}
+    for s in states:
+        urls.add(home_url(s['category']))
+        urls.add(reverse('user_profile', args=[s['author']]))
+    return urls
+
+
+def post_state(post):
+    return {
+        'slug': post.slug,
+        'status': post.status,
+        'category': post.category,
+        'author': post.author.username,
+    }
+
+
+def plan_refresh(state, previous=None, deleted=False):
+    """Pages to remove and pages to render after a post changed from `previous` to `state`"""
+    was_public = bool(previous and previous['status'] == 'published')
+    if not was_public and (deleted or state['status'] != 'published'):
+        return set(), set()
+
+    remove = set()
+    if previous and (deleted or previous['slug'] != state['slug'] or state['status'] != 'published'):
+        remove.add(reverse('post_detail', args=[previous['slug']]))
+
+    render = affected_urls(state, previous)
+    if not deleted and state['status'] == 'published':
+        render.add(reverse('post_detail', args=[state['slug']]))
+    return remove, render
+
+
+def refresh_pages(remove, render):
+    for url in sorted(remove):
+        remove_page(url)
+    if render:
+        renderer = PageRenderer()
+        for url in sorted(render):
+            render_page(url, renderer)
+
+
+def refresh_post(state, previous=None, deleted=False):
+    """Regenerate the pages affected by saving or deleting a post (see post_state)"""
+    refresh_pages(*plan_refresh(state, previous, deleted))
+
+
+def refresh_status_change(changes, status):
+    """Regenerate the pages affected by PostQuerySet.set_status, each page once"""
+    remove, render = set(), set()
+    for change in changes:
+        removed, rendered = plan_refresh({**change, 'status': status}, change)
+        remove |= removed
+        render |= rendered
+    refresh_pages(remove, render)
+
+
+def _run(refresh, *args, **kwargs):
+    try:
+        refresh(*args, **kwargs)
+    except Exception:
+        logger.exception('Pre-rendering pages failed')
+    finally:
+        # The worker thread's own connection
+        connection.close()
+
+
+def in_background(refresh, *args, **kwargs):
+    """Run a refresh on the pre-render thread; call it from transaction.on_commit"""
+    _executor.submit(_run, refresh, *args, **kwargs)
+
+
+def all_urls():
+    """Every page the full rebuild writes"""
+    from .models import Post
+
+    published = Post.objects.filter(status='published')
+    urls = [home_url()] + [home_url(category) for category, _ in Post.CATEGORY_CHOICES]
+    urls += [reverse('post_detail', args=[slug]) for slug in published.values_list('slug', flat=True).iterator()]
+    urls += [
+        reverse('user_profile', args=[username])
+        for username in published.values_list('author__username', flat=True).distinct().iterator()
+    ]
+    return urls
+
+
+def render_batch(urls):
+    """Process-pool task: render a batch of pages, returning the files written"""
+    renderer = PageRenderer()
+    return [str(output_path(url)) for url in urls if render_page(url, renderer)]
+
+
+def init_worker():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ofori_blog.settings')
+    django.setup()
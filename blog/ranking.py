@@ -0,0 +1,171 @@
+"""
+Time-decayed trending and all-time like rankings.
+
+Scores are materialized in PostRanking by the refresh_rankings management
+command, which only reads likes created since its previous run and the
+LikeRemoval rows written when likes are deleted. Each like contributes
+exp(decay * (created_at - epoch)) until it is removed; because every score shares the
+same epoch, ordering by trending_score equals ordering by the decayed score
+at any moment, so stored rows never have to be rewritten just because time
+passed. The epoch is moved forward (one UPDATE) before the exponents get
+large enough to lose float precision.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import BULK_UPDATE_CHUNK_SIZE, Like, LikeRemoval, Post, PostRanking, RankingState
+
+# Rebase once the newest exponent passes this value (e**200 is still far from
+# float overflow, but leaves plenty of headroom for accumulated sums).
+MAX_EXPONENT = 200
+
+
+def get_decay_rate():
+    """Decay constant per second derived from RANKING_HALF_LIFE_HOURS"""
+    half_life_hours = getattr(settings, 'RANKING_HALF_LIFE_HOURS', 72)
+    return math.log(2) / (half_life_hours * 3600)
+
+
+def _like_weight(created_at, epoch, decay):
+    return math.exp(decay * (created_at - epoch).total_seconds())
+
+
+def _get_state():
+    state = RankingState.objects.select_for_update().filter(pk=1).first()
+    if state is None:
+        state = RankingState.objects.create(pk=1, epoch=timezone.now())
+    return state
+
+
+def _rebase(state, now, decay):
+    """Move the epoch to now, rescaling every stored score in a single UPDATE"""
+    factor = math.exp(-decay * (now - state.epoch).total_seconds())
+    PostRanking.objects.update(trending_score=F('trending_score') * factor)
+    state.epoch = now
+
+
+def like_removed(like):
+    """Leave a tombstone for the next refresh to take the like's weight back off"""
+    LikeRemoval.objects.create(post_id=like.post_id, like_id=like.pk, liked_at=like.created_at)
+
+
+def refresh_rankings(full=False):
+    """
+    Fold likes created and removed since the last run into PostRanking.
+
+    With full=True every ranking is rebuilt from the whole Like table.
+    Returns the number of likes processed.
+    """
+    decay = get_decay_rate()
+    now = timezone.now()
+
+    with transaction.atomic():
+        state = _get_state()
+        counted_up_to = state.last_like_id
+
+        if full:
+            PostRanking.objects.all().delete()
+            state.epoch = now
+            state.last_like_id = 0
+        elif decay * (now - state.epoch).total_seconds() > MAX_EXPONENT:
+            _rebase(state, now, decay)
+
+        # Removed likes; a full rebuild reads the Like table as it is now instead
+        removed = defaultdict(float)
+        last_removal_id = None
+        for removal_id, like_id, post_id, liked_at in (
+            LikeRemoval.objects.order_by('id').values_list('id', 'like_id', 'post_id', 'liked_at').iterator()
+        ):
+            last_removal_id = removal_id
+            # A like removed before any refresh saw it never added anything
+            if not full and like_id <= counted_up_to:
+                removed[post_id] += _like_weight(liked_at, state.epoch, decay)
+        if last_removal_id is not None:
+            LikeRemoval.objects.filter(id__lte=last_removal_id).delete()
+
+        new_likes = Like.objects.filter(id__gt=state.last_like_id).order_by('id')
+        scores = defaultdict(float)
+        last_like_id = state.last_like_id
+        processed = 0
+        for like_id, post_id, created_at in new_likes.values_list('id', 'post_id', 'created_at').iterator():
+            scores[post_id] += _like_weight(created_at, state.epoch, decay)
+            last_like_id = like_id
+            processed += 1
+
+        touched = scores.keys() | removed.keys()
+        if touched:
+            # Exact counts for every post that gained or lost likes
+            posts = {
+                post_id: (num_likes, status, category)
+                for post_id, num_likes, status, category in Post.objects.filter(id__in=touched)
+                .annotate(num_likes=Count('likes'))
+                .values_list('id', 'num_likes', 'status', 'category')
+            }
+            existing = PostRanking.objects.in_bulk(list(touched))
+            to_create = []
+            to_update = []
+            for post_id in touched:
+                if post_id not in posts:
+                    continue
+                num_likes, status, category = posts[post_id]
+                ranking = existing.get(post_id)
+                if ranking is None:
+                    if post_id not in scores:
+                        continue
+                    to_create.append(PostRanking(
+                        post_id=post_id,
+                        trending_score=scores[post_id],
+                        like_count=num_likes,
+                        status=status,
+                        category=category,
+                    ))
+                else:
+                    # Never below zero through float rounding, and no residue once the last like is gone
+                    if num_likes:
+                        ranking.trending_score = max(ranking.trending_score + scores[post_id] - removed[post_id], 0.0)
+                    else:
+                        ranking.trending_score = 0.0
+                    ranking.like_count = num_likes
+                    ranking.updated_at = now
+                    to_update.append(ranking)
+            PostRanking.objects.bulk_create(to_create, batch_size=500)
+            PostRanking.objects.bulk_update(to_update, ['trending_score', 'like_count', 'updated_at'], batch_size=500)
+
+        state.last_like_id = last_like_id
+        state.refreshed_at = now
+        state.save()
+
+    return processed
+
+
+def ranked_posts(sort, category=None):
+    """
+    Published posts ordered by a precomputed ranking ('trending' or 'top'),
+    with a LIMIT. Filters apply to PostRanking's copies of status and
+    category so the database walks one ranking index in order.
+    """
+    limit = getattr(settings, 'RANKING_PAGE_SIZE', 30)
+    if sort == 'trending':
+        order = '-ranking__trending_score'
+    else:
+        order = '-ranking__like_count'
+    posts = Post.objects.filter(ranking__status='published')
+    if category:
+        posts = posts.filter(ranking__category=category)
+    return posts.order_by(order, '-ranking__post_id')[:limit]
+
+
+def sync_post(post):
+    """Copy a post's status and category onto its ranking row"""
+    PostRanking.objects.filter(post_id=post.pk).update(status=post.status, category=post.category)
+
+
+def sync_status(post_ids, status):
+    """Copy a status set in bulk onto the posts' ranking rows"""
+    for start in range(0, len(post_ids), BULK_UPDATE_CHUNK_SIZE):
+        PostRanking.objects.filter(post_id__in=post_ids[start:start + BULK_UPDATE_CHUNK_SIZE]).update(status=status)
@@ -0,0 +1,95 @@
+"""
+Scheduled publishing.
+
+A post saved with the status 'scheduled' goes live at its publication date
+(created_at). The run_scheduler command looks the next one up with a seek on
+a partial index of scheduled posts and sleeps until then, or for at most
+SCHEDULER_MAX_SLEEP seconds so it notices posts scheduled in the meantime.
+Every post that is due is published with one set_status call, so aggregates,
+rankings, caches and pages follow through posts_status_changed.
+
+The same UPDATE flags the posts notification_pending. Their newsletter
+fan-out runs on a worker thread, so a slow mail server never delays the next
+publication. Each post is claimed before its fan-out, so its notification
+goes out at most once: a fan-out interrupted by a restart is not resumed,
+and posts not yet claimed are sent on the next start.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from core.logs import logged_operation
+from newsletter.utils import send_new_post_notification
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying after a database error
+RETRY_DELAY = 5
+
+
+def next_due():
+    """Publication date of the earliest scheduled post, or None"""
+    return Post.objects.filter(status='scheduled').order_by('created_at').values_list('created_at', flat=True).first()
+
+
+def publish_due(now=None):
+    """Publish every scheduled post whose publication date has come; returns the number published"""
+    due = Post.objects.filter(status='scheduled', created_at__lte=now or timezone.now())
+    return due.set_status('published', notification_pending=True)
+
+
+def send_pending_notifications():
+    """Send the newsletter for every post published by the scheduler; returns the number of posts"""
+    sent = 0
+    while True:
+        post = Post.objects.filter(notification_pending=True).select_related('author').order_by('pk').first()
+        if post is None:
+            return sent
+        # Claimed before the fan-out, so a post is never mailed twice (by a
+        # second scheduler, or again after a crash half-way through its list)
+        if not Post.objects.filter(pk=post.pk, notification_pending=True).update(notification_pending=False):
+            continue
+        # Unpublished again before its turn came
+        if post.status != 'published':
+            continue
+        with logged_operation(logger, 'newsletter.new_post', post_id=post.pk):
+            send_new_post_notification(post)
+        sent += 1
+
+
+def notify_in_background():
+    """send_pending_notifications for the scheduler's worker thread"""
+    try:
+        send_pending_notifications()
+    except DatabaseError:
+        logger.exception('Could not send the notifications of scheduled posts')
+    finally:
+        # The worker thread's own connection
+        connection.close()
+
+
+def run(stop=None, max_sleep=None):
+    """Publish scheduled posts as they fall due until `stop` (a threading.Event) is set"""
+    stop = stop or threading.Event()
+    max_sleep = max_sleep or getattr(settings, 'SCHEDULER_MAX_SLEEP', 60)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='post-notifications') as notifier:
+        # Left over from a previous run
+        notifier.submit(notify_in_background)
+        while not stop.is_set():
+            try:
+                published = publish_due()
+                due = next_due()
+            except DatabaseError:
+                logger.exception('Scheduled publishing failed; retrying in %ss', RETRY_DELAY)
+                stop.wait(RETRY_DELAY)
+                continue
+            if published:
+                logger.info('Published %s scheduled posts', published)
+                notifier.submit(notify_in_background)
+            delay = max_sleep if due is None else (due - timezone.now()).total_seconds()
+            stop.wait(min(max(delay, 0), max_sleep))
@@ -0,0 +1,189 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from core import stale
+from core.media import embedded_media, invalidate_access_rule, invalidate_attachment_rules, record_attachments
+from . import archive, authors, prerender, ranking, suggest
+from .models import Like, Post, posts_status_changed
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, **kwargs):
+    """Keep the stored slug/status/category so post_save handlers can see what changed"""
+    instance._previous_state = None
+    if instance.pk:
+        previous = (
+            Post.objects.filter(pk=instance.pk)
+            .values('slug', 'status', 'category', 'created_at', 'author_id', 'author__username')
+            .first()
+        )
+        if previous:
+            previous['author'] = previous.pop('author__username')
+            instance._previous_state = previous
+
+
+@receiver(post_save, sender=Post)
+def update_post_aggregates(sender, instance, created, **kwargs):
+    archive.post_saved(instance, getattr(instance, '_previous_state', None), created)
+
+
+@receiver(post_save, sender=Post)
+def update_author_stats(sender, instance, created, **kwargs):
+    authors.post_saved(instance, getattr(instance, '_previous_state', None), created)
+
+
+@receiver(post_delete, sender=Post)
+def refresh_deleted_author_stats(sender, instance, **kwargs):
+    authors.post_deleted(instance)
+
+
+@receiver(post_save, sender=Like)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        authors.like_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Like)
+def uncount_like(sender, instance, origin=None, **kwargs):
+    # Likes deleted along with their post are accounted for by the post's own refresh
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        return
+    authors.like_changed(instance, -1)
+
+
+@receiver(post_delete, sender=Like)
+def remember_removed_like(sender, instance, origin=None, **kwargs):
+    # A deleted post takes its ranking row with it
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        return
+    ranking.like_removed(instance)
+
+
+@receiver(post_save, sender=Post)
+def sync_post_ranking(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if previous and (previous['status'], previous['category']) != (instance.status, instance.category):
+        ranking.sync_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_image_access(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if instance.image and previous and previous['status'] != instance.status:
+        invalidate_access_rule(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def sync_post_attachments(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    record_attachments(instance, previous['status'] if previous else None)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_aggregates(sender, instance, **kwargs):
+    archive.post_deleted(instance)
+
+
+@receiver(post_save, sender=Post)
+def refresh_prerendered_pages(sender, instance, **kwargs):
+    if prerender.is_enabled():
+        state = prerender.post_state(instance)
+        previous = getattr(instance, '_previous_state', None)
+        transaction.on_commit(lambda: prerender.in_background(prerender.refresh_post, state, previous))
+
+
+@receiver(post_save, sender=Post)
+def update_suggestions(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if instance.status != 'published' and not (previous and previous['status'] == 'published'):
+        return
+    fields = suggest.post_fields(instance)
+    transaction.on_commit(lambda: suggest.apply_post(instance.pk, fields))
+    suggest.broadcast([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remove_suggestions(sender, instance, **kwargs):
+    if instance.status == 'published':
+        post_id = instance.pk
+        transaction.on_commit(lambda: suggest.apply_post(post_id, None))
+        suggest.broadcast([post_id])
+
+
+def forget_stale_pages(slug):
+    """A post that is no longer public must not come back as a stale copy"""
+    stale.forget(reverse('post_detail', args=[slug]))
+    stale.forget(reverse('api_post_detail', args=[slug]))
+
+
+@receiver(post_save, sender=Post)
+def forget_stale_post(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if previous and previous['status'] == 'published' and (instance.status, instance.slug) != ('published', previous['slug']):
+        forget_stale_pages(previous['slug'])
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_stale_post(sender, instance, **kwargs):
+    if instance.status == 'published':
+        forget_stale_pages(instance.slug)
+
+
+@receiver(post_delete, sender=Post)
+def forget_image_access(sender, instance, **kwargs):
+    if instance.image:
+        invalidate_access_rule(instance.image.name)
+    for name in embedded_media(instance.content):
+        invalidate_access_rule(name)
+
+
+@receiver(post_delete, sender=Post)
+def remove_prerendered_pages(sender, instance, **kwargs):
+    if prerender.is_enabled():
+        previous = prerender.post_state(instance)
+        transaction.on_commit(lambda: prerender.in_background(prerender.refresh_post, previous, previous, deleted=True))
+
+
+@receiver(posts_status_changed, sender=Post)
+def move_bulk_aggregates(sender, changes, status, **kwargs):
+    archive.posts_status_changed(changes, status)
+
+
+@receiver(posts_status_changed, sender=Post)
+def sync_bulk_ranking(sender, changes, status, **kwargs):
+    ranking.sync_status([change['pk'] for change in changes], status)
+
+
+@receiver(posts_status_changed, sender=Post)
+def invalidate_bulk_image_access(sender, changes, status, **kwargs):
+    for change in changes:
+        if change['image']:
+            invalidate_access_rule(change['image'])
+    invalidate_attachment_rules([change['pk'] for change in changes])
+
+
+@receiver(posts_status_changed, sender=Post)
+def refresh_bulk_prerendered_pages(sender, changes, status, **kwargs):
+    if prerender.is_enabled():
+        transaction.on_commit(lambda: prerender.in_background(prerender.refresh_status_change, changes, status))
+
+
+@receiver(posts_status_changed, sender=Post)
+def update_bulk_suggestions(sender, changes, status, **kwargs):
+    post_ids = [change['pk'] for change in changes]
+    transaction.on_commit(lambda: suggest.refresh_posts(','.join(map(str, post_ids))))
+    suggest.broadcast(post_ids)
+
+
+@receiver(posts_status_changed, sender=Post)
+def forget_bulk_stale_posts(sender, changes, status, **kwargs):
+    for change in changes:
+        if change['status'] == 'published':
+            forget_stale_pages(change['slug'])
+
+
+@receiver(posts_status_changed, sender=Post)
+def refresh_bulk_author_stats(sender, changes, status, **kwargs):
+    authors.posts_status_changed(changes)
@@ -0,0 +1,373 @@
+"""
+Search-box autocomplete from an in-process prefix index.
+
+Published post titles, the names of their authors and the categories are
+split into words. Each process keeps them in flat arrays: a sorted list of
+distinct words, and for every word a slice of one array('I') of entry
+numbers, best entry first. A lookup bisects for the typed prefix and merges
+at most MAX_PREFIX_WORDS of those slices, so it never touches the database.
+
+The arrays are never modified. Changes (Post signals in this process,
+'suggest' coherence events from other processes) go into a small overlay
+that lookups scan as well; once it holds COMPACT_AFTER entries a fresh
+snapshot is built from memory.
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.urls import reverse
+
+from core import coherence
+from .models import Post
+
+KIND_CATEGORY, KIND_AUTHOR, KIND_POST = 0, 1, 2
+KIND_NAMES = ('category', 'author', 'post')
+
+# Words merged for one prefix; a very short prefix only looks at the first ones alphabetically
+MAX_PREFIX_WORDS = 100
+# Candidates checked against the other words of a multi-word query before giving up
+MAX_CANDIDATES = 1000
+# Other words of a query with at most this many postings are matched by set membership,
+# more common ones by testing the candidate's title
+MAX_FILTER_POSTINGS = 2000
+# Overlay entries kept before they are folded into a new snapshot
+COMPACT_AFTER = 256
+# Room for post ids in one coherence event key (InvalidationEvent.key)
+BROADCAST_KEY_LENGTH = 255
+
+WORD_RE = re.compile(r'\w+')
+LAST_WORD = chr(0x10FFFF)
+
+# ident: category value, username or post id; target: what the URL is built from
+# (category value, username or slug); score orders entries of one kind, highest first
+Entry = namedtuple('Entry', 'kind ident label target score owner')
+
+
+def words_of(text):
+    """Lower-cased, accent-stripped words"""
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return WORD_RE.findall(text)
+
+
+def entry_words(entry):
+    if entry.kind == KIND_POST:
+        return words_of(entry.label)
+    # Authors are found by name or username, categories by label or value
+    return words_of(f'{entry.label} {entry.ident}')
+
+
+def has_words(entry, prefixes):
+    """Whether every prefix starts some word of the entry"""
+    words = entry_words(entry)
+    return all(any(word.startswith(prefix) for word in words) for prefix in prefixes)
+
+
+def prefixes_pattern(prefixes):
+    """Regex matching ASCII text with a word starting with each prefix, like has_words"""
+    return re.compile(''.join(rf'(?=.*?\b{re.escape(prefix)})' for prefix in prefixes), re.IGNORECASE | re.DOTALL)
+
+
+def sort_key(entry):
+    return (entry.kind, -entry.score, entry.label.lower())
+
+
+def category_entries():
+    return [Entry(KIND_CATEGORY, value, label, value, 0.0, '') for value, label in Post.CATEGORY_CHOICES]
+
+
+def author_entry(username, first_name, last_name):
+    label = f'{first_name} {last_name}'.strip() or username
+    return Entry(KIND_AUTHOR, username, label, username, 0.0, '')
+
+
+def post_entry(post_id, title, slug, created_at, username):
+    return Entry(KIND_POST, post_id, title, slug, created_at.timestamp(), username)
+
+
+def url_for(entry):
+    if entry.kind == KIND_POST:
+        return reverse('post_detail', args=[entry.target])
+    if entry.kind == KIND_AUTHOR:
+        return reverse('user_profile', args=[entry.target])
+    return f"{reverse('home')}?category={entry.target}"
+
+
+class Snapshot:
+    """Immutable word index over a list of entries"""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=sort_key)
+        self.kinds = bytes(entry.kind for entry in entries)
+        self.idents = [entry.ident for entry in entries]
+        self.labels = [entry.label for entry in entries]
+        self.targets = [entry.target for entry in entries]
+        self.scores = array('d', (entry.score for entry in entries))
+        # Usernames repeat across an author's posts; keep one string per author
+        owners = {}
+        self.owners = [owners.setdefault(entry.owner, entry.owner) for entry in entries]
+
+        postings = {}
+        for number, entry in enumerate(entries):
+            for word in set(entry_words(entry)):
+                postings.setdefault(word, []).append(number)
+        self.words = sorted(postings)
+        self.offsets = array('I', [0])
+        self.postings = array('I')
+        for word in self.words:
+            self.postings.extend(postings[word])
+            self.offsets.append(len(self.postings))
+
+        # Post id -> entry number through two sorted arrays instead of a dict of 100k keys
+        posts = sorted((entry.ident, number) for number, entry in enumerate(entries) if entry.kind == KIND_POST)
+        self.post_ids = array('q', (post_id for post_id, _ in posts))
+        self.post_numbers = array('I', (number for _, number in posts))
+        self.others = {(entry.kind, entry.ident): number for number, entry in enumerate(entries) if entry.kind != KIND_POST}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def entry(self, number):
+        return Entry(
+            self.kinds[number], self.idents[number], self.labels[number],
+            self.targets[number], self.scores[number], self.owners[number],
+        )
+
+    def find(self, kind, ident):
+        """Entry number for a key, or None"""
+        if kind != KIND_POST:
+            return self.others.get((kind, ident))
+        position = bisect_left(self.post_ids, ident)
+        if position < len(self.post_ids) and self.post_ids[position] == ident:
+            return self.post_numbers[position]
+        return None
+
+    def word_range(self, prefix):
+        """Positions of the words starting with prefix, capped at MAX_PREFIX_WORDS"""
+        start = bisect_left(self.words, prefix)
+        end = min(bisect_left(self.words, prefix + LAST_WORD), start + MAX_PREFIX_WORDS)
+        return start, end
+
+    def posting_count(self, word_range):
+        start, end = word_range
+        return self.offsets[end] - self.offsets[start]
+
+    def candidates(self, word_range):
+        """Entry numbers with a word in the range, best first, possibly repeated"""
+        postings = memoryview(self.postings)
+        return heapq.merge(*(postings[self.offsets[i]:self.offsets[i + 1]] for i in range(*word_range)))
+
+    def numbers(self, word_range):
+        """Set of entry numbers with a word in the range"""
+        start, end = word_range
+        return set(memoryview(self.postings)[self.offsets[start]:self.offsets[end]])
+
+    def entries(self):
+        return (self.entry(number) for number in range(len(self)))
+
+
+class Index:
+    """A snapshot plus the overlay of changes made since it was built"""
+
+    def __init__(self, snapshot, author_posts, overlay=None):
+        self.snapshot = snapshot
+        # Published posts per author, to know when an author appears or disappears
+        self.author_posts = author_posts
+        # key -> Entry, or None when the entry was removed; replaced, never mutated
+        self.overlay = overlay or {}
+
+    def get(self, kind, ident):
+        key = (kind, ident)
+        if key in self.overlay:
+            return self.overlay[key]
+        number = self.snapshot.find(kind, ident)
+        return None if number is None else self.snapshot.entry(number)
+
+    def search(self, query, limit):
+        tokens = words_of(query)
+        if not tokens:
+            return []
+        snapshot, overlay = self.snapshot, self.overlay
+
+        # The word with the fewest postings drives; the others filter its candidates,
+        # by set membership when they are rare and by testing the title otherwise
+        ranges = sorted(
+            (snapshot.posting_count(word_range), token, word_range)
+            for token, word_range in ((token, snapshot.word_range(token)) for token in set(tokens))
+        )
+        driver = ranges[0][2]
+        required = []
+        others = []
+        for count, token, word_range in ranges[1:]:
+            if count <= MAX_FILTER_POSTINGS:
+                required.append(snapshot.numbers(word_range))
+            else:
+                others.append(token)
+        pattern = prefixes_pattern(others) if others else None
+
+        results = []
+        previous = None
+        for number in islice(snapshot.candidates(driver), MAX_CANDIDATES):
+            if number == previous:
+                continue
+            previous = number
+            if not all(number in numbers for numbers in required):
+                continue
+            if pattern and snapshot.kinds[number] == KIND_POST and snapshot.labels[number].isascii():
+                if not pattern.match(snapshot.labels[number]):
+                    continue
+                others_checked = True
+            else:
+                others_checked = not others
+            if (snapshot.kinds[number], snapshot.idents[number]) in overlay:
+                continue
+            entry = snapshot.entry(number)
+            if not others_checked and not has_words(entry, others):
+                continue
+            results.append(entry)
+            if len(results) == limit:
+                break
+
+        results += [entry for entry in overlay.values() if entry is not None and has_words(entry, tokens)]
+        results.sort(key=sort_key)
+        return results[:limit]
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def load_entries():
+    """Entries for everything currently published, and published posts per author"""
+    entries = category_entries()
+    authors = {}
+    author_posts = Counter()
+    rows = (
+        Post.objects.filter(status='published')
+        .order_by()
+        .values_list('pk', 'title', 'slug', 'created_at', 'author__username', 'author__first_name', 'author__last_name')
+        .iterator(chunk_size=2000)
+    )
+    for post_id, title, slug, created_at, username, first_name, last_name in rows:
+        entries.append(post_entry(post_id, title, slug, created_at, username))
+        author_posts[username] += 1
+        if username not in authors:
+            authors[username] = author_entry(username, first_name, last_name)
+    entries += authors.values()
+    return entries, author_posts
+
+
+def build():
+    """(Re)build this process's index from the database; returns the number of entries"""
+    global _index
+    entries, author_posts = load_entries()
+    index = Index(Snapshot(entries), author_posts)
+    with _lock:
+        _index = index
+    return len(index.snapshot)
+
+
+def get_index():
+    if _index is None:
+        build()
+    return _index
+
+
+def suggest(query, limit=8):
+    """Best `limit` entries with a word starting with each word of the query"""
+    return get_index().search(query, limit)
+
+
+def apply_post(post_id, fields):
+    """
+    Bring one post's entries up to date in this process. `fields` holds the
+    post's current values, or is None when it is no longer published.
+    """
+    global _index
+    with _lock:
+        index = _index
+        if index is None:
+            # Built lazily from the database, which already has this change
+            return
+        old = index.get(KIND_POST, post_id)
+        new = post_entry(post_id, *fields[:4]) if fields else None
+        if old is None and new is None:
+            return
+
+        overlay = dict(index.overlay)
+        overlay[(KIND_POST, post_id)] = new
+        if old is not None:
+            index.author_posts[old.owner] -= 1
+            if index.author_posts[old.owner] <= 0:
+                del index.author_posts[old.owner]
+                overlay[(KIND_AUTHOR, old.owner)] = None
+        if new is not None:
+            index.author_posts[new.owner] += 1
+            if index.author_posts[new.owner] == 1 or index.get(KIND_AUTHOR, new.owner) is None:
+                overlay[(KIND_AUTHOR, new.owner)] = author_entry(*fields[3:])
+
+        if len(overlay) > COMPACT_AFTER:
+            _index = _compact(index.snapshot, overlay, index.author_posts)
+        else:
+            _index = Index(index.snapshot, index.author_posts, overlay)
+
+
+def _compact(snapshot, overlay, author_posts):
+    """Fold the overlay into a new snapshot"""
+    entries = [
+        entry for entry in snapshot.entries()
+        if (entry.kind, entry.ident) not in overlay
+    ]
+    entries += [entry for entry in overlay.values() if entry is not None]
+    return Index(Snapshot(entries), author_posts)
+
+
+def post_fields(post):
+    """Values apply_post needs for a saved Post instance, or None if it is not published"""
+    if post.status != 'published':
+        return None
+    author = post.author
+    return (post.title, post.slug, post.created_at, author.username, author.first_name, author.last_name)
+
+
+def refresh_posts(key):
+    """Coherence handler: posts in `key` (comma-separated ids) changed elsewhere; reload them"""
+    post_ids = [int(post_id) for post_id in key.split(',') if post_id]
+    rows = {
+        row[0]: row[1:]
+        for row in Post.objects.filter(pk__in=post_ids, status='published').values_list(
+            'pk', 'title', 'slug', 'created_at', 'author__username', 'author__first_name', 'author__last_name',
+        )
+    }
+    for post_id in post_ids:
+        apply_post(post_id, rows.get(post_id))
+
+
+def broadcast(post_ids):
+    """Tell the other processes to reload these posts, packing ids into as few events as fit"""
+    key = ''
+    for post_id in post_ids:
+        if len(key) + len(str(post_id)) + 1 > BROADCAST_KEY_LENGTH:
+            coherence.publish('suggest', key, local=False)
+            key = ''
+        key = f'{key},{post_id}' if key else str(post_id)
+    if key:
+        coherence.publish('suggest', key, local=False)
+
+
+def reset():
+    """Coherence reset: rebuild lazily on the next lookup"""
+    global _index
+    with _lock:
+        _index = None
+
+
+coherence.register('suggest', refresh_posts)
+coherence.register_reset(reset)
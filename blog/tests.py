@@ -1,3 +1,614 @@
-from django.test import TestCase
+import hashlib
+import io
+import re
+import tempfile
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import ModelAdmin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from core import coherence, metrics, stale
+from newsletter.digest import send_digests
+from newsletter.models import Newsletter
+from newsletter.utils import send_new_post_notification
+from users.models import UserProfile
+from . import archive, authors, prerender, scheduling, suggest
+from .analytics import ViewCounter, view_counter
+from .models import Post, Like, LikeRemoval, PostAggregate, PostRanking, PostViewDaily, PostViewHourly
+from .ranking import ranked_posts, refresh_rankings
+
+# Plan lines that mean a table is read in full or results are sorted in a temporary index
+# ("subquery" is the LIMITed derived table of a capped count)
+FULL_SCAN_RE = re.compile(r'^SCAN (?!CONSTANT ROW|subquery$)(\S+)(?! USING (?:COVERING )?INDEX)(?: |$)')
+TEMP_BTREE_RE = re.compile(r'USE TEMP B-TREE')
+# An unfiltered page in primary key order walks the table from one end and stops at the LIMIT
+PK_PAGE_RE = re.compile(r'^SELECT (?:(?! WHERE ).)* ORDER BY "\w+"\."id" DESC LIMIT \d+(?: OFFSET \d+)?$')
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run EXPLAIN QUERY PLAN on every query the public pages issue against a
+    seeded dataset and fail if any of them reads a whole table or sorts in a
+    temporary B-tree. Without ANALYZE statistics SQLite plans as if tables
+    were large, so these plans are the ones production data would get.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(f'author{i}', password='pw') for i in range(3)]
+        for author in cls.authors:
+            author.profile.is_approved = True
+            author.profile.save()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        for i in range(8):
+            User.objects.create_user(f'pending{i}', f'pending{i}@{["spam.test", "example.com"][i % 2]}', 'pw')
+
+        categories = [category for category, _ in Post.CATEGORY_CHOICES]
+        now = timezone.now()
+        posts = []
+        for i in range(60):
+            posts.append(Post(
+                title=f'Post {i}',
+                slug=f'post-{i}',
+                author=cls.authors[i % 3],
+                content=f'<p>Content of post {i} about python</p>',
+                category=categories[i % len(categories)],
+                status='draft' if i % 7 == 0 else 'published',
+                created_at=now - timedelta(days=i),
+            ))
+        Post.objects.bulk_create(posts)
+        cls.post = Post.objects.get(slug='post-1')
+
+        Like.objects.bulk_create(
+            Like(post=post, user=user)
+            for post in Post.objects.all()[:20]
+            for user in cls.authors
+        )
+        PostViewDaily.objects.bulk_create(
+            PostViewDaily(post=post, day=now.date(), views=10) for post in Post.objects.all()
+        )
+        refresh_rankings(full=True)
+
+        for i in range(20):
+            subscriber = Newsletter.objects.create(
+                email=f'reader{i}@example.com',
+                frequency=[Newsletter.FREQUENCY_INSTANT, Newsletter.FREQUENCY_DAILY][i % 2],
+            )
+            subscriber.set_categories(categories[:3])
+
+    def tearDown(self):
+        # Write buffered page views into the test database rather than at interpreter exit
+        view_counter.flush()
+
+    def assertEfficientPlans(self, queries, allow_sort=False):
+        problems = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                bad = [] if allow_sort else [line for line in plan if TEMP_BTREE_RE.search(line)]
+                if not PK_PAGE_RE.match(sql):
+                    bad += [line for line in plan if FULL_SCAN_RE.match(line)]
+                if bad:
+                    problems.append(f'{sql}\n    ' + '\n    '.join(plan))
+        self.assertFalse(problems, 'Inefficient query plans:\n\n' + '\n\n'.join(problems))
+
+    def assertPagePlans(self, url, user=None, allow_sort=False):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertEfficientPlans(captured.captured_queries, allow_sort)
+
+    def test_home(self):
+        self.assertPagePlans('/')
+
+    def test_home_category(self):
+        self.assertPagePlans('/?category=technology')
+
+    def test_home_trending(self):
+        self.assertPagePlans('/?sort=trending')
+
+    def test_home_top_category(self):
+        self.assertPagePlans('/?sort=top&category=life')
+
+    def test_post_detail(self):
+        self.assertPagePlans(self.post.get_absolute_url(), user=self.authors[0])
+
+    def test_archive(self):
+        created_at = self.post.created_at
+        self.assertPagePlans(f'/archive/{created_at.year}/{created_at.month}/')
+
+    def test_search(self):
+        self.assertPagePlans('/search/?q=python')
+
+    def test_user_profile(self):
+        self.assertPagePlans('/user/author1/')
+
+    def test_dashboard(self):
+        self.assertPagePlans('/dashboard/', user=self.authors[1])
+
+    def test_api_list(self):
+        self.assertPagePlans('/api/posts/?limit=5')
+        self.assertPagePlans('/api/posts/?category=advice')
+        self.assertPagePlans('/api/posts/?author=author2')
+
+    def test_api_list_cursor(self):
+        cursor = self.client.get('/api/posts/?limit=5').json()['next_cursor']
+        self.assertPagePlans(f'/api/posts/?limit=5&cursor={cursor}')
+
+    def test_api_detail(self):
+        self.assertPagePlans(f'/api/posts/{self.post.slug}/')
+        self.assertPagePlans('/api/authors/author1/')
+
+    def test_approval_queue(self):
+        self.assertPagePlans('/admin-dashboard/', user=self.admin)
+        self.assertPagePlans('/admin-dashboard/?domain=spam.test&posts=0&page=2')
+
+    def test_new_post_notification(self):
+        with CaptureQueriesContext(connection) as captured:
+            send_new_post_notification(self.post)
+        self.assertEfficientPlans(captured.captured_queries)
+
+    def test_daily_digest(self):
+        with CaptureQueriesContext(connection) as captured:
+            send_digests(Newsletter.FREQUENCY_DAILY)
+        self.assertEfficientPlans(captured.captured_queries)
+
+    def test_scheduler(self):
+        now = timezone.now()
+        Post.objects.filter(slug__in=['post-0', 'post-7']).update(status='scheduled', created_at=now + timedelta(hours=1))
+        Post.objects.filter(slug='post-14').update(status='scheduled')
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(scheduling.publish_due(), 1)
+            self.assertEqual(scheduling.next_due(), now + timedelta(hours=1))
+            self.assertEqual(scheduling.send_pending_notifications(), 1)
+        self.assertEfficientPlans(captured.captured_queries)
+
+    def assertAdminPlans(self, url, search=False):
+        # Several pages, so the page query gets a LIMIT as it would on a real table.
+        # Search results are found through an index and only the matches are sorted.
+        with patch.object(ModelAdmin, 'list_per_page', 5):
+            self.assertPagePlans(url, user=self.admin, allow_sort=search)
+
+    def test_admin_posts(self):
+        self.assertAdminPlans('/admin/blog/post/')
+        self.assertAdminPlans('/admin/blog/post/?q=Post+1', search=True)
+        self.assertAdminPlans('/admin/blog/post/?q=author2&status__exact=draft', search=True)
+
+    def test_admin_likes(self):
+        self.assertAdminPlans('/admin/blog/like/')
+        self.assertAdminPlans('/admin/blog/like/?q=author1', search=True)
+
+    def test_admin_newsletter(self):
+        self.assertAdminPlans('/admin/newsletter/newsletter/')
+        self.assertAdminPlans('/admin/newsletter/newsletter/?q=reader1', search=True)
+
+
+class AdminSearchTests(TestCase):
+    """Admin searches match prefixes regardless of case or punctuation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        author = User.objects.create_user('Writer', password='pw')
+        for title in ['C++ Tips', 'Cats and dogs', 'Hello, World', 'hello again', 'Another post']:
+            post = Post.objects.create(title=title, author=author, content='<p>Body</p>', created_at=timezone.now())
+            Like.objects.create(post=post, user=cls.admin)
+        for email in ['Mixed.Case@example.com', 'mixed.other@example.com', 'reader@example.com']:
+            Newsletter.objects.create(email=email)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def search(self, url, term):
+        return sorted(str(obj) for obj in self.client.get(url, {'q': term}).context['cl'].queryset)
+
+    def test_post_title_prefix(self):
+        self.assertEqual(self.search('/admin/blog/post/', 'c++'), ['C++ Tips'])
+        self.assertEqual(self.search('/admin/blog/post/', 'HELLO'), ['Hello, World', 'hello again'])
+        self.assertEqual(self.search('/admin/blog/post/', 'hello, w'), ['Hello, World'])
+        self.assertEqual(self.search('/admin/blog/post/', 'world'), [])
+        # Usernames still match exactly
+        self.assertEqual(len(self.search('/admin/blog/post/', 'Writer')), 5)
+        self.assertEqual(self.search('/admin/blog/post/', 'writer'), [])
+
+    def test_like_post_title_prefix(self):
+        self.assertEqual(self.search('/admin/blog/like/', 'cats '), ['admin likes Cats and dogs'])
+
+    def test_subscriber_email_prefix(self):
+        url = '/admin/newsletter/newsletter/'
+        self.assertEqual(self.search(url, 'MIXED.'), ['Mixed.Case@example.com - Active', 'mixed.other@example.com - Active'])
+        self.assertEqual(self.search(url, 'mixed.case@'), ['Mixed.Case@example.com - Active'])
+
+
+class BulkStatusTests(TestCase):
+    """PostQuerySet.set_status bypasses post_save; derived tables must still follow it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='pw')
+        now = timezone.now()
+        for i in range(6):
+            Post.objects.create(
+                title=f'Post {i}',
+                author=author,
+                content='<p>Body</p>',
+                category=['life', 'advice'][i % 2],
+                status='published' if i < 4 else 'draft',
+                created_at=now - timedelta(days=40 * i),
+            )
+        Like.objects.bulk_create(Like(post=post, user=author) for post in Post.objects.all())
+        refresh_rankings(full=True)
+        authors.refresh()
+
+    def assertAggregatesMatch(self):
+        """Incrementally maintained counts equal a rebuild from the Post table"""
+        stored = {
+            (row.status, row.category, row.month): row.count
+            for row in PostAggregate.objects.filter(count__gt=0)
+        }
+        archive.rebuild()
+        rebuilt = {
+            (row.status, row.category, row.month): row.count
+            for row in PostAggregate.objects.filter(count__gt=0)
+        }
+        self.assertEqual(stored, rebuilt)
+
+    def test_publish_and_unpublish(self):
+        self.assertEqual(Post.objects.filter(category='life').set_status('published'), 1)
+        self.assertAggregatesMatch()
+        self.assertEqual(Post.objects.filter(category='life').set_status('draft'), 3)
+        self.assertAggregatesMatch()
+        self.assertEqual(Post.objects.filter(category='life').set_status('draft'), 0)
+
+        self.assertEqual(set(PostRanking.objects.values_list('post_id', 'status')), set(Post.objects.values_list('pk', 'status')))
+        self.assertEqual({post.category for post in ranked_posts('top')}, {'advice'})
+        self.assertEqual([month['count'] for month in archive.get_sidebar()['months']], [1, 1])
+
+    def test_author_stats(self):
+        profile = UserProfile.objects.get(user__username='author')
+        self.assertEqual((profile.published_posts, profile.likes_received), (4, 4))
+        Post.objects.filter(category='life').set_status('published')
+        Like.objects.filter(post__title='Post 0').delete()
+        Post.objects.get(title='Post 1').delete()
+        profile.refresh_from_db()
+        stored = (profile.published_posts, profile.likes_received, profile.latest_post_at)
+        authors.refresh()
+        profile.refresh_from_db()
+        self.assertEqual(stored, (profile.published_posts, profile.likes_received, profile.latest_post_at))
+        self.assertEqual(stored[:2], (4, 3))
+
+    def test_scheduled_publishing(self):
+        Newsletter.objects.create(email='reader@example.com').set_categories(['life'])
+        post = Post.objects.get(title='Post 4')
+        post.status = 'scheduled'
+        post.created_at = timezone.now() + timedelta(minutes=5)
+        post.save()
+        self.assertEqual(scheduling.next_due(), post.created_at)
+        self.assertEqual(scheduling.publish_due(), 0)
+
+        self.assertEqual(scheduling.publish_due(post.created_at), 1)
+        self.assertIsNone(scheduling.next_due())
+        self.assertAggregatesMatch()
+        self.assertEqual(UserProfile.objects.get(user__username='author').published_posts, 5)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(scheduling.send_pending_notifications(), 1)
+        self.assertEqual(scheduling.send_pending_notifications(), 0)
+        self.assertEqual([message.subject for message in mail.outbox], ['New Post: Post 4'])
+
+    def test_search_suggestions(self):
+        suggest.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(category='life').set_status('published')
+        self.assertEqual([entry.label for entry in suggest.suggest('post 4')], ['Post 4'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(category='advice').set_status('draft')
+        self.assertEqual([entry.label for entry in suggest.suggest('post', 10)], ['Post 0', 'Post 2', 'Post 4'])
+        coherence.poll(force=True)
+        with self.assertNumQueries(0):
+            response = self.client.get('/search/suggest/?q=auth')
+        self.assertEqual(response.json()['suggestions'], [{'kind': 'author', 'label': 'author', 'url': '/user/author/'}])
+
+
+class ArchiveTests(TestCase):
+    """Date archives and sidebar counts kept from Post save/delete signals"""
+
+    def setUp(self):
+        author = User.objects.create_user('author')
+        for title, category, status, day in [
+            ('January', 'life', 'published', date(2026, 1, 15)),
+            ('February', 'advice', 'published', date(2026, 2, 10)),
+            ('February draft', 'advice', 'draft', date(2026, 2, 20)),
+        ]:
+            Post.objects.create(
+                title=title, author=author, content='<p>Body</p>', category=category, status=status,
+                created_at=timezone.make_aware(datetime.combine(day, datetime.min.time())),
+            )
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def aggregates(self):
+        return {
+            (row.status, row.category, row.month): row.count
+            for row in PostAggregate.objects.filter(count__gt=0)
+        }
+
+    def test_archive_pages(self):
+        response = self.client.get('/archive/2026/2/')
+        self.assertEqual([post.title for post in response.context['posts']], ['February'])
+        self.assertContains(response, 'February 2026')
+        response = self.client.get('/archive/2026/')
+        self.assertEqual([post.title for post in response.context['posts']], ['February', 'January'])
+        self.assertEqual(self.client.get('/archive/2026/13/').status_code, 404)
+
+    def test_counts_follow_edits_and_deletes(self):
+        sidebar = archive.get_sidebar()
+        self.assertEqual([month['count'] for month in sidebar['months']], [1, 1])
+        self.assertEqual({c['value']: c['count'] for c in sidebar['categories'] if c['count']}, {'life': 1, 'advice': 1})
+
+        # Moved to another month and category, published, deleted
+        post = Post.objects.get(title='January')
+        post.category = 'advice'
+        post.created_at += timedelta(days=31)
+        post.save()
+        draft = Post.objects.get(title='February draft')
+        draft.status = 'published'
+        draft.save()
+        Post.objects.get(title='February').delete()
+
+        stored = self.aggregates()
+        archive.rebuild()
+        self.assertEqual(stored, self.aggregates())
+        sidebar = archive.get_sidebar()
+        self.assertEqual([(month['month'], month['count']) for month in sidebar['months']], [(date(2026, 2, 1), 2)])
+        self.assertEqual({c['value']: c['count'] for c in sidebar['categories'] if c['count']}, {'advice': 2})
+
+
+def locked_database(*args, **kwargs):
+    raise OperationalError('database is locked')
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author')
+        self.reader = User.objects.create_user('reader', password='pw')
+        now = timezone.now()
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', author=self.author, content='<p>Body</p>', status='published', created_at=now)
+            for i in range(2)
+        ]
+
+    def ranking(self, post):
+        return PostRanking.objects.get(post=post)
+
+    def test_older_likes_weigh_less(self):
+        half_life = timedelta(hours=settings.RANKING_HALF_LIFE_HOURS)
+        for post in self.posts:
+            Like.objects.create(post=post, user=self.reader)
+        Like.objects.filter(post=self.posts[1]).update(created_at=timezone.now() - half_life)
+        refresh_rankings()
+        self.assertAlmostEqual(self.ranking(self.posts[1]).trending_score / self.ranking(self.posts[0]).trending_score, 0.5, places=3)
+        self.assertEqual([post.pk for post in ranked_posts('trending')], [self.posts[0].pk, self.posts[1].pk])
+
+    def test_unlike_and_like_again_is_not_counted_twice(self):
+        post = self.posts[0]
+        self.client.force_login(self.reader)
+        self.client.post(f'/post/{post.slug}/like/')
+        refresh_rankings()
+        score = self.ranking(post).trending_score
+        for _ in range(3):
+            self.client.post(f'/post/{post.slug}/like/')
+            self.client.post(f'/post/{post.slug}/like/')
+            refresh_rankings()
+        self.assertAlmostEqual(self.ranking(post).trending_score, score, places=6)
+        self.assertEqual(self.ranking(post).like_count, 1)
+
+        # A post that only lost likes gets its count corrected too
+        self.client.post(f'/post/{post.slug}/like/')
+        refresh_rankings()
+        self.assertEqual((self.ranking(post).like_count, self.ranking(post).trending_score), (0, 0))
+
+        # Removing a like the refresh has not seen yet leaves nothing behind
+        like = Like.objects.create(post=self.posts[1], user=self.reader)
+        like.delete()
+        refresh_rankings()
+        self.assertFalse(PostRanking.objects.filter(post=self.posts[1]).exists())
+        self.assertFalse(LikeRemoval.objects.exists())
+
+
+class PrerenderTests(TestCase):
+    """Pages are re-rendered after the commit, on the pre-render thread"""
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        settings_override = override_settings(PRERENDER_ENABLED=True, PRERENDER_ROOT=root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create_user('author', password='pw')
+        self.author.profile.is_approved = True
+        self.author.profile.save()
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def run_scheduled(self, in_background):
+        for (refresh, *args), kwargs in in_background.call_args_list:
+            refresh(*args, **kwargs)
+        in_background.reset_mock()
+
+    def test_pages_follow_the_post(self):
+        self.client.force_login(self.author)
+        with patch.object(prerender, 'in_background') as in_background:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/post/create/', {
+                    'title': 'Rendered',
+                    'category': 'life',
+                    'content': '<p>Body</p>',
+                    'status': 'published',
+                    'created_at': '2026-01-01T10:00',
+                })
+            # Nothing is rendered on the author's request
+            page = prerender.output_path('/post/rendered/')
+            self.assertFalse(page.exists())
+            self.run_scheduled(in_background)
+            self.assertIn('Rendered', page.read_text())
+            self.assertIn('Rendered', prerender.output_path('/?category=life').read_text())
+            self.assertIn('Rendered', prerender.output_path('/user/author/').read_text())
+            # Rendered as an anonymous reader
+            self.assertNotIn('Logout', page.read_text())
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.filter(slug='rendered').set_status('draft')
+            self.run_scheduled(in_background)
+            self.assertFalse(page.exists())
+            self.assertNotIn('Rendered', prerender.output_path('/').read_text())
+
+
+class StalePageTests(TestCase):
+    """Public pages fall back to their last good copy while the database is locked"""
+
+    def setUp(self):
+        stale.breaker.record_success()
+        caches[stale.CACHE_ALIAS].clear()
+        metrics.reset()
+        author = User.objects.create_user('author')
+        self.post = Post.objects.create(
+            title='Still here', author=author, content='<p>Body</p>', status='published', created_at=timezone.now(),
+        )
+        self.client.raise_request_exception = False
+        coherence.poll(force=True)
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def test_stale_copy_and_breaker(self):
+        self.assertNotIn(stale.STALE_HEADER, self.client.get('/'))
+        with patch.object(SQLiteCursorWrapper, 'execute', locked_database):
+            for _ in range(stale.breaker.threshold):
+                response = self.client.get('/')
+                self.assertEqual(response[stale.STALE_HEADER], 'db-error')
+                self.assertContains(response, 'Still here')
+            # Open: served without trying the database
+            self.assertEqual(self.client.get('/')[stale.STALE_HEADER], 'breaker-open')
+            self.assertEqual(self.client.get('/post/still-here/').status_code, 500)
+        self.assertEqual(metrics.get('stale.breaker_opened'), 1)
+        self.assertEqual(metrics.get('stale.missed'), 1)
+
+    def test_unpublished_post_is_forgotten(self):
+        self.client.get('/post/still-here/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(pk=self.post.pk).set_status('draft')
+        with patch.object(SQLiteCursorWrapper, 'execute', locked_database):
+            self.assertEqual(self.client.get('/post/still-here/').status_code, 500)
+
+
+class ViewCountTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.post = Post.objects.create(
+            title='Counted', author=author, content='<p>Body</p>', status='published', created_at=timezone.now(),
+        )
+        view_counter.flush()
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def test_views_are_deduplicated_and_flushed(self):
+        counter = ViewCounter()
+        self.assertTrue(counter.record(self.post.pk, 'ip:1'))
+        self.assertFalse(counter.record(self.post.pk, 'ip:1'))
+        self.assertTrue(counter.record(self.post.pk, 'ip:2'))
+        self.assertEqual(counter.flush(), 2)
+        self.assertEqual(PostViewDaily.objects.get(post=self.post).views, 2)
+        self.assertEqual(PostViewHourly.objects.get(post=self.post).views, 2)
+
+    def test_failed_flush_keeps_the_counts(self):
+        counter = ViewCounter()
+        counter.record(self.post.pk, 'ip:1')
+        with patch.object(SQLiteCursorWrapper, 'execute', locked_database):
+            self.assertEqual(counter.flush(), 0)
+        counter.record(self.post.pk, 'ip:2')
+        self.assertEqual(counter.flush(), 2)
+        self.assertEqual(PostViewDaily.objects.get(post=self.post).views, 2)
+
+    @override_settings(VIEW_COUNT_FLUSH_SIZE=1)
+    def test_request_does_not_flush_inline(self):
+        with patch.object(view_counter, 'flush_in_background') as flush_in_background:
+            # An address no other test uses, so the hit is not deduplicated
+            self.assertEqual(self.client.get('/post/counted/', REMOTE_ADDR='192.0.2.27').status_code, 200)
+        flush_in_background.assert_called_once_with()
+        self.assertFalse(PostViewDaily.objects.exists())
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name, UPLOAD_CHUNK_SIZE=1000)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = User.objects.create_user('author', password='pw')
+        author.profile.is_approved = True
+        author.profile.save()
+        self.client.force_login(author)
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def send(self, url, data, offset):
+        return self.client.generic(
+            'PATCH', url, data, content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_resumed_upload_becomes_post_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'teal').save(buffer, 'BMP')
+        data = buffer.getvalue()
+        upload = self.client.post('/uploads/', {'filename': 'photo.bmp', 'size': len(data), 'kind': 'image'}).json()
+
+        # A chunk cut short, then one resent from the start: the server's offset says where to go on
+        self.assertEqual(self.send(upload['url'], data[:600], 0).json()['offset'], 600)
+        response = self.send(upload['url'], data[:1000], 0)
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 600))
+        offset = 600
+        while offset < len(data):
+            offset = self.send(upload['url'], data[offset:offset + 1000], offset).json()['offset']
+
+        response = self.client.post(upload['complete_url'], {'sha256': hashlib.sha256(data).hexdigest()})
+        self.assertTrue(response.json()['complete'])
+        self.client.post('/post/create/', {
+            'title': 'With image',
+            'category': 'life',
+            'content': '<p>Body</p>',
+            'status': 'draft',
+            'created_at': '2026-01-01T10:00',
+            'image_upload': upload['id'],
+        })
+        post = Post.objects.get(title='With image')
+        self.assertEqual(post.image.name, response.json()['name'])
+        with post.image.open('rb') as image:
+            self.assertEqual(image.read(), data)
+
+    def test_checksum_mismatch(self):
+        upload = self.client.post('/uploads/', {'filename': 'photo.png', 'size': 10, 'kind': 'attachment'}).json()
+        self.send(upload['url'], b'0123456789', 0)
+        response = self.client.post(upload['complete_url'], {'sha256': hashlib.sha256(b'something else').hexdigest()})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(upload['url']).status_code, 404)
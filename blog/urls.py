@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('post/create/', views.post_create_view, name='post_create'),
@@ -7,5 +7,14 @@ urlpatterns = [
     path('post/<slug:slug>/edit/', views.post_edit_view, name='post_edit'),
     path('post/<slug:slug>/delete/', views.post_delete_view, name='post_delete'),
     path('post/<slug:slug>/like/', views.post_like_view, name='post_like'),
+    path('post/<slug:slug>/view/', views.post_view_beacon_view, name='post_view_beacon'),
     path('search/', views.search_view, name='search'),
+    path('search/suggest/', views.search_suggest_view, name='search_suggest'),
+    path('archive/<int:year>/', views.archive_view, name='archive_year'),
+    path('archive/<int:year>/<int:month>/', views.archive_view, name='archive_month'),
+
+    # Read-only JSON API
+    path('api/posts/', api.post_list_api_view, name='api_post_list'),
+    path('api/posts/<slug:slug>/', api.post_detail_api_view, name='api_post_detail'),
+    path('api/authors/<str:username>/', api.author_api_view, name='api_author'),
 ]
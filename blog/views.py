@@ -1,34 +1,78 @@
+import logging
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Count
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models import Post, Like
 from .forms import PostForm
+from .analytics import record_view
+from .archive import get_sidebar, month_bounds
+from .prerender import PRERENDER_HEADER
+from . import suggest
+from .ranking import ranked_posts
 from newsletter.utils import send_new_post_notification
+from core.logs import logged_operation
+
+logger = logging.getLogger(__name__)
 
 
 def home_view(request):
     """Home page showing all published posts"""
-    posts = Post.objects.filter(status='published').select_related('author').prefetch_related('likes')
-
-    # Category filter
     category = request.GET.get('category')
-    if category:
-        posts = posts.filter(category=category)
+
+    # Trending / most liked sorts read precomputed ranks
+    sort = request.GET.get('sort')
+    if sort in ('trending', 'top'):
+        posts = ranked_posts(sort, category)
+    else:
+        sort = None
+        posts = Post.objects.filter(status='published')
+
+        # Category filter
+        if category:
+            posts = posts.filter(category=category)
+
+    posts = posts.select_related('author').with_likes()
 
     context = {
         'posts': posts,
         'selected_category': category,
+        'selected_sort': sort,
+        'sidebar': get_sidebar(),
     }
 
     return render(request, 'blog/home.html', context)
 
 
+def archive_view(request, year, month=None):
+    """Published posts from one year or month"""
+    if not 1 <= year < 9999 or (month is not None and not 1 <= month <= 12):
+        raise Http404('Invalid archive date.')
+    start, end = month_bounds(year, month)
+    posts = Post.objects.filter(
+        status='published',
+        created_at__gte=start,
+        created_at__lt=end,
+    ).select_related('author').with_likes()
+
+    context = {
+        'posts': posts,
+        'archive_title': start.strftime('%B %Y') if month else str(year),
+        'sidebar': get_sidebar(),
+    }
+
+    return render(request, 'blog/archive.html', context)
+
+
 def post_detail_view(request, slug):
     """View individual post details"""
     post = get_object_or_404(
-        Post.objects.select_related('author').prefetch_related('likes'),
+        Post.objects.select_related('author').with_likes(),
         slug=slug
     )
 
@@ -38,14 +82,27 @@ def post_detail_view(request, slug):
             messages.error(request, 'This post is not available.')
             return redirect('home')
 
+    record_view(request, post)
+
     context = {
         'post': post,
         'is_liked': post.is_liked_by(request.user),
+        # Static copies count views through post_view_beacon_view instead
+        'is_prerender': PRERENDER_HEADER in request.META,
     }
 
     return render(request, 'blog/post_detail.html', context)
 
 
+@csrf_exempt
+@require_POST
+def post_view_beacon_view(request, slug):
+    """Count a view of a pre-rendered post page served without Django"""
+    post = get_object_or_404(Post.objects.only('id', 'status'), slug=slug)
+    record_view(request, post)
+    return HttpResponse(status=204)
+
+
 @login_required
 def post_create_view(request):
     """Create a new blog post (approved users only)"""
@@ -55,7 +112,7 @@ def post_create_view(request):
         return redirect('home')
 
     if request.method == 'POST':
-        form = PostForm(request.POST, request.FILES)
+        form = PostForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
@@ -63,10 +120,8 @@ def post_create_view(request):
 
             # Send newsletter notification if published
             if post.status == 'published':
-                try:
+                with logged_operation(logger, 'newsletter.new_post', post_id=post.pk):
                     send_new_post_notification(post)
-                except Exception as e:
-                    print(f"Error sending newsletter: {e}")
 
             messages.success(request, f'Post "{post.title}" created successfully!')
             return redirect('post_detail', slug=post.slug)
@@ -86,11 +141,11 @@ def post_edit_view(request, slug):
         messages.error(request, 'You do not have permission to edit this post.')
         return redirect('post_detail', slug=slug)
 
-    # Track if post is being published for the first time
-    was_draft = post.status == 'draft'
+    # Track if post is being published for the first time (a draft, or published ahead of its schedule)
+    was_draft = post.status != 'published'
 
     if request.method == 'POST':
-        form = PostForm(request.POST, request.FILES, instance=post)
+        form = PostForm(request.POST, request.FILES, instance=post, user=request.user)
         if form.is_valid():
             # Check if title changed and regenerate slug
             if post.title != form.cleaned_data['title']:
@@ -100,10 +155,8 @@ def post_edit_view(request, slug):
 
             # Send newsletter notification if just published
             if was_draft and post.status == 'published':
-                try:
+                with logged_operation(logger, 'newsletter.new_post', post_id=post.pk):
                     send_new_post_notification(post)
-                except Exception as e:
-                    print(f"Error sending newsletter: {e}")
 
             messages.success(request, f'Post "{post.title}" updated successfully!')
             return redirect('post_detail', slug=post.slug)
@@ -177,7 +230,7 @@ def search_view(request):
         posts = Post.objects.filter(
             Q(title__icontains=query) | Q(content__icontains=query),
             status='published'
-        ).select_related('author').prefetch_related('likes')
+        ).select_related('author').with_likes()
 
     context = {
         'posts': posts,
@@ -185,3 +238,13 @@ def search_view(request):
     }
 
     return render(request, 'blog/search.html', context)
+
+
+def search_suggest_view(request):
+    """Search-box autocomplete from the in-memory prefix index (no database queries)"""
+    query = request.GET.get('q', '')[:100]
+    suggestions = [
+        {'kind': suggest.KIND_NAMES[entry.kind], 'label': entry.label, 'url': suggest.url_for(entry)}
+        for entry in suggest.suggest(query, getattr(settings, 'SEARCH_SUGGEST_LIMIT', 8))
+    ]
+    return JsonResponse({'query': query, 'suggestions': suggestions})
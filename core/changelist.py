@@ -0,0 +1,67 @@
+"""
+Admin changelist helpers for large tables.
+
+Django's admin counts every matching row on each page load and searches
+with icontains, which reads whole tables. EstimatedCountPaginator bounds
+the count, and prefix_search builds lookups that use an ordinary B-tree
+index (or an index on LOWER(column) for case-insensitive search) on any
+database.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.utils.functional import cached_property
+
+
+def estimate_rows(model, using='default'):
+    """Approximate row count from table statistics, or None when unavailable"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table has been vacuumed or analyzed
+        return row[0] if row and row[0] >= 0 else None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        # Highest id, read from the end of the primary key index
+        return model._default_manager.using(using).aggregate(estimate=Max('pk'))['estimate'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts more than ADMIN_EXACT_COUNT_LIMIT rows.
+
+    Unfiltered lists over larger tables report the database's estimate;
+    filtered lists count up to the limit and page through that many.
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by().values('pk')[:limit].count()
+
+
+def prefix_search(field, term):
+    """
+    Rows whose field starts with term, as a range an index on field can serve.
+
+    field is a field name or an expression such as Lower('email'), for which
+    the model needs an index on the same expression.
+    """
+    if isinstance(field, str):
+        return Q(**{f'{field}__gte': term, f'{field}__lt': term + '\uffff'})
+    return Q(GreaterThanOrEqual(field, term), LessThan(field, term + '\uffff'))
+
+
+def case_insensitive_prefix_search(field, term):
+    """prefix_search on LOWER(field); needs an index on Lower(field)"""
+    return prefix_search(Lower(field), term.lower())
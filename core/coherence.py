@@ -0,0 +1,191 @@
+"""
+Cross-process cache coherence.
+
+Every app process (gunicorn worker, runserver, management command) keeps
+some state of its own: the local-memory cache, cached sessions, access
+rules. When one process changes something another may have cached, it
+calls publish(), which applies the invalidation locally and, once the
+transaction commits, appends a row to core.InvalidationEvent. Every process
+reads the rows it has not seen yet at the start of a request, at most once
+per COHERENCE_POLL_SECONDS, so no process serves state older than that
+interval plus one request. Rows older than COHERENCE_RETENTION_SECONDS are
+deleted by the prune_invalidation_events command, off the request path; a
+process that has not polled for that long drops its local caches instead
+of replaying events.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import InvalidationEvent
+
+logger = logging.getLogger(__name__)
+
+# Events applied per poll; a backlog larger than this is worked off over several requests
+POLL_BATCH_SIZE = 500
+
+_handlers = {}
+_reset_handlers = []
+
+
+def register(kind, handler):
+    """Call handler(key) whenever an event of this kind is published by another process"""
+    _handlers[kind] = handler
+
+
+def register_reset(handler):
+    """Call handler() when a process missed events and must drop all of its local state"""
+    _reset_handlers.append(handler)
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.node_id = f'{socket.gethostname()}:{self.pid}:{uuid.uuid4().hex[:8]}'
+        self.last_id = None
+        self.last_poll = None
+
+
+_state = _State()
+
+
+def _get_state():
+    global _state
+    # Forked workers must not share the parent's identity or position
+    if _state.pid != os.getpid():
+        _state = _State()
+    return _state
+
+
+def node_id():
+    return _get_state().node_id
+
+
+def _apply(kind, key):
+    handler = _handlers.get(kind)
+    if handler is None:
+        logger.warning('coherence.unknown_event', extra={'kind': kind, 'key': key})
+        return
+    handler(key)
+
+
+def publish(kind, key='', local=True):
+    """
+    Invalidate something in every process.
+
+    The invalidation is applied here immediately (unless local=False, for
+    callers that have just written the fresh value themselves) and again
+    when the current transaction commits, when it is also broadcast.
+    """
+    if local:
+        _apply(kind, key)
+
+    origin = node_id()
+
+    def broadcast():
+        if local:
+            # Drop anything this process rebuilt from pre-commit data meanwhile
+            _apply(kind, key)
+        InvalidationEvent.objects.create(kind=kind, key=key, origin=origin)
+
+    transaction.on_commit(broadcast)
+
+
+def invalidate_cache(key, alias='default', local=True):
+    """Delete a cache key in this process and every other one"""
+    publish('cache', f'{alias}:{key}', local=local)
+
+
+def _delete_cache_key(value):
+    alias, key = value.split(':', 1)
+    caches[alias].delete(key)
+
+
+def _clear_local_caches():
+    # Shared backends (Redis, Memcached, database) are already coherent
+    for cache in caches.all(initialized_only=True):
+        if isinstance(cache, LocMemCache):
+            cache.clear()
+
+
+register('cache', _delete_cache_key)
+register_reset(_clear_local_caches)
+
+
+def poll(force=False):
+    """Apply events published by other processes since the last poll; returns how many were applied"""
+    state = _get_state()
+    interval = getattr(settings, 'COHERENCE_POLL_SECONDS', 1.0)
+    retention = getattr(settings, 'COHERENCE_RETENTION_SECONDS', 3600)
+    now = time.monotonic()
+
+    if not force and state.last_poll is not None and now - state.last_poll < interval:
+        return 0
+    if not state.lock.acquire(blocking=False):
+        # Another thread of this process is polling right now
+        return 0
+
+    try:
+        if state.last_id is None or now - state.last_poll > retention:
+            # First poll, or events may have been pruned since: start from a clean slate
+            if state.last_id is not None:
+                for handler in _reset_handlers:
+                    handler()
+            state.last_id = InvalidationEvent.objects.aggregate(last=Max('id'))['last'] or 0
+            state.last_poll = now
+            return 0
+
+        applied = 0
+        events = (
+            InvalidationEvent.objects.filter(id__gt=state.last_id)
+            .order_by('id')
+            .values_list('id', 'kind', 'key', 'origin')[:POLL_BATCH_SIZE]
+        )
+        for event_id, kind, key, origin in events:
+            if origin != state.node_id:
+                _apply(kind, key)
+                applied += 1
+            state.last_id = event_id
+        state.last_poll = now
+        return applied
+    except DatabaseError:
+        # Retry after the usual interval rather than on every request while the database is busy
+        state.last_poll = now
+        raise
+    finally:
+        state.lock.release()
+
+
+def prune(retention=None):
+    """Delete events every process has had time to see"""
+    if retention is None:
+        retention = getattr(settings, 'COHERENCE_RETENTION_SECONDS', 3600)
+    cutoff = timezone.now() - timedelta(seconds=retention)
+    return InvalidationEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+class CoherenceMiddleware:
+    """Catch up on other processes' invalidations before handling a request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            poll()
+        except DatabaseError:
+            # Invalidations wait for the next poll; the request may not need the database at all
+            logger.warning('Polling for invalidation events failed', exc_info=True)
+        return self.get_response(request)
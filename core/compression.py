@@ -0,0 +1,151 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses dynamic responses with brotli when the
+optional brotli package is installed and the client accepts it, and with
+gzip otherwise; pages that embed a CSRF token always get gzip, whose output
+is padded against BREACH. Only text-like content types above COMPRESS_MIN_SIZE are
+compressed; images, ranges and already-encoded responses pass through
+untouched. The same helpers produce the .gz/.br siblings that
+collectstatic writes next to hashed static files (core.storage).
+"""
+import gzip
+import mimetypes
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset({
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'application/rss+xml',
+    'application/atom+xml',
+    'image/svg+xml',
+    'font/ttf',
+    'font/otf',
+})
+
+# gzip output gets up to this many random bytes in its header, so the length
+# of a compressed page never reveals whether a guessed secret matched (BREACH)
+MAX_RANDOM_BYTES = 100
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([a-z*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE_TYPES
+
+
+def is_compressible_path(path):
+    content_type, _ = mimetypes.guess_type(str(path))
+    return content_type is not None and is_compressible(content_type)
+
+
+def accepted_encodings(header):
+    """Encodings the client accepts, ignoring those with q=0"""
+    accepted = set()
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def choose_encoding(request):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    # brotli output cannot be padded like gzip's, so pages that carry a CSRF
+    # token are only ever gzipped
+    if brotli is not None and 'br' in accepted and not request.META.get('CSRF_COOKIE_USED'):
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def brotli_compress(data, quality):
+    return brotli.compress(data, quality=quality)
+
+
+def brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def gzip_static(data):
+    """Deterministic, maximum-level gzip for files compressed once at build time"""
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        min_size = getattr(settings, 'COMPRESS_MIN_SIZE', 200)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        if response.has_header('Content-Encoding') or response.status_code == 206:
+            return response
+        if getattr(response, 'is_async', False):
+            return response
+        if not is_compressible(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+
+        quality = getattr(settings, 'COMPRESS_BROTLI_QUALITY', 5)
+        if response.streaming:
+            if encoding == 'br':
+                response.streaming_content = brotli_sequence(response.streaming_content, quality)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content,
+                    max_random_bytes=MAX_RANDOM_BYTES,
+                )
+            # The compressed size is unknown until the body has been streamed
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli_compress(response.content, quality)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=MAX_RANDOM_BYTES)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag would claim byte-for-byte identity with the uncompressed body
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
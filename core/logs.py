@@ -0,0 +1,163 @@
+"""
+Structured, non-blocking logging.
+
+Records are put on an in-memory queue by the request thread and written as
+one JSON object per line by a QueueListener thread, so a slow stderr or log
+collector never stalls a request. Every event carries the id of the request
+that produced it (RequestIdMiddleware), and logged_operation() adds
+durations and failure counters around work that must not break a request,
+such as sending mail.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+
+# Attributes every LogRecord has; anything else was passed through extra=
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single-line JSON object"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that only does the cheap part of formatting on the caller's
+    thread: the request id is captured and the traceback rendered (it cannot
+    cross threads), while JSON encoding and I/O happen in the listener.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listeners = []
+
+
+def queue_handler(stream=None):
+    """
+    Handler factory for LOGGING: returns a QueueHandler whose listener writes
+    JSON lines to stream (stderr by default).
+    """
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    return QueueHandler(log_queue)
+
+
+def _stop_listeners():
+    """Flush queued records on interpreter exit"""
+    for listener in _listeners:
+        if listener._thread is not None:
+            listener.stop()
+
+
+def _restart_listeners():
+    # Threads do not survive fork(); with gunicorn's preload_app the listener
+    # was started in the master, so each worker needs its own
+    for listener in _listeners:
+        listener._thread = None
+        listener.start()
+
+
+atexit.register(_stop_listeners)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners)
+
+
+class RequestIdMiddleware:
+    """
+    Tag everything logged during a request with a request id (taken from an
+    upstream X-Request-ID header when present) and return it to the client.
+    Requests slower than SLOW_REQUEST_MS are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        token = request_id_var.set(request_id[:64])
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration_ms = round((time.perf_counter() - start) * 1000, 3)
+            level = logging.WARNING if duration_ms > getattr(settings, 'SLOW_REQUEST_MS', 1000) else logging.DEBUG
+            logger.log(level, 'request.finished', extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': duration_ms,
+            })
+            response['X-Request-ID'] = request_id_var.get()
+            return response
+        finally:
+            request_id_var.reset(token)
+
+
+@contextmanager
+def logged_operation(log, event, **fields):
+    """
+    Run a block whose failure must not fail the caller.
+
+    Logs "<event>.succeeded" or "<event>.failed" with the duration and the
+    given fields, counts both outcomes in core.metrics, and swallows the
+    exception after logging it with its traceback.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        fields['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        fields['failures_total'] = metrics.increment(f'{event}.failed')
+        log.exception(f'{event}.failed', extra=fields)
+    else:
+        fields['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        metrics.increment(f'{event}.succeeded')
+        log.info(f'{event}.succeeded', extra=fields)
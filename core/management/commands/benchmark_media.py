@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.media import serve_media
+
+
+class Command(BaseCommand):
+    help = 'Compare Django-side cost of streaming media from Python vs handing off with X-Accel-Redirect/X-Sendfile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=20, help='Size of the test file')
+        parser.add_argument('--requests', type=int, default=20)
+
+    def run(self, factory, path, mode, count, headers=None):
+        transferred = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            request = factory.get('/media/benchmark.bin', **(headers or {}))
+            response = serve_media(request, 'benchmark.bin', path, mode=mode)
+            if response.streaming:
+                for chunk in response.streaming_content:
+                    transferred += len(chunk)
+            else:
+                transferred += len(response.content)
+        return time.perf_counter() - start, transferred
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        count = options['requests']
+        factory = RequestFactory()
+
+        with tempfile.NamedTemporaryFile(suffix='.bin') as media_file:
+            block = os.urandom(1024 * 1024)
+            for _ in range(options['size_mb']):
+                media_file.write(block)
+            media_file.flush()
+
+            results = [
+                ('Python streaming', *self.run(factory, media_file.name, '', count)),
+                ('Python streaming, 1 MB range', *self.run(
+                    factory, media_file.name, '', count, {'HTTP_RANGE': f'bytes={size // 2}-{size // 2 + 1024 * 1024 - 1}'},
+                )),
+                ('X-Accel-Redirect', *self.run(factory, media_file.name, 'nginx', count)),
+                ('X-Sendfile', *self.run(factory, media_file.name, 'sendfile', count)),
+            ]
+
+        self.stdout.write(
+            f"{options['size_mb']} MB file, {count} requests each. Times are worker-side only; with streaming, "
+            'the worker is also tied up for the whole network transfer, which is not included here.'
+        )
+        for label, seconds, transferred in results:
+            per_request = seconds / count * 1000
+            throughput = transferred / seconds / 1024 / 1024 if transferred and seconds else 0
+            self.stdout.write(
+                f'{label:<30}{per_request:10.3f} ms/request'
+                + (f'{throughput:10.1f} MB/s through Python' if transferred else '   (bytes sent by the web server)')
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import clear_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked upload sessions, and their partial files, untouched for UPLOAD_SESSION_HOURS'
+
+    def handle(self, *args, **options):
+        deleted = clear_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired upload sessions.'))
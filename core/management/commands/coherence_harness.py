@@ -0,0 +1,195 @@
+import http.cookiejar
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Set in the environment of the re-executed command and of every node it starts
+SANDBOX_ENV = 'COHERENCE_HARNESS_SANDBOX'
+
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Browser:
+    """Minimal cookie-keeping HTTP client that talks to any node"""
+
+    def __init__(self):
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def request(self, url, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(url, body, timeout=10) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode(errors='replace')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def category_count(html, category):
+    match = re.search(rf'\?category={category}"[^>]*>[^<]*</a>\s*<span[^>]*>(\d+)</span>', html)
+    return int(match.group(1)) if match else None
+
+
+class Command(BaseCommand):
+    help = (
+        'Start several app server processes on one machine against a shared database, edit a post and '
+        'log a user out through one of them, and check every node reflects the changes within a bound'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=3)
+        parser.add_argument('--poll-seconds', type=float, default=1.0, help='COHERENCE_POLL_SECONDS for the nodes')
+        parser.add_argument('--bound', type=float, default=None, help='Maximum seconds until a node shows a change')
+
+    def handle(self, *args, **options):
+        if os.environ.get(SANDBOX_ENV):
+            return self.run_in_sandbox(options)
+
+        # Re-run this command against a throwaway database so the real one is never touched
+        workdir = tempfile.mkdtemp(prefix='coherence-')
+        env = {
+            **os.environ,
+            SANDBOX_ENV: '1',
+            'DATABASE_PATH': os.path.join(workdir, 'db.sqlite3'),
+            'DEBUG': 'True',
+            'PRERENDER_ENABLED': 'False',
+            'COHERENCE_POLL_SECONDS': str(options['poll_seconds']),
+        }
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'coherence_harness', '--nodes', str(options['nodes'])]
+        if options['bound'] is not None:
+            command += ['--bound', str(options['bound'])]
+        try:
+            result = subprocess.run(command, env=env)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if result.returncode:
+            raise CommandError('Coherence check failed.')
+
+    def run_in_sandbox(self, options):
+        from django.contrib.auth.models import User
+        from blog.models import Post
+
+        bound = options['bound'] or settings.COHERENCE_POLL_SECONDS + 2
+        call_command('migrate', verbosity=0)
+        user = User.objects.create_user('coherence', password='coherence-harness')
+        post = Post.objects.create(
+            title='Coherence check',
+            author=user,
+            content='<p>Before</p>',
+            category='technology',
+            status='published',
+            created_at=timezone.now(),
+        )
+
+        nodes = []
+        try:
+            for _ in range(options['nodes']):
+                port = free_port()
+                process = subprocess.Popen(
+                    [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', f'127.0.0.1:{port}', '--noreload'],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                nodes.append((f'http://127.0.0.1:{port}', process))
+            self.wait_until_up(nodes)
+            self.stdout.write(f"{len(nodes)} nodes up; bound {bound:.1f}s")
+
+            # Fill every node's local caches, and log in on the first node
+            browser = Browser()
+            for url, _ in nodes:
+                browser.request(url + '/')
+            status, html = browser.request(nodes[0][0] + '/login/')
+            browser.request(nodes[0][0] + '/login/', {
+                'username': 'coherence',
+                'password': 'coherence-harness',
+                'csrfmiddlewaretoken': CSRF_RE.search(html).group(1),
+            })
+            for url, _ in nodes:
+                status, _ = browser.request(url + '/dashboard/')
+                if status != 200:
+                    raise CommandError(f'{url} did not see the login')
+
+            # Edit the post from this process, which plays the part of another node
+            post.title = 'Coherence check (edited)'
+            post.category = 'life'
+            post.save()
+            post_delays = self.time_until(nodes, bound, lambda url: self.sees_edit(url, post))
+
+            # Log out through the last node; every node must stop accepting the session
+            browser.request(nodes[-1][0] + '/logout/')
+            logout_delays = self.time_until(nodes, bound, lambda url: browser.request(url + '/dashboard/')[0] == 302)
+        finally:
+            for _, process in nodes:
+                process.terminate()
+            for _, process in nodes:
+                process.wait()
+
+        failed = False
+        self.stdout.write(f"{'Node':<28}{'post edit visible':>20}{'logout visible':>18}")
+        for (url, _), post_delay, logout_delay in zip(nodes, post_delays, logout_delays):
+            ok = post_delay is not None and logout_delay is not None
+            failed |= not ok
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(
+                f'{url:<28}{self.format_delay(post_delay):>20}{self.format_delay(logout_delay):>18}'
+            ))
+        if failed:
+            sys.exit(1)
+
+    def wait_until_up(self, nodes, timeout=30):
+        deadline = time.monotonic() + timeout
+        for url, process in nodes:
+            while True:
+                try:
+                    urllib.request.urlopen(url + '/', timeout=2).close()
+                    break
+                except (urllib.error.URLError, ConnectionError):
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise CommandError(f'{url} did not start')
+                    time.sleep(0.2)
+
+    def sees_edit(self, url, post):
+        status, html = Browser().request(url + '/')
+        return (
+            'Coherence check (edited)' in html
+            and category_count(html, 'life') == 1
+            and category_count(html, 'technology') == 0
+        )
+
+    def time_until(self, nodes, bound, check):
+        """Seconds until check(url) holds for each node, or None if it did not within the bound"""
+        start = time.monotonic()
+        delays = {}
+        while len(delays) < len(nodes) and time.monotonic() - start <= bound:
+            for url, _ in nodes:
+                if url not in delays and check(url):
+                    delays[url] = time.monotonic() - start
+            time.sleep(0.05)
+        return [delays.get(url) for url, _ in nodes]
+
+    def format_delay(self, delay):
+        return 'not within bound' if delay is None else f'{delay:.2f}s'
@@ -0,0 +1,86 @@
+import os
+import re
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import FileField
+
+from blog.models import Post
+from core.models import UploadSession
+from core.storage import BLOB_DIR, ContentAddressedStorage
+
+BLOB_URL_PATTERN = re.compile(rf'{BLOB_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(?:\.\w+)?')
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that no row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list the blobs that would be deleted')
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Keep blobs newer than this, so uploads whose row is not saved yet survive',
+        )
+
+    def file_fields(self):
+        """(model, field name) for every FileField"""
+        for model in apps.get_models():
+            for field in model._meta.fields:
+                if isinstance(field, FileField):
+                    yield model, field.name
+
+    def referenced_names(self):
+        names = set()
+        for model, field_name in self.file_fields():
+            names.update(
+                model._default_manager.exclude(**{field_name: ''})
+                .exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True)
+                .iterator()
+            )
+        # Completed uploads not attached to a post yet
+        names.update(UploadSession.objects.exclude(stored_name='').values_list('stored_name', flat=True).iterator())
+        # Editor images are embedded in post bodies by URL
+        for content in Post.objects.values_list('content', flat=True).iterator():
+            names.update(BLOB_URL_PATTERN.findall(content))
+        return names
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('The default storage is not ContentAddressedStorage.')
+
+        referenced = self.referenced_names()
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        candidates = []
+        for name, path in default_storage.iter_blobs():
+            if name in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime <= cutoff:
+                candidates.append((name, path, stat.st_size))
+
+        if options['dry_run']:
+            for name, _, _ in candidates:
+                self.stdout.write(f'Would delete {name}')
+            removed = candidates
+        else:
+            # One more scan, for rows saved while the blobs were listed
+            referenced = self.referenced_names() if candidates else set()
+            removed = []
+            for name, path, size in candidates:
+                try:
+                    # Re-uploaded since (adopt() refreshes the mtime) or referenced again
+                    if name in referenced or os.stat(path).st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed.append((name, path, size))
+
+        freed = sum(size for _, _, size in removed)
+        verb = 'Would free' if options['dry_run'] else 'Freed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {freed / 1024 / 1024:.1f} MB in {len(removed)} unreferenced blobs.'))
@@ -0,0 +1,119 @@
+import re
+import secrets
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from blog.analytics import view_counter
+from blog.models import Post
+
+WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+CONFIGURATIONS = [
+    ('Django defaults (db sessions, fallback messages)', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.fallback.FallbackStorage',
+    }),
+    ('db sessions, session-stored messages', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.session.SessionStorage',
+    }),
+    ('core.sessions + cookie messages (current)', {
+        'SESSION_ENGINE': 'core.sessions',
+        'MESSAGE_STORAGE': 'django.contrib.messages.storage.cookie.CookieStorage',
+    }),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Count session reads and database writes per request for a browse-and-like visit under each session setup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5, help='Posts viewed and liked during the visit')
+
+    def visit(self, client, slugs, password):
+        """A reader logs in, browses, likes and unlikes posts and checks their dashboard; returns the request count"""
+        requests = [('post', '/login/', {'username': 'session-benchmark', 'password': password}), ('get', '/', None)]
+        for slug in slugs:
+            requests += [
+                ('get', f'/post/{slug}/', None),
+                ('post', f'/post/{slug}/like/', None),
+                ('get', f'/post/{slug}/', None),
+            ]
+        requests += [
+            ('post', f'/post/{slugs[0]}/like/', None),
+            ('get', f'/post/{slugs[0]}/', None),
+            ('get', '/dashboard/', None),
+            ('get', '/logout/', None),
+            ('get', '/', None),
+        ]
+        for method, path, data in requests:
+            response = getattr(client, method)(path, data)
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {path} returned {response.status_code}')
+        return len(requests)
+
+    def measure(self, options, password):
+        user = User.objects.create_user('session-benchmark', password=password)
+        user.profile.is_approved = True
+        user.profile.save()
+        slugs = [
+            Post.objects.create(
+                title=f'Session benchmark {i}',
+                author=user,
+                content='<p>Benchmark</p>',
+                status='published',
+                created_at=timezone.now(),
+            ).slug
+            for i in range(options['pages'])
+        ]
+
+        results = []
+        for label, overrides in CONFIGURATIONS:
+            with override_settings(SECURE_SSL_REDIRECT=False, **overrides), CaptureQueriesContext(connection) as captured:
+                client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+                requests = self.visit(client, slugs, password)
+            queries = [query['sql'] for query in captured.captured_queries]
+            session = [sql for sql in queries if '"django_session"' in sql]
+            results.append((
+                label,
+                requests,
+                sum(1 for sql in session if not WRITE_RE.match(sql)),
+                sum(1 for sql in session if WRITE_RE.match(sql)),
+                sum(1 for sql in queries if WRITE_RE.match(sql)),
+                len(queries),
+            ))
+        view_counter.flush()
+        return results
+
+    def handle(self, *args, **options):
+        password = secrets.token_urlsafe()
+
+        # Everything runs in one transaction that is rolled back at the end
+        results = []
+        try:
+            with transaction.atomic():
+                results = self.measure(options, password)
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"{results[0][1]} requests per visit ({options['pages']} posts viewed and liked)")
+        self.stdout.write(f"{'Configuration':<52}{'session reads':>15}{'session writes':>16}{'all writes':>12}{'queries':>9}")
+        for label, requests, reads, writes, all_writes, total in results:
+            self.stdout.write(f'{label:<52}{reads:>15}{writes:>16}{all_writes:>12}{total:>9}')
+        self.stdout.write('Per request:')
+        for label, requests, reads, writes, all_writes, total in results:
+            self.stdout.write(
+                f'{label:<52}{reads / requests:>15.2f}{writes / requests:>16.2f}'
+                f'{all_writes / requests:>12.2f}{total / requests:>9.2f}'
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.coherence import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete cross-process invalidation events older than COHERENCE_RETENTION_SECONDS'
+
+    def handle(self, *args, **options):
+        deleted = prune()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} invalidation events.'))
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Report import and django.setup() time per installed app, measured in a fresh interpreter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Measure this many cold starts and keep the fastest')
+
+    def measure(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'ofori_blog.settings')}
+        result = subprocess.run(
+            [sys.executable, '-m', 'core.startup_profile'],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout)
+
+    def handle(self, *args, **options):
+        runs = [self.measure() for _ in range(max(1, options['runs']))]
+        report = min(runs, key=lambda run: run['setup'])
+
+        self.stdout.write(f"import django:      {report['django_import'] * 1000:8.1f}ms")
+        self.stdout.write(f"load settings:      {report['settings_import'] * 1000:8.1f}ms")
+        self.stdout.write(f"django.setup():     {report['setup'] * 1000:8.1f}ms")
+        self.stdout.write('')
+        self.stdout.write(f"{'app':<32}{'import':>10}{'models':>10}{'ready':>10}{'total':>10}")
+        apps = sorted(report['apps'], key=lambda app: app['import'] + app['models'] + app['ready'], reverse=True)
+        for app in apps:
+            total = app['import'] + app['models'] + app['ready']
+            self.stdout.write(
+                f"{app['name']:<32}{app['import'] * 1000:8.1f}ms{app['models'] * 1000:8.1f}ms"
+                f"{app['ready'] * 1000:8.1f}ms{total * 1000:8.1f}ms"
+            )
+        attributed = sum(app['import'] + app['models'] + app['ready'] for app in apps)
+        self.stdout.write(f"{'(logging config and other setup)':<62}{(report['setup'] - attributed) * 1000:8.1f}ms")
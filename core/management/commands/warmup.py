@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.warmup import warm_process
+
+
+class Command(BaseCommand):
+    help = 'Preload templates, URL patterns and the suggestion index and prime caches for the most visited pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-posts', type=int, default=20, help='Number of post pages to prime')
+        parser.add_argument('--no-pages', action='store_true', help='Skip requesting pages')
+
+    def handle(self, *args, **options):
+        stages, results = warm_process(pages=not options['no_pages'], top_posts=options['top_posts'])
+        for name, (count, seconds) in stages.items():
+            self.stdout.write(f'Warmed {count} {name} in {seconds:.2f}s')
+
+        for path, (status, seconds) in results.items():
+            style = self.style.SUCCESS if status == 200 else self.style.WARNING
+            self.stdout.write(style(f'{status} {seconds * 1000:7.1f}ms {path}'))
+
+        self.stdout.write(self.style.SUCCESS('Warm-up complete.'))
@@ -0,0 +1,248 @@
+"""
+Access-controlled media delivery.
+
+protected_media_view checks permissions in Django and then hands the byte
+transfer to the web server with X-Accel-Redirect (nginx) or X-Sendfile
+(Apache/lighttpd), according to MEDIA_ACCEL_MODE. Without a web server in
+front, files are streamed by Python in chunks, with single-range Range
+request support.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from blog.models import BULK_UPDATE_CHUNK_SIZE, Post, PostAttachment
+from users.models import UserProfile
+
+from .coherence import invalidate_cache
+from .storage import BLOB_DIR
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Media files linked from post bodies (editor attachments)
+MEDIA_PATH_PATTERN = re.compile(re.escape(settings.MEDIA_URL) + r'([^\s"\'<>?#]+)')
+
+# Access levels, cached per file for MEDIA_ACCESS_CACHE_SECONDS
+PUBLIC = 'public'
+# Public only while a post using the file stays published
+PUBLISHED = 'published'
+AUTHENTICATED = 'authenticated'
+STAFF = 'staff'
+
+
+def access_cache_key(name):
+    return f"media-access:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def invalidate_access_rule(name):
+    """Forget the cached rule for a file in every process, e.g. after its post was (un)published"""
+    invalidate_cache(access_cache_key(name))
+
+
+def embedded_media(content):
+    """Names of the media files a post body links to"""
+    names = {unquote(path) for path in MEDIA_PATH_PATTERN.findall(content)}
+    return {name for name in names if len(name) <= PostAttachment._meta.get_field('name').max_length}
+
+
+def record_attachments(post, previous_status=None):
+    """
+    Bring a saved post's PostAttachment rows in line with its body, and forget
+    the access rules of the files whose visibility may have changed
+    """
+    names = embedded_media(post.content)
+    recorded = set(PostAttachment.objects.filter(post=post).values_list('name', flat=True))
+    if recorded - names:
+        PostAttachment.objects.filter(post=post, name__in=recorded - names).delete()
+    if names - recorded:
+        PostAttachment.objects.bulk_create([PostAttachment(post=post, name=name) for name in names - recorded], ignore_conflicts=True)
+    changed = names ^ recorded if previous_status == post.status else names | recorded
+    for name in changed:
+        invalidate_access_rule(name)
+
+
+def invalidate_attachment_rules(post_ids):
+    """Forget the access rules of every file linked from these posts, e.g. after they were (un)published"""
+    for start in range(0, len(post_ids), BULK_UPDATE_CHUNK_SIZE):
+        names = (
+            PostAttachment.objects.filter(post_id__in=post_ids[start:start + BULK_UPDATE_CHUNK_SIZE])
+            .order_by()
+            .values_list('name', flat=True)
+            .distinct()
+        )
+        for name in names:
+            invalidate_access_rule(name)
+
+
+def get_access_rule(name):
+    """
+    Work out who may read a media file: (level, author ids allowed besides staff).
+
+    Images of published posts, profile images and editor attachments used in
+    a published post are public (post files only for as long as the post
+    stays published). Images of unpublished posts are limited to
+    their authors, other editor attachments to logged-in users, and files no
+    row references to staff.
+    """
+    cache_key = access_cache_key(name)
+    rule = cache.get(cache_key)
+    if rule is not None:
+        return rule
+
+    posts = list(Post.objects.filter(image=name).values_list('status', 'author_id'))
+    if any(status == 'published' for status, _ in posts):
+        rule = (PUBLISHED, [])
+    elif posts:
+        rule = (STAFF, sorted({author_id for _, author_id in posts}))
+    elif UserProfile.objects.filter(profile_image=name).exists():
+        rule = (PUBLIC, [])
+    elif _is_attachment(name):
+        used_publicly = PostAttachment.objects.filter(name=name, post__status='published').exists()
+        rule = (PUBLISHED if used_publicly else AUTHENTICATED, [])
+    else:
+        rule = (STAFF, [])
+
+    cache.set(cache_key, rule, getattr(settings, 'MEDIA_ACCESS_CACHE_SECONDS', 60))
+    return rule
+
+
+def _is_attachment(name):
+    from django_summernote.utils import get_attachment_model
+    return get_attachment_model().objects.filter(file=name).exists()
+
+
+def can_access(user, name):
+    level, author_ids = get_access_rule(name)
+    if level in (PUBLIC, PUBLISHED) or user.is_staff:
+        return True
+    if not user.is_authenticated:
+        return False
+    return level == AUTHENTICATED or user.pk in author_ids
+
+
+def protected_media_view(request, path):
+    """Serve a media file after checking that the requester may see it"""
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path.')
+    if not os.path.isfile(full_path) or not can_access(request.user, path):
+        # Same response for missing and forbidden files, so private names are not revealed
+        raise Http404('Media file not found.')
+
+    level, _ = get_access_rule(path)
+    response = serve_media(request, path, full_path)
+    if level == PUBLIC and path.startswith(f'{BLOB_DIR}/'):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    elif level == PUBLISHED:
+        # Blob content never changes, but unpublishing the post makes the file private again
+        max_age = getattr(settings, 'MEDIA_PUBLISHED_CACHE_SECONDS', 60)
+        response['Cache-Control'] = f'public, max-age={max_age}, must-revalidate'
+    else:
+        response['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+
+def serve_media(request, name, full_path, mode=None):
+    """Hand the transfer to the web server, or stream it when MEDIA_ACCEL_MODE is unset"""
+    mode = mode if mode is not None else getattr(settings, 'MEDIA_ACCEL_MODE', None)
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if mode == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(f"{prefix.rstrip('/')}/{name}")
+        return response
+    if mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    return stream_file(request, full_path, content_type)
+
+
+def stream_file(request, full_path, content_type):
+    """Pure-Python fallback: chunked streaming with Last-Modified and single byte-range support"""
+    file_stat = os.stat(full_path)
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404('Media file not found.')
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), file_stat.st_mtime):
+        return HttpResponseNotModified()
+
+    size = file_stat.st_size
+    start, end = 0, size - 1
+    status = 200
+
+    byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range:
+        start, end = byte_range
+        status = 206
+
+    response = StreamingHttpResponse(
+        iter_file_range(full_path, start, end - start + 1),
+        status=status,
+        content_type=content_type,
+    )
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(file_stat.st_mtime)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable range, 'unsatisfiable', or None to send everything.
+
+    Only a range starting past the end of the file, or an empty suffix, is
+    unsatisfiable (416); anything invalid is ignored, as RFC 9110 asks.
+    """
+    if not header or not size:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges: a full 200 response is always acceptable
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            return 'unsatisfiable'
+        return max(0, size - suffix), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def iter_file_range(full_path, start, length):
+    with open(full_path, 'rb') as media_file:
+        media_file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = media_file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
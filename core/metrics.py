@@ -0,0 +1,34 @@
+"""
+In-process counters.
+
+Counters live in the memory of each worker process and reset when it
+restarts; they are meant to be attached to log events and health pages,
+not used as a durable store.
+"""
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def increment(name, value=1):
+    """Add value to a counter and return its new total"""
+    with _lock:
+        _counters[name] += value
+        return _counters[name]
+
+
+def get(name):
+    with _lock:
+        return _counters[name]
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,51 @@
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class InvalidationEvent(models.Model):
+    """An invalidation broadcast to every app process, which polls for new rows (core.coherence)"""
+    kind = models.CharField(max_length=50)
+    key = models.CharField(max_length=255, blank=True)
+    # Process that published the event; it has already applied it
+    origin = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Invalidation Event'
+        verbose_name_plural = 'Invalidation Events'
+
+    def __str__(self):
+        return f"{self.kind} {self.key}"
+
+
+class UploadSession(models.Model):
+    """A chunked, resumable upload of a post image or editor attachment (core.uploads)"""
+    KIND_IMAGE = 'image'
+    KIND_ATTACHMENT = 'attachment'
+    KIND_CHOICES = [
+        (KIND_IMAGE, 'Post image'),
+        (KIND_ATTACHMENT, 'Editor attachment'),
+    ]
+
+    # Random, so an upload's URL cannot be guessed
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Bytes received so far; the next chunk must start here
+    offset = models.PositiveBigIntegerField(default=0)
+    # Storage name of the verified file once the upload is complete
+    stored_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Expired sessions are found by this, see clear_uploads
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,206 @@
+"""
+On-demand per-request profiling for staff.
+
+Add ?_profile=1 (cProfile) or ?_profile=sample (stack sampling) to a URL, or
+send an X-Profile header with the same values, while logged in as staff. The
+request then runs under the profiler with every SQL query captured, and the
+result is written to PROFILE_DIR where the profile pages under
+/admin-dashboard/profiles/ list it. Requests without the flag only pay for a
+substring check on the query string and one header lookup.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]+-[0-9a-f]{8}$')
+
+
+def get_profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+class QueryRecorder:
+    """execute_wrapper that records SQL text and duration for every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:500],
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'alias': context['connection'].alias,
+            })
+
+
+class StackSampler:
+    """Samples the profiled thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format, ready for flamegraph.pl or speedscope"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def requested_mode(request):
+    value = request.META.get(PROFILE_HEADER)
+    if value is None:
+        if PROFILE_PARAM not in request.META.get('QUERY_STRING', ''):
+            return None
+        value = request.GET.get(PROFILE_PARAM)
+    if not value:
+        return None
+    return 'sample' if value == 'sample' else 'cprofile'
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None or not (request.user.is_authenticated and request.user.is_staff):
+            return self.get_response(request)
+        return self.profile(request, mode)
+
+    def profile(self, request, mode):
+        recorder = QueryRecorder()
+        profiler = None
+        sampler = None
+        wrappers = [connection.execute_wrapper(recorder) for connection in connections.all()]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+
+        start = time.perf_counter()
+        try:
+            # Both modes sample stacks for the collapsed-stack download; cProfile
+            # keeps only caller/callee totals, from which full stacks cannot be rebuilt
+            interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.001)
+            with StackSampler(threading.get_ident(), interval) as sampler:
+                if mode == 'sample':
+                    response = self.get_response(request)
+                    # Streaming bodies are produced lazily; profile them too
+                    if not response.streaming:
+                        response.content
+                else:
+                    profiler = cProfile.Profile()
+                    response = profiler.runcall(self.get_response, request)
+        finally:
+            elapsed = time.perf_counter() - start
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+        profile_id = save_profile(request, response, mode, elapsed, recorder.queries, profiler, sampler)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+def save_profile(request, response, mode, elapsed, queries, profiler=None, sampler=None):
+    profile_dir = get_profile_dir()
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_id = f'{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}'
+
+    meta = {
+        'id': profile_id,
+        'mode': mode,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'total_ms': round(elapsed * 1000, 3),
+        'sql_ms': round(sum(query['ms'] for query in queries), 3),
+        'queries': queries,
+        'created_at': time.time(),
+    }
+
+    if profiler is not None:
+        profiler.dump_stats(profile_dir / f'{profile_id}.prof')
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(40)
+        meta['summary'] = stream.getvalue()
+    if sampler is not None:
+        (profile_dir / f'{profile_id}.collapsed').write_text(sampler.collapsed())
+        meta['samples'] = sum(sampler.stacks.values())
+
+    (profile_dir / f'{profile_id}.json').write_text(json.dumps(meta))
+    prune_profiles(profile_dir)
+    return profile_id
+
+
+def prune_profiles(profile_dir):
+    """Keep only the PROFILE_KEEP most recent profiles"""
+    keep = getattr(settings, 'PROFILE_KEEP', 50)
+    metas = sorted(profile_dir.glob('*.json'), reverse=True)
+    for meta in metas[keep:]:
+        for path in profile_dir.glob(f'{meta.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles():
+    profiles = []
+    for path in sorted(get_profile_dir().glob('*.json'), reverse=True):
+        meta = json.loads(path.read_text())
+        meta['query_count'] = len(meta.pop('queries'))
+        meta.pop('summary', None)
+        profiles.append(meta)
+    return profiles
+
+
+def load_profile(profile_id):
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = get_profile_dir() / f'{profile_id}.json'
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def profile_file(profile_id, suffix):
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = get_profile_dir() / f'{profile_id}{suffix}'
+    return path if path.exists() else None
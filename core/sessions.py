@@ -0,0 +1,61 @@
+"""
+Cached, database-backed sessions that are only written when they change.
+
+Reads are served from the cache (settings.SESSION_CACHE_ALIAS) and fall back
+to the django_session table on a miss, as with Django's cached_db engine.
+On save, the session is compared with the snapshot taken when it was loaded
+or last written; if nothing changed, the database row and the cache entry
+are left alone, so repeated saves of the same data within a request or
+across requests collapse into the one write that actually changed something.
+Logging in without an existing session likewise inserts the session once
+instead of inserting it empty and updating it. Updates and deletions are
+broadcast through core.coherence so other processes drop their cached copy.
+
+Select with SESSION_ENGINE = 'core.sessions'.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+
+from .coherence import invalidate_cache
+
+
+class SessionStore(cached_db.SessionStore):
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._snapshot = None
+
+    def _dump(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._snapshot = self._dump(data) if data else None
+        return data
+
+    def is_unchanged(self):
+        return self._snapshot is not None and self._dump(self._session) == self._snapshot
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and self.is_unchanged():
+            return
+        super().save(must_create)
+        self._snapshot = self._dump(self._session)
+        if not must_create:
+            # Other processes may hold the previous contents in a local cache
+            invalidate_cache(self.cache_key, alias=settings.SESSION_CACHE_ALIAS, local=False)
+
+    def cycle_key(self):
+        # A session that was never stored has nothing to protect from fixation;
+        # the save at the end of the request creates it once, with its final contents
+        if self.session_key is None:
+            return
+        super().cycle_key()
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key is not None:
+            # Logging out must end the session in every process, not just this one
+            invalidate_cache(self.cache_key_prefix + key, alias=settings.SESSION_CACHE_ALIAS, local=False)
+        if session_key is None or session_key == self.session_key:
+            self._snapshot = None
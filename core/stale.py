@@ -0,0 +1,200 @@
+"""
+Serve-stale mode for public pages while the database is locked or slow.
+
+Successful anonymous GETs of the pages named in STALE_URL_NAMES are copied
+into the 'stale' cache, at most once per STALE_REFRESH_SECONDS per URL. When
+one of those views fails with a lock or timeout error, the last good copy is
+returned instead of a 500, marked with an X-Stale header and an Age.
+
+Every contention error is reported to a per-process circuit breaker. After
+STALE_BREAKER_THRESHOLD errors within STALE_BREAKER_WINDOW seconds it opens:
+pages with a stored copy are then served from it without touching the
+database. After a cool-down one request is let through as a trial. Success
+closes the breaker; failure reopens it with twice the cool-down, up to
+STALE_BREAKER_MAX_COOLDOWN. Outcomes are counted in core.metrics under
+"stale.*".
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.db import OperationalError
+from django.http import HttpResponse
+
+from . import metrics
+from .coherence import invalidate_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'stale'
+STALE_HEADER = 'X-Stale'
+# Response headers kept with a stored copy
+KEPT_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Content-Language', 'Vary')
+# OperationalError messages that mean "busy", not "broken" (SQLite, PostgreSQL, MySQL)
+CONTENTION_MESSAGES = (
+    'database is locked',
+    'database table is locked',
+    'canceling statement due to statement timeout',
+    'canceling statement due to lock timeout',
+    'lock wait timeout exceeded',
+)
+
+
+def is_contention(exception):
+    """Whether an exception is a lock or timeout error worth waiting out"""
+    if not isinstance(exception, OperationalError):
+        return False
+    message = str(exception).lower()
+    return any(text in message for text in CONTENTION_MESSAGES)
+
+
+class CircuitBreaker:
+    """Tracks database contention in this process and decides when to stay off the database"""
+
+    def __init__(self, threshold, window, cooldown, max_cooldown):
+        self.threshold = threshold
+        self.window = window
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._failures = deque()
+        self._cooldown = cooldown
+        self._open_until = None
+
+    def allow(self):
+        """Whether this request may use the database; lets one trial through per cool-down"""
+        with self._lock:
+            if self._open_until is None:
+                return True
+            now = time.monotonic()
+            if now < self._open_until:
+                return False
+            # Half-open: this request tries, the others keep off until it reports back
+            self._open_until = now + self._cooldown
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._open_until is not None:
+                logger.info('Database contention is over; closing the circuit breaker')
+                metrics.increment('stale.breaker_closed')
+            self._failures.clear()
+            self._cooldown = self.base_cooldown
+            self._open_until = None
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._open_until is not None:
+                # A trial (or a request already under way) failed: back off further
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open_until = now + self._cooldown
+                return
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if len(self._failures) >= self.threshold:
+                self._open_until = now + self._cooldown
+                self._failures.clear()
+                logger.warning('Database contention: opening the circuit breaker for %.1fs', self._cooldown)
+                metrics.increment('stale.breaker_opened')
+
+    def state(self):
+        with self._lock:
+            remaining = self._open_until - time.monotonic() if self._open_until is not None else None
+        if remaining is None:
+            return {'state': 'closed'}
+        return {'state': 'open' if remaining > 0 else 'half-open', 'retry_in': max(remaining, 0.0)}
+
+
+breaker = CircuitBreaker(
+    threshold=getattr(settings, 'STALE_BREAKER_THRESHOLD', 3),
+    window=getattr(settings, 'STALE_BREAKER_WINDOW', 10.0),
+    cooldown=getattr(settings, 'STALE_BREAKER_COOLDOWN', 2.0),
+    max_cooldown=getattr(settings, 'STALE_BREAKER_MAX_COOLDOWN', 60.0),
+)
+
+
+def cache_key(path):
+    return 'stale:' + hashlib.md5(path.encode()).hexdigest()
+
+
+def forget(path):
+    """Drop the stored copy of a page in every process, e.g. when its post is unpublished"""
+    invalidate_cache(cache_key(path), alias=CACHE_ALIAS)
+
+
+def store(key, response):
+    # The marker makes sure a busy page is copied once per refresh interval, not per request
+    if not caches[CACHE_ALIAS].add(key + ':fresh', 1, getattr(settings, 'STALE_REFRESH_SECONDS', 30)):
+        return
+    caches[CACHE_ALIAS].set(key, {
+        'content': response.content,
+        'headers': {name: response[name] for name in KEPT_HEADERS if response.has_header(name)},
+        'stored_at': time.time(),
+    }, getattr(settings, 'STALE_MAX_AGE', 86400))
+    metrics.increment('stale.stored')
+
+
+def stale_response(key, reason):
+    """The stored copy as a response, or None"""
+    copy = caches[CACHE_ALIAS].get(key)
+    if copy is None:
+        metrics.increment('stale.missed')
+        return None
+    response = HttpResponse(copy['content'])
+    for name, value in copy['headers'].items():
+        response[name] = value
+    response[STALE_HEADER] = reason
+    response['Age'] = str(max(int(time.time() - copy['stored_at']), 0))
+    response['Cache-Control'] = 'no-cache'
+    metrics.increment(f'stale.served.{reason}')
+    return response
+
+
+class StaleContentMiddleware:
+    """Serve last-known-good copies of public pages while the database is contended"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_stale_key', None)
+        if key and response.status_code == 200 and not response.has_header(STALE_HEADER):
+            breaker.record_success()
+            # Pages setting a session or message cookie were rendered for one visitor. The CSRF
+            # cookie is re-sent on every page with the footer form, which posts to a csrf_exempt view.
+            if request.method == 'GET' and not response.streaming and set(response.cookies) <= {settings.CSRF_COOKIE_NAME}:
+                store(key, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or request.resolver_match.url_name not in getattr(settings, 'STALE_URL_NAMES', ()):
+            return None
+        # Checked in the session, which does not need the database, rather than by loading the user
+        if SESSION_KEY in request.session:
+            return None
+        request._stale_key = cache_key(request.get_full_path())
+        if not breaker.allow():
+            response = stale_response(request._stale_key, 'breaker-open')
+            # Nothing to fall back on: try the database after all, without looking again if it fails
+            request._stale_missed = response is None
+            return response
+        return None
+
+    def process_exception(self, request, exception):
+        if not is_contention(exception):
+            return None
+        metrics.increment('stale.db_errors')
+        breaker.record_failure()
+        key = getattr(request, '_stale_key', None)
+        if key is None or getattr(request, '_stale_missed', False):
+            return None
+        logger.warning('Database contention on %s; trying the stale copy', request.path)
+        return stale_response(key, 'db-error')
@@ -0,0 +1,92 @@
+"""
+Measure Django start-up cost per installed app.
+
+Run in a fresh interpreter (the startup_report command does this) so that
+nothing is imported yet: AppConfig creation (importing the app package),
+model imports and ready() are timed individually while django.setup() runs,
+and the result is printed as JSON on stdout.
+"""
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+
+def profile_setup():
+    timings = defaultdict(lambda: {'import': 0.0, 'models': 0.0, 'ready': 0.0})
+    in_ready = set()
+
+    start = time.perf_counter()
+    import django
+    from django.apps.config import AppConfig
+    from django.conf import settings
+    django_import = time.perf_counter() - start
+
+    start = time.perf_counter()
+    settings.INSTALLED_APPS
+    settings_import = time.perf_counter() - start
+
+    original_create = AppConfig.create.__func__
+    original_import_models = AppConfig.import_models
+
+    def create(cls, entry):
+        started = time.perf_counter()
+        app_config = original_create(cls, entry)
+        timings[app_config.name]['import'] += time.perf_counter() - started
+        return app_config
+
+    def import_models(self):
+        started = time.perf_counter()
+        original_import_models(self)
+        timings[self.name]['models'] += time.perf_counter() - started
+
+    def timed_ready(ready):
+        def wrapper(self):
+            # Only the outermost ready() of a class hierarchy is recorded
+            if self.name in in_ready:
+                return ready(self)
+            in_ready.add(self.name)
+            started = time.perf_counter()
+            try:
+                return ready(self)
+            finally:
+                timings[self.name]['ready'] += time.perf_counter() - started
+                in_ready.discard(self.name)
+        return wrapper
+
+    def wrap_ready(cls):
+        if 'ready' in cls.__dict__:
+            cls.ready = timed_ready(cls.__dict__['ready'])
+
+    def __init_subclass__(cls, **kwargs):
+        wrap_ready(cls)
+
+    AppConfig.create = classmethod(create)
+    AppConfig.import_models = import_models
+    # AppConfig subclasses are mostly defined while setup() imports the apps
+    AppConfig.__init_subclass__ = classmethod(__init_subclass__)
+    for subclass in _all_subclasses(AppConfig):
+        wrap_ready(subclass)
+
+    start = time.perf_counter()
+    django.setup()
+    setup_time = time.perf_counter() - start
+
+    return {
+        'django_import': django_import,
+        'settings_import': settings_import,
+        'setup': setup_time,
+        'apps': [{'name': name, **values} for name, values in timings.items()],
+    }
+
+
+def _all_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _all_subclasses(subclass)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ofori_blog.settings')
+    json.dump(profile_setup(), sys.stdout)
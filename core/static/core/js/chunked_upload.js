@@ -0,0 +1,176 @@
+/*
+ * Chunked, resumable uploads through core/uploads.py.
+ *
+ * ChunkedUpload.upload(file, kind, onProgress) sends a file in chunks,
+ * retries with back-off when the connection drops and resumes from the
+ * offset the server reports, then completes the upload with the file's
+ * SHA-256. ChunkedUpload.bindFileInput() applies this to a form's file
+ * input; loaded inside the Summernote editor frame, the script also routes
+ * the editor's image uploads through it. Without fetch or WebCrypto (e.g.
+ * plain HTTP), or when an upload fails for good, the regular single-request
+ * upload is used instead.
+ */
+var ChunkedUpload = (function () {
+    'use strict';
+
+    var START_URL = '/uploads/';
+    var MAX_FAILURES = 8;
+    var MAX_DELAY = 30000;
+
+    function supported() {
+        return !!(window.fetch && window.Promise && window.crypto && window.crypto.subtle && window.Blob && Blob.prototype.slice);
+    }
+
+    function csrfToken() {
+        var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function request(method, url, body, headers) {
+        var allHeaders = {'X-CSRFToken': csrfToken(), 'Accept': 'application/json'};
+        Object.keys(headers || {}).forEach(function (name) { allHeaders[name] = headers[name]; });
+        return fetch(url, {method: method, body: body, headers: allHeaders, credentials: 'same-origin'}).then(function (response) {
+            return response.json().catch(function () { return {}; }).then(function (data) {
+                return {status: response.status, data: data};
+            });
+        });
+    }
+
+    function sha256(file) {
+        return file.arrayBuffer().then(function (buffer) {
+            return crypto.subtle.digest('SHA-256', buffer);
+        }).then(function (digest) {
+            return Array.prototype.map.call(new Uint8Array(digest), function (byte) {
+                return ('0' + byte.toString(16)).slice(-2);
+            }).join('');
+        });
+    }
+
+    function wait(milliseconds) {
+        return new Promise(function (resolve) { setTimeout(resolve, milliseconds); });
+    }
+
+    function upload(file, kind, onProgress) {
+        // Hashed while the chunks go out
+        var checksum = sha256(file);
+        var failures = 0;
+        var session;
+
+        // Network errors and server errors are retried with back-off; anything else is final.
+        // A failed chunk is not resent as is: it may have partly arrived, so the
+        // session's offset is asked for instead (resume).
+        function retry(step, resume) {
+            return step().then(function (result) {
+                if (result.status < 500) {
+                    return result;
+                }
+                throw new Error(result.data.error || 'Server error');
+            }).catch(function (err) {
+                failures += 1;
+                if (failures > MAX_FAILURES) {
+                    throw err;
+                }
+                return wait(Math.min(1000 * Math.pow(2, failures - 1), MAX_DELAY)).then(function () {
+                    return resume ? retry(function () { return request('GET', session.url); }) : retry(step);
+                });
+            });
+        }
+
+        function send(offset) {
+            if (onProgress) {
+                onProgress(offset / file.size);
+            }
+            if (offset >= file.size) {
+                return checksum.then(function (digest) {
+                    return retry(function () {
+                        return request('POST', session.complete_url, new URLSearchParams({sha256: digest}));
+                    });
+                }).then(function (result) {
+                    if (result.data.complete) {
+                        return result.data;
+                    }
+                    throw new Error(result.data.error || 'The upload could not be completed.');
+                });
+            }
+            return retry(function () {
+                return request('PATCH', session.url, file.slice(offset, offset + session.chunk_size), {
+                    'Upload-Offset': String(offset),
+                    'Content-Type': 'application/offset+octet-stream'
+                });
+            }, true).then(function (result) {
+                if (typeof result.data.offset !== 'number') {
+                    throw new Error(result.data.error || 'The upload was refused.');
+                }
+                if (result.data.offset > offset) {
+                    failures = 0;
+                }
+                return send(result.data.offset);
+            });
+        }
+
+        return retry(function () {
+            return request('POST', START_URL, new URLSearchParams({filename: file.name, size: file.size, kind: kind}));
+        }).then(function (result) {
+            if (result.status !== 201) {
+                throw new Error(result.data.error || 'The upload was refused.');
+            }
+            session = result.data;
+            return send(session.offset);
+        });
+    }
+
+    // Upload the file chosen in `input` right away and submit only its session id with the form
+    function bindFileInput(input, idInput, status) {
+        if (!input || !idInput || !supported()) {
+            return;
+        }
+        var form = input.form;
+        var buttons = form.querySelectorAll('[type=submit]');
+        input.addEventListener('change', function () {
+            var file = input.files[0];
+            idInput.value = '';
+            if (!file) {
+                return;
+            }
+            Array.prototype.forEach.call(buttons, function (button) { button.disabled = true; });
+            status.textContent = 'Uploading ' + file.name + '...';
+            upload(file, 'image', function (fraction) {
+                status.textContent = 'Uploading ' + file.name + ': ' + Math.floor(fraction * 100) + '%';
+            }).then(function (result) {
+                idInput.value = result.id;
+                // Not sent again with the form
+                input.value = '';
+                status.textContent = file.name + ' uploaded.';
+            }).catch(function (err) {
+                status.textContent = err.message + ' The image will be sent with the form instead.';
+            }).then(function () {
+                Array.prototype.forEach.call(buttons, function (button) { button.disabled = false; });
+            });
+        });
+    }
+
+    // Inside the Summernote frame: wrap the editor's upload callback
+    if (window.jQuery && jQuery.fn.summernote && supported()) {
+        var summernote = jQuery.fn.summernote;
+        jQuery.fn.summernote = function (options) {
+            var callbacks = options && typeof options === 'object' && options.callbacks;
+            if (callbacks && callbacks.onImageUpload) {
+                var $note = this;
+                var fallback = callbacks.onImageUpload;
+                callbacks.onImageUpload = function (files) {
+                    Array.prototype.forEach.call(files, function (file) {
+                        upload(file, 'attachment').then(function (result) {
+                            $note.summernote('insertImage', result.file_url);
+                        }, function () {
+                            fallback.call($note, [file]);
+                        });
+                    });
+                };
+            }
+            return summernote.apply(this, arguments);
+        };
+        jQuery.extend(jQuery.fn.summernote, summernote);
+    }
+
+    return {supported: supported, upload: upload, bindFileInput: bindFileInput};
+})();
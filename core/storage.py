@@ -0,0 +1,130 @@
+"""
+Content-addressed media storage.
+
+Uploads are hashed while they are streamed to disk in chunks and stored once
+under their SHA-256 digest (blobs/ab/cd/abcd...ext), whatever upload_to or
+file name they arrived with. Re-uploading the same banner for many posts
+therefore reuses one file, and because a blob's URL changes whenever its
+content does, blob URLs can be served with far-future, immutable cache
+headers.
+
+Blobs may be shared by many rows, so delete() leaves them alone; unreferenced
+blobs are removed by the gc_media management command. Files stored under
+their own names before this storage was introduced are deleted as usual.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .compression import brotli, brotli_compress, gzip_static, is_compressible_path
+
+BLOB_DIR = 'blobs'
+INCOMING_DIR = '.incoming'
+
+
+def blob_name(digest, extension=''):
+    return f'{BLOB_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    hash_algorithm = 'sha256'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        incoming = os.path.join(self.location, INCOMING_DIR)
+        os.makedirs(incoming, exist_ok=True)
+
+        # Hash while streaming into a temp file on the same filesystem as the blobs
+        hasher = hashlib.new(self.hash_algorithm)
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    hasher.update(chunk)
+                    temp_file.write(chunk)
+
+            return self.adopt(temp_path, name, hasher.hexdigest())
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def adopt(self, path, name, digest):
+        """
+        Move a file on the media filesystem whose digest is already known
+        (e.g. a verified upload) into place without copying it; returns its name
+        """
+        name = blob_name(digest, PurePosixPath(name).suffix.lower())
+        target = self.path(name)
+        try:
+            # Already stored: refresh its mtime, so gc_media's age check treats
+            # the blob as just uploaded until the new row referencing it is saved
+            os.utime(target)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+            os.replace(path, target)
+        else:
+            os.remove(path)
+        return name
+
+    def delete(self, name):
+        """Blobs can be shared between rows, so gc_media removes unreferenced ones; other names are deleted"""
+        if not name.startswith(f'{BLOB_DIR}/'):
+            super().delete(name)
+
+    def iter_blobs(self):
+        """Yield (name, absolute path) for every stored blob"""
+        root = os.path.join(self.location, BLOB_DIR)
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, self.location).replace(os.sep, '/'), path
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Hashed static files plus precompressed siblings.
+
+    After the manifest is built, every hashed text-like file gets a .gz copy
+    (and a .br copy when brotli is installed) so the web server can send
+    it without compressing per request (gzip_static / brotli_static).
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        min_size = getattr(settings, 'COMPRESS_MIN_SIZE', 200)
+        for name in set(self.hashed_files.values()):
+            if not is_compressible_path(name):
+                continue
+            path = self.path(name)
+            data = Path(path).read_bytes()
+            if len(data) < min_size:
+                continue
+            for suffix, compressed in self.compressed_variants(data):
+                # Hashed names change with content, so an existing sibling is current
+                if os.path.exists(path + suffix) or len(compressed) >= len(data):
+                    continue
+                Path(path + suffix).write_bytes(compressed)
+                yield name + suffix, name + suffix, True
+
+    def compressed_variants(self, data):
+        yield '.gz', gzip_static(data)
+        if brotli is not None:
+            yield '.br', brotli_compress(data, quality=11)
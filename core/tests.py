@@ -0,0 +1,507 @@
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django_summernote.utils import get_attachment_model
+
+from blog.analytics import view_counter
+from blog import suggest
+from blog.models import Post, PostAttachment, PostViewDaily
+from core.management.commands.gc_media import Command as GcMediaCommand
+from newsletter.models import Newsletter
+from users.models import UserProfile
+from . import coherence, compression, logs, metrics
+from .compression import CompressionMiddleware, accepted_encodings
+from .media import parse_range
+from .models import InvalidationEvent, UploadSession
+from .sessions import SessionStore
+from .warmup import warm_process
+
+
+class MediaRootTestCase(TestCase):
+    """Runs every test against an empty, temporary MEDIA_ROOT"""
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class StorageTests(MediaRootTestCase):
+    def age(self, name, hours=48):
+        """Backdate a blob's mtime"""
+        then = time.time() - hours * 3600
+        os.utime(default_storage.path(name), (then, then))
+
+    def gc(self):
+        call_command('gc_media', stdout=io.StringIO())
+
+    def test_same_content_is_stored_once(self):
+        name = default_storage.save('posts/banner.PNG', ContentFile(b'banner'))
+        self.assertTrue(name.startswith('blobs/') and name.endswith('.png'))
+        self.age(name)
+        self.assertEqual(default_storage.save('other/name.png', ContentFile(b'banner')), name)
+        self.assertEqual([blob for blob, _ in default_storage.iter_blobs()], [name])
+        # The re-upload counts as new for gc_media
+        self.assertGreater(os.stat(default_storage.path(name)).st_mtime, time.time() - 60)
+        self.assertEqual(os.listdir(os.path.join(default_storage.location, '.incoming')), [])
+
+    def test_gc_keeps_referenced_and_recent_blobs(self):
+        author = User.objects.create_user('author')
+        names = {
+            label: default_storage.save(f'{label}.png', ContentFile(label.encode()))
+            for label in ['orphan', 'recent', 'image', 'inline', 'upload']
+        }
+        for label, name in names.items():
+            if label != 'recent':
+                self.age(name)
+        Post.objects.create(
+            title='Post', author=author, status='draft', created_at=timezone.now(),
+            image=names['image'], content=f'<img src="/media/{names["inline"]}">',
+        )
+        UploadSession.objects.create(user=author, filename='upload.png', size=6, offset=6, stored_name=names['upload'])
+
+        self.gc()
+        remaining = {name for name, _ in default_storage.iter_blobs()}
+        self.assertEqual(remaining, set(names.values()) - {names['orphan']})
+
+    def test_gc_scans_again_before_deleting(self):
+        author = User.objects.create_user('author')
+        name = default_storage.save('late.png', ContentFile(b'late'))
+        self.age(name)
+        scan = GcMediaCommand.referenced_names
+
+        def first_scan_misses_a_row(command):
+            if not scans:
+                scans.append(1)
+                # Referenced by a row saved while the blobs were being listed
+                Post.objects.create(title='Post', author=author, status='draft', created_at=timezone.now(), image=name, content='')
+                return set()
+            return scan(command)
+
+        scans = []
+        with patch.object(GcMediaCommand, 'referenced_names', autospec=True, side_effect=first_scan_misses_a_row):
+            self.gc()
+        self.assertTrue(default_storage.exists(name))
+
+        Post.objects.all().delete()
+        self.gc()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_delete_leaves_blobs_to_gc(self):
+        blob = default_storage.save('shared.png', ContentFile(b'shared'))
+        legacy = FileSystemStorage.save(default_storage, 'profiles/legacy.png', ContentFile(b'legacy'))
+        self.assertEqual(legacy, 'profiles/legacy.png')
+        default_storage.delete(blob)
+        default_storage.delete(legacy)
+        self.assertTrue(default_storage.exists(blob))
+        self.assertFalse(default_storage.exists(legacy))
+
+@override_settings(MEDIA_ACCEL_MODE='')
+class MediaTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        # Access rules are cached per file name, and names repeat across tests
+        cache.clear()
+        self.data = bytes(range(100))
+        self.name = default_storage.save('data.bin', ContentFile(self.data))
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.post = Post.objects.create(
+            title='Post', author=self.author, status='published', created_at=timezone.now(), image=self.name, content='',
+        )
+
+    def tearDown(self):
+        view_counter.flush()
+
+    def get(self, name=None, **headers):
+        return self.client.get(f'/media/{name or self.name}', **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+        self.assertEqual(parse_range('bytes=100-', 100), 'unsatisfiable')
+        # Invalid or multiple ranges are ignored
+        self.assertIsNone(parse_range('bytes=20-10', 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('bytes=0-10', 0))
+
+    def test_range_requests(self):
+        response = self.get()
+        self.assertEqual((response.status_code, self.body(response), response['Accept-Ranges']), (200, self.data, 'bytes'))
+
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual((response.status_code, self.body(response)), (206, self.data[10:20]))
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 10-19/100', '10'))
+        self.assertEqual(self.body(self.get(HTTP_RANGE='bytes=-5')), self.data[-5:])
+
+        response = self.get(HTTP_RANGE='bytes=20-10')
+        self.assertEqual((response.status_code, self.body(response)), (200, self.data))
+        response = self.get(HTTP_RANGE='bytes=100-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        earlier = http_date(os.stat(default_storage.path(self.name)).st_mtime - 60)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=earlier).status_code, 200)
+
+    def test_post_image_access(self):
+        self.assertEqual(self.get().status_code, 200)
+        # Unpublishing makes the image private again, so caches must revalidate it soon
+        self.assertEqual(self.get()['Cache-Control'], 'public, max-age=60, must-revalidate')
+        Post.objects.filter(pk=self.post.pk).set_status('draft')
+        # Only the author and staff see images of unpublished posts
+        self.assertEqual(self.get().status_code, 404)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.get().status_code, 404)
+        self.client.force_login(self.author)
+        response = self.get()
+        self.assertEqual((response.status_code, response['Cache-Control']), (200, 'private, max-age=3600'))
+
+    def test_profile_images_are_immutable(self):
+        name = default_storage.save('avatar.png', ContentFile(b'avatar'))
+        UserProfile.objects.filter(user=self.reader).update(profile_image=name)
+        response = self.get(name)
+        self.assertEqual((response.status_code, response['Cache-Control']), (200, 'public, max-age=31536000, immutable'))
+
+    def test_attachment_access(self):
+        name = default_storage.save('photo.png', ContentFile(b'photo'))
+        attachment = get_attachment_model()(name='photo.png')
+        attachment.file.name = name
+        attachment.save()
+        # Editor attachments not used in a published post are for logged-in users
+        self.assertEqual(self.get(name).status_code, 404)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.get(name).status_code, 200)
+        self.client.logout()
+
+        self.post.content = f'<p><img src="/media/{name}"></p>'
+        self.post.save()
+        self.assertEqual(list(PostAttachment.objects.values_list('post', 'name')), [(self.post.pk, name)])
+        self.assertEqual(self.get(name).status_code, 200)
+        Post.objects.filter(pk=self.post.pk).set_status('draft')
+        self.assertEqual(self.get(name).status_code, 404)
+
+        # Leaving the body of a published post makes it private again
+        self.post.refresh_from_db()
+        self.post.status = 'published'
+        self.post.save()
+        self.assertEqual(self.get(name).status_code, 200)
+        self.post.content = ''
+        self.post.save()
+        self.assertFalse(PostAttachment.objects.exists())
+        self.assertEqual(self.get(name).status_code, 404)
+
+
+@patch.object(compression, 'brotli', None)
+class CompressionTests(TestCase):
+    body = b'<p>' + b'Compressible text. ' * 50 + b'</p>'
+
+    def compress(self, response, accept='gzip, deflate'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip;q=1.0, br; q=0, identity'), {'gzip', 'identity'})
+        self.assertEqual(accepted_encodings('GZIP, *'), {'gzip', '*'})
+
+    def test_text_is_gzipped(self):
+        response = HttpResponse(self.body, content_type='text/html; charset=utf-8')
+        response['ETag'] = '"abc"'
+        response = self.compress(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual((response['Vary'], response['ETag']), ('Accept-Encoding', 'W/"abc"'))
+
+    def test_streaming_response(self):
+        response = self.compress(StreamingHttpResponse([self.body[:100], self.body[100:]], content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    def test_left_alone(self):
+        encoded = HttpResponse(self.body)
+        encoded['Content-Encoding'] = 'br'
+        cases = [
+            (HttpResponse(b'<p>short</p>'), 'gzip'),
+            (HttpResponse(self.body, content_type='image/png'), 'gzip'),
+            (HttpResponse(self.body, status=206), 'gzip'),
+            (HttpResponse(self.body), 'gzip;q=0, identity'),
+            (encoded, 'gzip'),
+        ]
+        for response, accept in cases:
+            with self.subTest(status=response.status_code, content_type=response['Content-Type'], accept=accept):
+                content = response.content
+                response = self.compress(response, accept)
+                self.assertEqual(response.content, content)
+                self.assertNotEqual(response.get('Content-Encoding'), 'gzip')
+
+    def test_token_pages_are_not_brotli_compressed(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+        with patch.object(compression, 'brotli', object()):
+            self.assertEqual(compression.choose_encoding(request), 'br')
+            request.META['CSRF_COOKIE_USED'] = True
+            self.assertEqual(compression.choose_encoding(request), 'gzip')
+            request.META['HTTP_ACCEPT_ENCODING'] = 'br'
+            self.assertIsNone(compression.choose_encoding(request))
+
+    def test_pages_are_compressed(self):
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'Welcome to Ofori Blog', gzip.decompress(response.content))
+
+
+class WarmupTests(TestCase):
+    def tearDown(self):
+        view_counter.flush()
+
+    def test_command_and_fork_hook_share_the_warm_up(self):
+        author = User.objects.create_user('author')
+        post = Post.objects.create(
+            title='Warm post', author=author, content='<p>Body</p>', category='life',
+            status='published', created_at=timezone.now(),
+        )
+        suggest._index = None
+        out = io.StringIO()
+        with self.assertLogs('core.warmup', 'INFO'):
+            call_command('warmup', '--top-posts', '5', stdout=out)
+        output = out.getvalue()
+        self.assertIn('suggestions in', output)
+        self.assertIsNotNone(suggest._index)
+        self.assertIn('200', output)
+        self.assertIn(reverse('post_detail', args=[post.slug]), output)
+
+        with self.assertLogs('core.warmup', 'INFO'):
+            stages, results = warm_process(pages=True, top_posts=5)
+        self.assertEqual(list(stages), ['templates', 'URL patterns', 'suggestions'])
+        self.assertEqual(stages['suggestions'][0], suggest.build())
+        self.assertEqual({status for status, _ in results.values()}, {200})
+        # Warm-up renders are not reader traffic
+        view_counter.flush()
+        self.assertFalse(PostViewDaily.objects.exists())
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        settings = override_settings(PROFILE_DIR=profile_dir.name, PROFILE_SAMPLE_INTERVAL=0.0001)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+
+    def profile(self, flag):
+        def slow_render(*args, **kwargs):
+            # Long enough for the sampler to catch the request in progress
+            time.sleep(0.02)
+            return render(*args, **kwargs)
+
+        with patch('blog.views.render', slow_render):
+            response = self.client.get('/', {'_profile': flag})
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        detail = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertGreater(detail.context['profile']['sql_ms'], 0)
+        self.assertTrue(detail.context['has_collapsed'])
+        self.assertGreater(detail.context['profile']['samples'], 0)
+        collapsed = self.client.get(reverse('profile_collapsed', args=[profile_id]))
+        return detail.context, b''.join(collapsed.streaming_content).decode()
+
+    def test_cprofile_mode_writes_pstats_and_collapsed_stacks(self):
+        context, collapsed = self.profile('1')
+        self.assertEqual(context['profile']['mode'], 'cprofile')
+        self.assertTrue(context['has_pstats'])
+        self.assertIn('home_view', context['profile']['summary'])
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in collapsed.splitlines()), context['profile']['samples'])
+
+    def test_sample_mode_writes_collapsed_stacks(self):
+        context, collapsed = self.profile('sample')
+        self.assertEqual(context['profile']['mode'], 'sample')
+        self.assertFalse(context['has_pstats'])
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in collapsed.splitlines()), context['profile']['samples'])
+
+    def test_only_staff_are_profiled(self):
+        self.client.force_login(User.objects.create_user('reader', password='pw'))
+        self.assertFalse(self.client.get('/', {'_profile': '1'}).has_header('X-Profile-Id'))
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def writes(self, captured):
+        statements = [query['sql'].split()[0] for query in captured.captured_queries]
+        return [statement for statement in statements if statement in ('INSERT', 'UPDATE', 'DELETE')]
+
+    def test_unchanged_session_is_not_saved(self):
+        session = SessionStore()
+        session['cart'] = [1]
+        session.save()
+
+        session = SessionStore(session.session_key)
+        self.assertEqual(session['cart'], [1])
+        with CaptureQueriesContext(connection) as captured:
+            session.save()
+            session['cart'] = [1]
+            session.save()
+        self.assertEqual(self.writes(captured), [])
+
+        session['cart'] = [1, 2]
+        with CaptureQueriesContext(connection) as captured:
+            session.save()
+            session.save()
+        self.assertEqual(len(self.writes(captured)), 1)
+        self.assertEqual(SessionStore(session.session_key)['cart'], [1, 2])
+
+    def test_cycle_key(self):
+        # Nothing stored yet: the key is created once, by the save that follows
+        session = SessionStore()
+        session.cycle_key()
+        self.assertIsNone(session.session_key)
+        session['user'] = 1
+        with CaptureQueriesContext(connection) as captured:
+            session.save()
+        self.assertEqual(self.writes(captured), ['INSERT'])
+
+        old_key = session.session_key
+        session.cycle_key()
+        self.assertNotEqual(session.session_key, old_key)
+        self.assertFalse(SessionStore().exists(old_key))
+        self.assertEqual(SessionStore(session.session_key)['user'], 1)
+
+
+class CoherenceTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, coherence, '_state', coherence._state)
+        coherence._state = coherence._State()
+        self.applied = []
+        self.resets = 0
+        coherence.register('test', self.applied.append)
+        self.addCleanup(coherence._handlers.pop, 'test')
+        coherence.register_reset(self.reset)
+        self.addCleanup(coherence._reset_handlers.remove, self.reset)
+
+    def reset(self):
+        self.resets += 1
+
+    def events(self, *keys, origin='other-node'):
+        for key in keys:
+            InvalidationEvent.objects.create(kind='test', key=key, origin=origin)
+
+    def test_poll_applies_other_processes_events_in_order(self):
+        self.events('before')
+        # The first poll only finds its place in the log
+        self.assertEqual(coherence.poll(force=True), 0)
+        self.events('a', 'b')
+        self.events('own', origin=coherence.node_id())
+        self.events('c', 'd')
+        with patch.object(coherence, 'POLL_BATCH_SIZE', 3):
+            self.assertEqual(coherence.poll(force=True), 2)
+            self.assertEqual(coherence.poll(force=True), 2)
+            self.assertEqual(coherence.poll(force=True), 0)
+        self.assertEqual(self.applied, ['a', 'b', 'c', 'd'])
+        # Within the poll interval nothing is read
+        self.events('e')
+        with self.assertNumQueries(0):
+            self.assertEqual(coherence.poll(), 0)
+
+    @override_settings(COHERENCE_RETENTION_SECONDS=60)
+    def test_idle_process_resets_instead_of_replaying(self):
+        coherence.poll(force=True)
+        self.events('a')
+        coherence._get_state().last_poll -= 61
+        self.assertEqual(coherence.poll(), 0)
+        self.assertEqual((self.applied, self.resets), ([], 1))
+        self.events('b')
+        self.assertEqual(coherence.poll(force=True), 1)
+        self.assertEqual(self.applied, ['b'])
+
+    @override_settings(COHERENCE_RETENTION_SECONDS=60)
+    def test_prune_runs_off_the_request_path(self):
+        self.events('old', 'new')
+        InvalidationEvent.objects.filter(key='old').update(created_at=timezone.now() - timedelta(seconds=61))
+        coherence.poll(force=True)
+        self.events('later')
+        coherence._get_state().last_poll -= 30
+        coherence.poll()
+        self.assertEqual(InvalidationEvent.objects.count(), 3)
+
+        out = io.StringIO()
+        call_command('prune_invalidation_events', stdout=out)
+        self.assertIn('Deleted 1 ', out.getvalue())
+        self.assertEqual(list(InvalidationEvent.objects.order_by('id').values_list('key', flat=True)), ['new', 'later'])
+
+
+class LoggingTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_records_are_written_as_json_lines(self):
+        stream = io.StringIO()
+        handler = logs.queue_handler(stream)
+        listener = logs._listeners.pop()
+        log = logging.getLogger('core.tests.json')
+        log.addHandler(handler)
+        log.propagate = False
+        self.addCleanup(log.removeHandler, handler)
+
+        token = logs.request_id_var.set('req-1')
+        try:
+            log.warning('upload.%s', 'slow', extra={'size': 3})
+            try:
+                raise ValueError('broken')
+            except ValueError:
+                log.exception('upload.failed')
+        finally:
+            logs.request_id_var.reset(token)
+        # Stopping the listener writes out everything still queued
+        listener.stop()
+
+        slow, failed = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            {key: slow[key] for key in ['level', 'logger', 'event', 'request_id', 'size']},
+            {'level': 'WARNING', 'logger': 'core.tests.json', 'event': 'upload.slow', 'request_id': 'req-1', 'size': 3},
+        )
+        self.assertEqual(failed['event'], 'upload.failed')
+        self.assertIn('ValueError: broken', failed['exc'])
+
+    def test_failed_mail_does_not_fail_the_request(self):
+        with patch('newsletter.views.send_welcome_email', side_effect=OSError('mail server down')):
+            with self.assertLogs('newsletter.views', 'ERROR') as captured:
+                response = self.client.post('/newsletter/subscribe/', {'email': 'reader@example.com'}, HTTP_X_REQUEST_ID='req-42')
+        self.assertEqual((response.status_code, response['X-Request-ID']), (302, 'req-42'))
+        self.assertTrue(Newsletter.objects.filter(email='reader@example.com').exists())
+
+        record, = captured.records
+        self.assertEqual(record.getMessage(), 'newsletter.welcome_email.failed')
+        self.assertEqual((record.failures_total, record.subscriber_id), (1, Newsletter.objects.get().pk))
+        self.assertGreaterEqual(record.duration_ms, 0)
+        self.assertEqual(metrics.get('newsletter.welcome_email.failed'), 1)
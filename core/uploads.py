@@ -0,0 +1,238 @@
+"""
+Chunked, resumable uploads for post images and editor attachments.
+
+A client announces a file (name, size, kind) and gets an upload session,
+then PATCHes it in chunks of at most UPLOAD_CHUNK_SIZE bytes, each sent with
+the offset it starts at (Upload-Offset header). Chunks are streamed straight
+into a partial file under MEDIA_ROOT, so a worker holds one small buffer
+whatever the file size and is only tied up for one chunk at a time. After a
+dropped connection the client asks for the session's offset and carries on
+from there.
+
+Completing the upload checks the file's SHA-256 against the client's and
+that it is an image, then moves it into the content-addressed store (the
+same filesystem, so nothing is copied). Post images are then attached to a
+post by the post form through the session id; editor attachments become
+Summernote attachment rows straight away. Sessions and partial files left
+behind are removed by the clear_uploads command after UPLOAD_SESSION_HOURS.
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import timedelta
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.validators import get_available_image_extensions
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+from django_summernote.utils import get_attachment_model, get_config
+from PIL import Image
+
+from . import metrics
+from .models import UploadSession
+from .storage import INCOMING_DIR
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'uploads'
+OFFSET_HEADER = 'Upload-Offset'
+# Bytes read from the request (and hashed) at a time
+COPY_CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = frozenset(f'.{extension.lower()}' for extension in get_available_image_extensions())
+
+
+def partial_path(upload_id):
+    return os.path.join(settings.MEDIA_ROOT, INCOMING_DIR, UPLOAD_DIR, f'{upload_id}.part')
+
+
+def error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def can_upload(user):
+    """Uploads are for the users who may write posts"""
+    return user.is_authenticated and (user.is_staff or user.profile.is_approved)
+
+
+def max_size(kind):
+    limit = getattr(settings, 'UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+    if kind == UploadSession.KIND_ATTACHMENT:
+        limit = min(limit, get_config()['attachment_filesize_limit'])
+    return limit
+
+
+def session_data(upload):
+    data = {
+        'id': str(upload.pk),
+        'url': reverse('upload_session', args=[upload.pk]),
+        'complete_url': reverse('upload_complete', args=[upload.pk]),
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': getattr(settings, 'UPLOAD_CHUNK_SIZE', 512 * 1024),
+        'complete': bool(upload.stored_name),
+    }
+    if upload.stored_name:
+        data['name'] = upload.stored_name
+        data['file_url'] = default_storage.url(upload.stored_name)
+    return data
+
+
+def discard(upload):
+    """Delete a session and its partial file"""
+    try:
+        os.remove(partial_path(upload.pk))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def file_sha256(path):
+    with open(path, 'rb') as file:
+        return hashlib.file_digest(file, 'sha256').hexdigest()
+
+
+def is_image(path):
+    """Whether Pillow recognizes the file as an intact image (reads headers, not pixels)"""
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        return False
+    return True
+
+
+def clear_expired(now=None):
+    """Delete sessions and partial files untouched for UPLOAD_SESSION_HOURS; returns the sessions deleted"""
+    cutoff = (now or timezone.now()) - timedelta(hours=getattr(settings, 'UPLOAD_SESSION_HOURS', 24))
+    # By age rather than by session, so files of deleted users' sessions go too
+    directory = os.path.join(settings.MEDIA_ROOT, INCOMING_DIR, UPLOAD_DIR)
+    if os.path.isdir(directory):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.stat().st_mtime < cutoff.timestamp():
+                    os.remove(entry.path)
+    deleted, _ = UploadSession.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
+
+
+@require_POST
+def upload_create_view(request):
+    """Start an upload: POST filename, size and kind ('image' or 'attachment')"""
+    if not can_upload(request.user):
+        return error('Only approved authors can upload files.', 403)
+    kind = request.POST.get('kind', UploadSession.KIND_IMAGE)
+    if kind not in dict(UploadSession.KIND_CHOICES):
+        return error('Unknown upload kind.', 400)
+    filename = PurePosixPath(request.POST.get('filename', '').replace('\\', '/')).name[:255]
+    if PurePosixPath(filename).suffix.lower() not in IMAGE_EXTENSIONS:
+        return error('Only image files can be uploaded.', 400)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return error('The file size is missing.', 400)
+    if not 0 < size <= max_size(kind):
+        return error('The file is empty or too large.', 413 if size > 0 else 400)
+    if request.user.upload_sessions.filter(stored_name='').count() >= getattr(settings, 'UPLOAD_MAX_PENDING', 10):
+        return error('Too many unfinished uploads; try again later.', 429)
+
+    upload = UploadSession.objects.create(user=request.user, kind=kind, filename=filename, size=size)
+    path = partial_path(upload.pk)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return JsonResponse(session_data(upload), status=201)
+
+
+@require_http_methods(['GET', 'HEAD', 'PATCH'])
+def upload_session_view(request, upload_id):
+    """GET the offset to resume from, or PATCH the next chunk at the Upload-Offset header's offset"""
+    if not request.user.is_authenticated:
+        return error('Log in to upload files.', 403)
+    upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method != 'PATCH':
+        return JsonResponse(session_data(upload))
+    if upload.stored_name:
+        return error('This upload is already complete.', 409)
+
+    try:
+        offset = int(request.headers.get(OFFSET_HEADER, ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return error(f'The {OFFSET_HEADER} header is missing.', 400)
+    if offset != upload.offset:
+        # A retried or reordered chunk: tell the client where to carry on
+        return JsonResponse(session_data(upload), status=409)
+    if length > getattr(settings, 'UPLOAD_CHUNK_SIZE', 512 * 1024) or offset + length > upload.size:
+        return error('The chunk is too large.', 413)
+
+    received = 0
+    # Written over whatever a failed attempt left after the offset; the file
+    # is cut to size when the upload completes
+    try:
+        with open(partial_path(upload.pk), 'r+b') as file:
+            file.seek(offset)
+            while received < length:
+                data = request.read(min(COPY_CHUNK_SIZE, length - received))
+                if not data:
+                    break
+                file.write(data)
+                received += len(data)
+    except FileNotFoundError:
+        return error('The upload has expired; start it again.', 410)
+    except OSError:
+        # The connection dropped (UnreadablePostError): keep what arrived
+        pass
+
+    # Only one request can move the offset on from where it was read
+    UploadSession.objects.filter(pk=upload.pk, offset=offset).update(offset=offset + received, updated_at=timezone.now())
+    upload.refresh_from_db(fields=['offset'])
+    metrics.increment('uploads.chunks')
+    return JsonResponse(session_data(upload))
+
+
+@require_POST
+def upload_complete_view(request, upload_id):
+    """Verify the uploaded file against the POSTed sha256 and store it"""
+    if not request.user.is_authenticated:
+        return error('Log in to upload files.', 403)
+    upload = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if upload.stored_name:
+        # A retry after the response was lost
+        return JsonResponse(session_data(upload))
+    if upload.offset != upload.size:
+        return JsonResponse(session_data(upload), status=409)
+
+    path = partial_path(upload.pk)
+    start = time.perf_counter()
+    try:
+        os.truncate(path, upload.size)
+        digest = file_sha256(path)
+    except FileNotFoundError:
+        return error('The upload was already completed or has expired.', 409)
+    if digest != request.POST.get('sha256', '').strip().lower():
+        # Some chunk was corrupted on the way; the client has to start over
+        metrics.increment('uploads.checksum_mismatch')
+        discard(upload)
+        return error('The file does not match its checksum; upload it again.', 400)
+    if not is_image(path):
+        discard(upload)
+        return error('The file is not a valid image.', 400)
+
+    try:
+        upload.stored_name = default_storage.adopt(path, upload.filename, digest)
+    except FileNotFoundError:
+        # A concurrent retry got there first
+        return error('The upload was already completed or has expired.', 409)
+    upload.save(update_fields=['stored_name', 'updated_at'])
+    if upload.kind == UploadSession.KIND_ATTACHMENT:
+        attachment = get_attachment_model()(name=upload.filename)
+        attachment.file.name = upload.stored_name
+        attachment.save()
+    metrics.increment('uploads.completed')
+    logger.info('Upload %s completed (%s bytes, verified in %.1fms)', upload.pk, upload.size, (time.perf_counter() - start) * 1000)
+    return JsonResponse(session_data(upload))
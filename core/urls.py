@@ -0,0 +1,14 @@
+from django.urls import path
+from . import uploads, views
+
+urlpatterns = [
+    # Chunked, resumable uploads (core/uploads.py)
+    path('uploads/', uploads.upload_create_view, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', uploads.upload_session_view, name='upload_session'),
+    path('uploads/<uuid:upload_id>/complete/', uploads.upload_complete_view, name='upload_complete'),
+    path('admin-dashboard/metrics/', views.metrics_view, name='metrics'),
+    path('admin-dashboard/profiles/', views.profile_list_view, name='profile_list'),
+    path('admin-dashboard/profiles/<str:profile_id>/', views.profile_detail_view, name='profile_detail'),
+    path('admin-dashboard/profiles/<str:profile_id>/collapsed/', views.profile_download_view, {'kind': 'collapsed'}, name='profile_collapsed'),
+    path('admin-dashboard/profiles/<str:profile_id>/pstats/', views.profile_download_view, {'kind': 'pstats'}, name='profile_pstats'),
+]
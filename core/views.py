@@ -0,0 +1,53 @@
+from django.contrib.auth.decorators import user_passes_test
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import render
+
+from users.views import is_admin
+from . import metrics, stale
+from .profiling import list_profiles, load_profile, profile_file
+
+
+@user_passes_test(is_admin)
+def profile_list_view(request):
+    """Recent request profiles captured with ?_profile"""
+    context = {
+        'profiles': list_profiles(),
+    }
+
+    return render(request, 'core/profile_list.html', context)
+
+
+@user_passes_test(is_admin)
+def profile_detail_view(request, profile_id):
+    """One request profile with its SQL queries and hottest functions"""
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise Http404('Profile not found.')
+
+    context = {
+        'profile': profile,
+        'queries': sorted(profile['queries'], key=lambda query: query['ms'], reverse=True),
+        'has_collapsed': profile_file(profile_id, '.collapsed') is not None,
+        'has_pstats': profile_file(profile_id, '.prof') is not None,
+    }
+
+    return render(request, 'core/profile_detail.html', context)
+
+
+@user_passes_test(is_admin)
+def profile_download_view(request, profile_id, kind):
+    """Download collapsed stacks (flamegraph input) or raw pstats data"""
+    suffix = {'collapsed': '.collapsed', 'pstats': '.prof'}[kind]
+    path = profile_file(profile_id, suffix)
+    if path is None:
+        raise Http404('Profile data not found.')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+@user_passes_test(is_admin)
+def metrics_view(request):
+    """This process's counters (stale pages served, operation failures, ...) and circuit breaker state"""
+    return JsonResponse({
+        'counters': metrics.snapshot(),
+        'stale_breaker': stale.breaker.state(),
+    })
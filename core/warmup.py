@@ -0,0 +1,115 @@
+"""
+Process and cache warm-up.
+
+Template compilation, URL resolver construction and the search-suggestion
+index are per process, so they are warmed inside each worker (see
+gunicorn.conf.py) and by the warmup command, both through warm_process().
+Priming pages renders them through the middleware stack with the
+pre-renderer's PageRenderer, which fills the shared cache backend and the
+database and OS page caches for the most visited pages.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.db.models import F
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.loader import get_template
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver, reverse
+
+from blog import suggest
+from blog.models import Post
+from blog.prerender import PageRenderer
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = ('.html', '.txt')
+
+# Header that tells views not to count warm-up hits as reader traffic
+WARMUP_HEADER = 'HTTP_X_WARMUP'
+
+
+def preload_templates():
+    """Compile every project and app template into the cached loader"""
+    directories = [Path(directory) for engine in engines.all() for directory in engine.dirs]
+    directories += [Path(directory) for directory in get_app_template_dirs('templates')]
+
+    count = 0
+    for directory in directories:
+        for path in directory.rglob('*'):
+            if path.suffix not in TEMPLATE_SUFFIXES:
+                continue
+            try:
+                get_template(path.relative_to(directory).as_posix())
+            except (TemplateDoesNotExist, TemplateSyntaxError):
+                continue
+            count += 1
+
+    # Summernote builds its widget media and iframe config on first render
+    from blog.forms import PostForm
+    str(PostForm())
+    return count
+
+
+def resolve_urls():
+    """Build the URL resolver and its reverse lookup tables"""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    count = 0
+    for pattern in resolver.url_patterns:
+        count += 1
+        if hasattr(pattern, 'url_patterns'):
+            pattern.reverse_dict
+            count += len(pattern.url_patterns)
+    return count
+
+
+def get_warmup_paths(top_posts=20):
+    """Home, category listings, ranked feeds and the most visited post pages"""
+    home = reverse('home')
+    paths = [home, f'{home}?sort=trending', f'{home}?sort=top']
+    paths += [f'{home}?category={category}' for category, _ in Post.CATEGORY_CHOICES]
+
+    published = Post.objects.filter(status='published')
+    slugs = list(
+        published.filter(ranking__isnull=False)
+        .order_by(F('ranking__trending_score').desc())
+        .values_list('slug', flat=True)[:top_posts]
+    )
+    if len(slugs) < top_posts:
+        slugs += [
+            slug for slug in published.order_by('-created_at').values_list('slug', flat=True)[:top_posts]
+            if slug not in slugs
+        ][:top_posts - len(slugs)]
+    paths += [reverse('post_detail', args=[slug]) for slug in slugs]
+    return paths
+
+
+def prime_pages(paths):
+    """Render each path as an anonymous reader; returns {path: (status, seconds)}"""
+    renderer = PageRenderer(header=WARMUP_HEADER)
+    results = {}
+    for path in paths:
+        start = time.perf_counter()
+        response = renderer.get(path)
+        results[path] = (response.status_code, time.perf_counter() - start)
+    return results
+
+
+def warm_process(pages=False, top_posts=20):
+    """
+    Warm the current process; used by the warmup command and the gunicorn
+    post_fork hook. Returns ({stage: (count, seconds)}, page results).
+    """
+    start = time.perf_counter()
+    stages = {}
+    for name, warm in [('templates', preload_templates), ('URL patterns', resolve_urls), ('suggestions', suggest.build)]:
+        stage_start = time.perf_counter()
+        stages[name] = (warm(), time.perf_counter() - stage_start)
+    results = prime_pages(get_warmup_paths(top_posts)) if pages else {}
+    logger.info(
+        'Warm-up finished in %.2fs (%s, %d pages)',
+        time.perf_counter() - start, ', '.join(f'{count} {name}' for name, (count, _) in stages.items()), len(results),
+    )
+    return stages, results
@@ -0,0 +1,21 @@
+"""
+Optional gunicorn configuration: `gunicorn -c gunicorn.conf.py ofori_blog.wsgi`.
+
+Each worker compiles templates and builds the URL resolver and the
+search-suggestion index right after it is forked, before it accepts its first request. This is on by default; set
+WARMUP_ON_FORK=0 to turn it off.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8013')
+workers = int(os.environ.get('GUNICORN_WORKERS', '3'))
+# Load the app in the master so workers fork with Django already set up
+preload_app = True
+
+
+def post_fork(server, worker):
+    if os.environ.get('WARMUP_ON_FORK', '1') != '1':
+        return
+    from core.warmup import warm_process
+    stages, _ = warm_process()
+    server.log.info('Worker %s warmed: %s', worker.pid, ', '.join(f'{count} {name}' for name, (count, _) in stages.items()))
@@ -1,11 +1,95 @@
-from django.contrib import admin
-from .models import Newsletter
+from django import forms
+from django.contrib import admin, messages
+from django.shortcuts import render
+from django.utils import timezone
+from blog.models import Post
+from core.changelist import EstimatedCountPaginator, case_insensitive_prefix_search
+from .models import Newsletter, SubscriberCategory
+
+
+class SubscriberCategoryInline(admin.TabularInline):
+    model = SubscriberCategory
+    extra = 0
+
+
+class CategoryBulkEditForm(forms.Form):
+    """Intermediate form for the bulk category action"""
+    MODE_CHOICES = [
+        ('add', 'Add these categories'),
+        ('remove', 'Remove these categories'),
+        ('replace', 'Replace preferences with exactly these categories'),
+    ]
+
+    categories = forms.MultipleChoiceField(choices=Post.CATEGORY_CHOICES, widget=forms.CheckboxSelectMultiple)
+    mode = forms.ChoiceField(choices=MODE_CHOICES, widget=forms.RadioSelect, initial='add')
 
 
 @admin.register(Newsletter)
 class NewsletterAdmin(admin.ModelAdmin):
-    list_display = ['email', 'is_active', 'subscribed_at', 'unsubscribed_at']
-    list_filter = ['is_active', 'subscribed_at']
+    list_display = ['email', 'is_active', 'frequency', 'subscribed_at', 'unsubscribed_at']
+    list_filter = ['is_active', 'frequency', 'category_preferences__category', 'subscribed_at']
     search_fields = ['email']
-    readonly_fields = ['subscribed_at', 'unsubscribed_at']
-    list_editable = ['is_active']
+    search_help_text = 'Email address prefix'
+    readonly_fields = ['subscribed_at', 'unsubscribed_at', 'last_sent_at', 'welcome_pending']
+    inlines = [SubscriberCategoryInline]
+    actions = ['deactivate', 'edit_categories']
+    # Id order matches subscription order and is served by the primary key
+    ordering = ['-pk']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(case_insensitive_prefix_search('email', term)), False
+
+    @admin.action(description='Deactivate selected subscribers')
+    def deactivate(self, request, queryset):
+        changed = queryset.filter(is_active=True).update(is_active=False, unsubscribed_at=timezone.now())
+        self.message_user(request, f'Deactivated {changed} subscribers.', messages.SUCCESS)
+
+    @admin.action(description='Edit category preferences of selected subscribers')
+    def edit_categories(self, request, queryset):
+        if 'apply' in request.POST:
+            form = CategoryBulkEditForm(request.POST)
+            if form.is_valid():
+                categories = form.cleaned_data['categories']
+                mode = form.cleaned_data['mode']
+                subscriber_ids = list(queryset.values_list('id', flat=True))
+
+                if mode in ('remove', 'replace'):
+                    existing = SubscriberCategory.objects.filter(newsletter_id__in=subscriber_ids)
+                    if mode == 'remove':
+                        existing.filter(category__in=categories).delete()
+                    else:
+                        existing.exclude(category__in=categories).delete()
+                if mode in ('add', 'replace'):
+                    SubscriberCategory.objects.bulk_create(
+                        [
+                            SubscriberCategory(newsletter_id=subscriber_id, category=category)
+                            for subscriber_id in subscriber_ids
+                            for category in categories
+                        ],
+                        ignore_conflicts=True,
+                        batch_size=500,
+                    )
+
+                self.message_user(
+                    request,
+                    f'Updated category preferences for {len(subscriber_ids)} subscribers.',
+                    messages.SUCCESS,
+                )
+                return None
+        else:
+            form = CategoryBulkEditForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Edit category preferences',
+            'form': form,
+            'queryset': queryset,
+            'opts': self.model._meta,
+            'action_checkbox_name': admin.helpers.ACTION_CHECKBOX_NAME,
+        }
+        return render(request, 'admin/newsletter/edit_categories.html', context)
@@ -0,0 +1,119 @@
+"""
+Daily and weekly newsletter digests.
+
+Subscribers whose last send is older than their cadence are grouped into
+cohorts by the posts that went live (published_at) since that send and
+their category preferences. Each cohort's email is rendered once; only the
+unsubscribe and preference links differ per recipient, and every message
+goes out over a single SMTP connection. SMTP traffic therefore scales with
+subscribers x cadence rather than with the number of posts published.
+
+Messages are sent in batches and only the subscribers whose message went
+out are stamped, so anyone a failure skipped gets the digest next run.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+import logging
+
+from django.core.mail import get_connection
+from django.utils import timezone
+
+from blog.models import Post
+from .models import Newsletter, SubscriberCategory
+from .utils import build_message, render_email, send_each
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PERIODS = {
+    Newsletter.FREQUENCY_DAILY: timedelta(days=1),
+    Newsletter.FREQUENCY_WEEKLY: timedelta(days=7),
+}
+
+# Tolerance so a cron job running at a fixed time every day/week is never skipped
+SCHEDULE_SLACK = timedelta(hours=1)
+
+# Messages sent, and their subscribers stamped with last_sent_at, per batch
+SEND_BATCH_SIZE = 500
+
+
+def build_cohorts(subscribers, post_times, categories):
+    """
+    Group (id, email, since) tuples by the index of the first post that went
+    live after `since` in the ascending post_times list and by the subscriber's
+    category set. Subscribers with nothing new are left out.
+    """
+    cohorts = defaultdict(list)
+    for subscriber_id, email, since in subscribers:
+        start = bisect_right(post_times, since)
+        if start < len(post_times):
+            cohorts[(start, categories.get(subscriber_id, frozenset()))].append((subscriber_id, email))
+    return cohorts
+
+
+def send_digests(frequency, now=None):
+    """Send the digest for one cadence to every due subscriber; returns the number of emails sent"""
+    period = DIGEST_PERIODS[frequency]
+    now = now or timezone.now()
+    due_before = now - period + SCHEDULE_SLACK
+
+    subscribers = [
+        (subscriber_id, email, last_sent_at or subscribed_at)
+        for subscriber_id, email, last_sent_at, subscribed_at in Newsletter.objects.filter(
+            is_active=True,
+            frequency=frequency,
+        ).exclude(
+            last_sent_at__gt=due_before,
+        ).order_by().values_list('id', 'email', 'last_sent_at', 'subscribed_at')
+    ]
+    if not subscribers:
+        return 0
+
+    oldest = min(since for _, _, since in subscribers)
+    posts = list(
+        Post.objects.filter(status='published', published_at__gt=oldest, published_at__lte=now)
+        .select_related('author')
+        .order_by('published_at')
+    )
+    if not posts:
+        return 0
+
+    preferences = defaultdict(set)
+    for subscriber_id, category in SubscriberCategory.objects.filter(
+        newsletter__is_active=True,
+        newsletter__frequency=frequency,
+    ).values_list('newsletter_id', 'category'):
+        preferences[subscriber_id].add(category)
+    categories = {subscriber_id: frozenset(chosen) for subscriber_id, chosen in preferences.items()}
+
+    post_times = [post.published_at for post in posts]
+    cohorts = build_cohorts(subscribers, post_times, categories)
+
+    label = 'Daily' if frequency == Newsletter.FREQUENCY_DAILY else 'Weekly'
+    recipients = []
+    for (start, chosen), members in cohorts.items():
+        cohort_posts = [post for post in reversed(posts[start:]) if post.category in chosen]
+        if not cohort_posts:
+            continue
+        html, text = render_email('digest', {'posts': cohort_posts, 'frequency': frequency})
+        count = len(cohort_posts)
+        subject = f"Your {label} Ofori Blog Digest: {count} new post{'s' if count != 1 else ''}"
+        recipients.extend((subscriber_id, email, (subject, html, text)) for subscriber_id, email in members)
+
+    sent = 0
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for start in range(0, len(recipients), SEND_BATCH_SIZE):
+            batch = recipients[start:start + SEND_BATCH_SIZE]
+            results = send_each(connection, [build_message(subject, html, text, email) for _, email, (subject, html, text) in batch])
+            sent_ids = [subscriber_id for (subscriber_id, _, _), ok in zip(batch, results) if ok]
+            Newsletter.objects.filter(id__in=sent_ids).update(last_sent_at=now)
+            sent += len(sent_ids)
+    finally:
+        connection.close()
+
+    if sent < len(recipients):
+        logger.warning('%s of %s %s digests were not sent', len(recipients) - sent, len(recipients), frequency)
+    return sent
@@ -0,0 +1,39 @@
+from django import forms
+from blog.models import Post
+from .models import Newsletter
+
+
+class NewsletterPreferencesForm(forms.ModelForm):
+    """Form for subscribers to choose how often and about which categories they hear from us"""
+
+    categories = forms.MultipleChoiceField(
+        choices=Post.CATEGORY_CHOICES,
+        widget=forms.CheckboxSelectMultiple(attrs={
+            'class': 'form-check-input'
+        }),
+        label='Topics',
+        error_messages={'required': 'Choose at least one topic, or unsubscribe instead.'},
+    )
+
+    class Meta:
+        model = Newsletter
+        fields = ['frequency']
+        widgets = {
+            'frequency': forms.RadioSelect(attrs={
+                'class': 'form-check-input'
+            }),
+        }
+        labels = {
+            'frequency': 'Delivery',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['categories'].initial = self.instance.get_categories()
+
+    def save(self, commit=True):
+        subscription = super().save(commit=commit)
+        if commit:
+            subscription.set_categories(self.cleaned_data['categories'])
+        return subscription
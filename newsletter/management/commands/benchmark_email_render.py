@@ -0,0 +1,76 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from blog.models import Post
+from newsletter.utils import build_message, render_email
+
+
+def legacy_new_post_message(post, email):
+    """The per-recipient f-string + strip_tags rendering used before templated emails"""
+    html_message = f"""
+    <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h2 style="color: #007bff;">New Post Published!</h2>
+                <h3>{post.title}</h3>
+                <p><strong>By:</strong> {post.author.get_full_name() or post.author.username}</p>
+                <p><strong>Category:</strong> {post.get_category_display()}</p>
+                <p>{post.get_excerpt()}</p>
+                <p>
+                    <a href="http://{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}{post.get_absolute_url()}"
+                       style="display: inline-block; padding: 10px 20px; background-color: #007bff; color: white; text-decoration: none; border-radius: 5px;">
+                        Read Full Post
+                    </a>
+                </p>
+                <hr style="border: 1px solid #eee; margin: 20px 0;">
+                <p style="font-size: 12px; color: #666;">
+                    You're receiving this because you subscribed to Ofori Blog newsletter.
+                    <a href="http://{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}/newsletter/unsubscribe/{email}/">Unsubscribe</a>
+                </p>
+            </div>
+        </body>
+    </html>
+    """
+    return html_message, strip_tags(html_message)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-recipient render cost of new-post emails: legacy f-strings vs shared template render'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        recipients = [f'reader{i}@example.com' for i in range(options['recipients'])]
+        author = User(username='benchmark', first_name='Bench', last_name='Mark')
+        post = Post(
+            title='Benchmarking newsletter rendering',
+            slug='benchmarking-newsletter-rendering',
+            author=author,
+            category='technology',
+            content='<p>' + 'Lorem ipsum dolor sit amet, <strong>consectetur</strong> adipiscing elit. ' * 400 + '</p>',
+            created_at=timezone.now(),
+        )
+
+        start = time.perf_counter()
+        for email in recipients:
+            legacy_new_post_message(post, email)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        html, text = render_email('new_post', {'post': post})
+        for email in recipients:
+            build_message('New Post', html, text, email)
+        templated = time.perf_counter() - start
+
+        count = len(recipients)
+        self.stdout.write(f'Recipients:          {count}')
+        self.stdout.write(f'Legacy f-string:     {legacy / count * 1e6:8.1f} us/recipient ({legacy:.3f}s total)')
+        self.stdout.write(f'Shared template:     {templated / count * 1e6:8.1f} us/recipient ({templated:.3f}s total)')
+        if templated:
+            self.stdout.write(self.style.SUCCESS(f'Speed-up:            {legacy / templated:.1f}x'))
@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.transfer import export_subscribers
+
+
+class Command(BaseCommand):
+    help = 'Export newsletter subscribers as CSV to a file (or stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--active-only', action='store_true', help='Leave out unsubscribed addresses')
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            export_subscribers(sys.stdout, active_only=options['active_only'])
+            return
+        try:
+            with open(options['path'], 'w', newline='', encoding='utf-8') as file:
+                written = export_subscribers(file, active_only=options['active_only'])
+        except OSError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"Exported {written} subscribers to {options['path']}."))
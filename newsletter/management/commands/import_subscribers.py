@@ -0,0 +1,50 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.models import Newsletter
+from newsletter.transfer import IMPORT_CHUNK_SIZE, import_subscribers
+
+
+class Command(BaseCommand):
+    help = 'Import newsletter subscribers from a CSV file with an "email" column (use - for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--frequency',
+            choices=[frequency for frequency, _ in Newsletter.FREQUENCY_CHOICES],
+            default=Newsletter.FREQUENCY_INSTANT,
+            help='Delivery for new subscribers whose row has no frequency',
+        )
+        parser.add_argument('--no-welcome', action='store_true', help='Do not queue welcome emails')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            stats = self.import_file(sys.stdin, options)
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8-sig') as file:
+                    stats = self.import_file(file, options)
+            except OSError as error:
+                raise CommandError(error)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {stats['created']}, updated {stats['updated']}, unchanged {stats['unchanged']}; "
+            f"skipped {stats['duplicate']} duplicate and {stats['invalid']} invalid rows."
+        ))
+        if stats['created'] and not options['no_welcome']:
+            self.stdout.write('Welcome emails are queued; send them with: python manage.py send_welcome_emails')
+
+    def import_file(self, file, options):
+        reader = csv.DictReader(file)
+        if not reader.fieldnames or 'email' not in reader.fieldnames:
+            raise CommandError('The CSV file needs a header row with an "email" column.')
+        return import_subscribers(
+            reader,
+            frequency=options['frequency'],
+            welcome=not options['no_welcome'],
+            chunk_size=options['chunk_size'],
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from newsletter.digest import DIGEST_PERIODS, send_digests
+
+
+class Command(BaseCommand):
+    help = 'Send the daily or weekly newsletter digest to subscribers who are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('frequency', choices=sorted(DIGEST_PERIODS))
+
+    def handle(self, *args, **options):
+        sent = send_digests(options['frequency'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} {options['frequency']} digest emails."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from newsletter.utils import send_pending_welcome_emails
+
+
+class Command(BaseCommand):
+    help = 'Send the welcome emails queued for imported newsletter subscribers'
+
+    def handle(self, *args, **options):
+        sent = send_pending_welcome_emails()
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} welcome emails.'))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='frequency',
+            field=models.CharField(choices=[('instant', 'Instant (every new post)'), ('daily', 'Daily digest'), ('weekly', 'Weekly digest')], default='instant', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='last_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['frequency', 'is_active'], name='newsletter__frequen_7169f1_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CATEGORIES = ['technology', 'politics', 'life', 'advice', 'others']
+
+
+def subscribe_existing_to_all_categories(apps, schema_editor):
+    Newsletter = apps.get_model('newsletter', 'Newsletter')
+    SubscriberCategory = apps.get_model('newsletter', 'SubscriberCategory')
+    subscriber_ids = Newsletter.objects.values_list('id', flat=True)
+    SubscriberCategory.objects.bulk_create(
+        [
+            SubscriberCategory(newsletter_id=subscriber_id, category=category)
+            for subscriber_id in subscriber_ids.iterator()
+            for category in CATEGORIES
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0002_newsletter_frequency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriberCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('technology', 'Technology'), ('politics', 'Politics'), ('life', 'Life'), ('advice', 'Advice'), ('others', 'Others')], max_length=20)),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_preferences', to='newsletter.newsletter')),
+            ],
+            options={
+                'verbose_name': 'Subscriber Category',
+                'verbose_name_plural': 'Subscriber Categories',
+                'indexes': [models.Index(fields=['category', 'newsletter'], name='newsletter__categor_98473d_idx')],
+                'unique_together': {('newsletter', 'category')},
+            },
+        ),
+        migrations.RunPython(subscribe_existing_to_all_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0003_subscriber_category'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='newsletter',
+            name='newsletter__frequen_7169f1_idx',
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['frequency'], name='newsletter_active_freq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['is_active', '-subscribed_at'], name='newsletter__is_acti_2afbbd_idx'),
+        ),
+    ]
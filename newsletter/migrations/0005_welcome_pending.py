@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0004_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='welcome_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(condition=models.Q(('welcome_pending', True)), fields=['id'], name='newsletter_welcome_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:59
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0005_welcome_pending'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='newsletter_email_lower_idx'),
+        ),
+    ]
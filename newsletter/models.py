@@ -1,16 +1,80 @@
 from django.db import models
+from django.db.models.functions import Lower
+from blog.models import Post
+
+
+class NewsletterQuerySet(models.QuerySet):
+    def interested_in(self, category):
+        """Subscribers who opted into a post category (one join on the category index)"""
+        return self.filter(category_preferences__category=category)
 
 
 class Newsletter(models.Model):
+    FREQUENCY_INSTANT = 'instant'
+    FREQUENCY_DAILY = 'daily'
+    FREQUENCY_WEEKLY = 'weekly'
+
+    FREQUENCY_CHOICES = [
+        (FREQUENCY_INSTANT, 'Instant (every new post)'),
+        (FREQUENCY_DAILY, 'Daily digest'),
+        (FREQUENCY_WEEKLY, 'Weekly digest'),
+    ]
+
     email = models.EmailField(unique=True)
     is_active = models.BooleanField(default=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default=FREQUENCY_INSTANT)
     subscribed_at = models.DateTimeField(auto_now_add=True)
     unsubscribed_at = models.DateTimeField(blank=True, null=True)
+    last_sent_at = models.DateTimeField(blank=True, null=True)
+    # Set by bulk imports; cleared by the send_welcome_emails command once the welcome is sent
+    welcome_pending = models.BooleanField(default=False)
+
+    objects = NewsletterQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Newsletter Subscription'
         verbose_name_plural = 'Newsletter Subscriptions'
         ordering = ['-subscribed_at']
+        indexes = [
+            # Mail fan-out and digests only read active subscribers of one cadence
+            models.Index(fields=['frequency'], condition=models.Q(is_active=True), name='newsletter_active_freq_idx'),
+            # Admin list filtered by status, newest first
+            models.Index(fields=['is_active', '-subscribed_at']),
+            # Queued welcome emails, a handful of rows at any time
+            models.Index(fields=['id'], condition=models.Q(welcome_pending=True), name='newsletter_welcome_idx'),
+            # Case-insensitive email prefix search in the admin
+            models.Index(Lower('email'), name='newsletter_email_lower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.email} - {'Active' if self.is_active else 'Inactive'}"
+
+    def get_categories(self):
+        return [preference.category for preference in self.category_preferences.all()]
+
+    def set_categories(self, categories):
+        """Replace this subscriber's category preferences"""
+        categories = set(categories)
+        self.category_preferences.exclude(category__in=categories).delete()
+        SubscriberCategory.objects.bulk_create(
+            [SubscriberCategory(newsletter=self, category=category) for category in categories],
+            ignore_conflicts=True,
+        )
+
+
+class SubscriberCategory(models.Model):
+    """A post category a subscriber wants to hear about; new subscribers get every category"""
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='category_preferences')
+    category = models.CharField(max_length=20, choices=Post.CATEGORY_CHOICES)
+
+    class Meta:
+        unique_together = ('newsletter', 'category')
+        indexes = [
+            # Serves "subscribers interested in category X" without touching other categories
+            models.Index(fields=['category', 'newsletter']),
+        ]
+        verbose_name = 'Subscriber Category'
+        verbose_name_plural = 'Subscriber Categories'
+
+    def __str__(self):
+        return f"{self.newsletter.email} - {self.category}"
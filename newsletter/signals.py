@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from blog.models import Post
+from .models import Newsletter
+
+
+@receiver(post_save, sender=Newsletter)
+def default_categories(sender, instance, created, raw=False, **kwargs):
+    """
+    New subscribers hear about every category unless they were given some.
+
+    Checked once the transaction commits, so preferences saved alongside the
+    subscriber (admin inlines, set_categories right after create) win.
+    """
+    if not created or raw:
+        return
+
+    def apply():
+        if not instance.category_preferences.exists():
+            instance.set_categories(category for category, _ in Post.CATEGORY_CHOICES)
+
+    transaction.on_commit(apply)
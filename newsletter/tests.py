@@ -1,3 +1,214 @@
-from django.test import TestCase
+import csv
+import io
+import smtplib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from blog import scheduling
+from blog.models import Post
+from .digest import send_digests
+from .models import Newsletter
+from .transfer import CATEGORIES, export_subscribers, import_subscribers
+from .utils import preferences_token, send_new_post_notification, send_pending_welcome_emails, send_welcome_email
+
+
+class RefusingBackend(locmem.EmailBackend):
+    """The test outbox, except that bounce@ addresses are refused"""
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.startswith('bounce@') for address in message.to):
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'No such user') for address in message.to})
+        return super().send_messages(messages)
+
+
+class SubscriptionTests(TestCase):
+    def test_new_subscribers_default_to_every_category(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            everything = Newsletter.objects.create(email='all@example.com')
+            chosen = Newsletter.objects.create(email='life@example.com')
+            chosen.set_categories(['life'])
+        self.assertEqual(sorted(everything.get_categories()), sorted(CATEGORIES))
+        self.assertEqual(chosen.get_categories(), ['life'])
+
+    def test_subscribe_needs_a_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            response = client.post(reverse('newsletter_subscribe'), {'email': 'forged@example.com'})
+        self.assertEqual(response.status_code, 403)
+
+        # What the footer script does on a pre-rendered page
+        token = client.get(reverse('newsletter_token')).json()['token']
+        with self.captureOnCommitCallbacks(execute=True), self.assertLogs('newsletter', 'INFO'):
+            response = client.post(reverse('newsletter_subscribe'), {'email': 'reader@example.com', 'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Newsletter.objects.filter(email='forged@example.com').exists())
+        self.assertEqual(sorted(Newsletter.objects.get(email='reader@example.com').get_categories()), sorted(CATEGORIES))
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+
+    def test_admin_added_subscriber_gets_every_category(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:newsletter_newsletter_add'), {
+                'email': 'added@example.com',
+                'is_active': 'on',
+                'frequency': Newsletter.FREQUENCY_INSTANT,
+                'category_preferences-TOTAL_FORMS': '0',
+                'category_preferences-INITIAL_FORMS': '0',
+            })
+        self.assertEqual(response.status_code, 302)
+        subscriber = Newsletter.objects.get(email='added@example.com')
+        self.assertEqual(sorted(subscriber.get_categories()), sorted(CATEGORIES))
+
+    def test_preferences_need_a_signed_link(self):
+        subscriber = Newsletter.objects.create(email='reader@example.com')
+        subscriber.set_categories(['life'])
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(reverse('newsletter_preferences', args=['reader@example.com'])).status_code, 404)
+
+        send_welcome_email('reader@example.com')
+        url = reverse('newsletter_preferences', args=[preferences_token('reader@example.com')])
+        self.assertIn(url, mail.outbox[0].body)
+        response = self.client.post(url, {'frequency': Newsletter.FREQUENCY_WEEKLY, 'categories': ['technology']})
+        self.assertEqual(response.status_code, 302)
+        subscriber.refresh_from_db()
+        self.assertEqual((subscriber.frequency, subscriber.get_categories()), ('weekly', ['technology']))
+
+
+class SubscriberTransferTests(TestCase):
+    def test_import_and_export(self):
+        Newsletter.objects.create(email='daily@example.com', frequency=Newsletter.FREQUENCY_DAILY)
+        Newsletter.objects.create(email='left@example.com', is_active=False)
+        rows = [
+            {'email': 'new@EXAMPLE.com'},
+            {'email': ' new@example.com ', 'frequency': 'weekly', 'categories': 'life;advice'},
+            {'email': 'daily@example.com', 'frequency': 'weekly'},
+            {'email': 'left@example.com'},
+            {'email': 'not-an-email'},
+            {'email': 'gone@example.com', 'is_active': 'false'},
+        ]
+        stats = import_subscribers(rows, chunk_size=4)
+        self.assertEqual(dict(stats), {'created': 2, 'updated': 1, 'unchanged': 1, 'duplicate': 1, 'invalid': 1})
+
+        new = Newsletter.objects.get(email='new@example.com')
+        self.assertEqual((new.frequency, sorted(new.get_categories())), ('weekly', ['advice', 'life']))
+        self.assertEqual(Newsletter.objects.get(email='daily@example.com').frequency, 'weekly')
+        # Imports never resubscribe, and unsubscribed rows are not welcomed
+        self.assertFalse(Newsletter.objects.get(email='left@example.com').is_active)
+        self.assertEqual(list(Newsletter.objects.filter(welcome_pending=True)), [new])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_pending_welcome_emails(), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        self.assertEqual(send_pending_welcome_emails(), 0)
+
+        # A differently cased address is the same subscriber, not a new one
+        stats = import_subscribers([{'email': 'Daily@example.com', 'frequency': 'daily'}, {'email': 'NEW@example.com'}])
+        self.assertEqual(dict(stats), {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(Newsletter.objects.count(), 4)
+
+        out = io.StringIO()
+        self.assertEqual(export_subscribers(out, chunk_size=2), 4)
+        exported = list(csv.DictReader(io.StringIO(out.getvalue())))
+        Newsletter.objects.all().delete()
+        self.assertEqual(import_subscribers(exported, welcome=False)['created'], 4)
+        self.assertEqual(Newsletter.objects.filter(is_active=True).count(), 2)
+        self.assertEqual(sorted(Newsletter.objects.get(email='new@example.com').get_categories()), ['advice', 'life'])
+
+    @override_settings(EMAIL_BACKEND='newsletter.tests.RefusingBackend')
+    def test_refused_welcome_does_not_block_the_queue(self):
+        import_subscribers([{'email': 'bounce@example.com'}, {'email': 'first@example.com'}, {'email': 'second@example.com'}])
+        with self.assertLogs('newsletter', 'ERROR'):
+            self.assertEqual(send_pending_welcome_emails(), 2)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['first@example.com', 'second@example.com'])
+        # A permanent refusal is not retried
+        self.assertFalse(Newsletter.objects.filter(welcome_pending=True).exists())
+
+    def test_failed_welcome_stays_queued(self):
+        import_subscribers([{'email': 'first@example.com'}, {'email': 'second@example.com'}])
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=[1, smtplib.SMTPServerDisconnected()]):
+            with self.assertLogs('newsletter', 'WARNING'):
+                self.assertEqual(send_pending_welcome_emails(), 1)
+        self.assertEqual(list(Newsletter.objects.filter(welcome_pending=True).values_list('email', flat=True)), ['second@example.com'])
+        self.assertEqual(send_pending_welcome_emails(), 1)
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.author = User.objects.create_user('author')
+        self.last_sent = self.now - timedelta(days=1, hours=2)
+        for email in ['reader@example.com', 'bounce@example.com']:
+            subscriber = Newsletter.objects.create(email=email, frequency=Newsletter.FREQUENCY_DAILY, last_sent_at=self.last_sent)
+            subscriber.set_categories(['life'])
+
+    def post(self, title, status='published', created_at=None):
+        return Post.objects.create(
+            title=title, author=self.author, content='<p>Body</p>', category='life',
+            status=status, created_at=created_at or self.now,
+        )
+
+    def test_digest_covers_posts_that_went_live_since_the_last_send(self):
+        Post.objects.filter(pk=self.post('Already sent').pk).update(published_at=self.last_sent - timedelta(hours=1))
+        # Published after its publication date, and scheduled for a date that has passed
+        self.post('Backdated', created_at=self.now - timedelta(days=3))
+        self.post('Scheduled', status='scheduled', created_at=self.now - timedelta(days=2))
+        self.post('Draft', status='draft')
+        self.assertEqual(scheduling.publish_due(), 1)
+
+        self.assertEqual(send_digests(Newsletter.FREQUENCY_DAILY), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        for message in mail.outbox:
+            self.assertIn('2 new posts', message.subject)
+            self.assertIn('Backdated', message.body)
+            self.assertIn('Scheduled', message.body)
+            self.assertNotIn('Already sent', message.body)
+        # Everyone is up to date
+        self.assertEqual(send_digests(Newsletter.FREQUENCY_DAILY, now=self.now + timedelta(hours=2)), 0)
+
+    @override_settings(EMAIL_BACKEND='newsletter.tests.RefusingBackend')
+    def test_refused_recipients_are_not_stamped(self):
+        self.post('New post')
+        self.now = timezone.now()
+        with self.assertLogs('newsletter', 'ERROR'):
+            self.assertEqual(send_digests(Newsletter.FREQUENCY_DAILY, now=self.now), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['reader@example.com']])
+        stamped = dict(Newsletter.objects.values_list('email', 'last_sent_at'))
+        self.assertEqual(stamped, {'reader@example.com': self.now, 'bounce@example.com': self.last_sent})
+
+        # The next run retries only the subscriber who missed out
+        Newsletter.objects.filter(email='bounce@example.com').update(email='back@example.com')
+        self.assertEqual(send_digests(Newsletter.FREQUENCY_DAILY, now=self.now + timedelta(minutes=5)), 1)
+        self.assertEqual(mail.outbox[-1].to, ['back@example.com'])
+
+
+class NewPostNotificationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author')
+        self.post = Post.objects.create(
+            title='Fresh post', author=author, content='<p>Body</p>', category='life',
+            status='published', created_at=timezone.now(),
+        )
+        for email, frequency, categories in [
+            ('reader@example.com', Newsletter.FREQUENCY_INSTANT, ['life']),
+            ('bounce@example.com', Newsletter.FREQUENCY_INSTANT, ['life']),
+            ('other@example.com', Newsletter.FREQUENCY_INSTANT, ['politics']),
+            ('daily@example.com', Newsletter.FREQUENCY_DAILY, ['life']),
+        ]:
+            Newsletter.objects.create(email=email, frequency=frequency).set_categories(categories)
+
+    @override_settings(EMAIL_BACKEND='newsletter.tests.RefusingBackend')
+    def test_only_delivered_subscribers_are_stamped(self):
+        with self.assertLogs('newsletter', 'WARNING') as logs:
+            self.assertEqual(send_new_post_notification(self.post), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['reader@example.com']])
+        self.assertEqual(mail.outbox[0].subject, 'New Post: Fresh post')
+        self.assertIn('bounce@example.com', logs.output[0])
+        stamped = Newsletter.objects.filter(last_sent_at__isnull=False).values_list('email', flat=True)
+        self.assertEqual(list(stamped), ['reader@example.com'])
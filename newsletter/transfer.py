@@ -0,0 +1,173 @@
+"""
+Bulk subscriber import and export as CSV.
+
+Both directions stream. The import takes IMPORT_CHUNK_SIZE rows at a time,
+normalizes and dedups their emails case-insensitively, looks the chunk up
+with one query and writes it with bulk_create/bulk_update in one transaction. The export walks
+the table in primary-key pages. Memory use does not grow with the file.
+
+Imported subscribers are not welcomed inline: they are flagged
+welcome_pending and mailed later by the send_welcome_emails command.
+"""
+import csv
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from blog.models import Post
+from .models import Newsletter, SubscriberCategory
+
+# Rows looked up and written per query/transaction during an import
+IMPORT_CHUNK_SIZE = 500
+# Subscribers per page of an export
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = ['email', 'is_active', 'frequency', 'categories', 'subscribed_at', 'unsubscribed_at']
+CATEGORIES = frozenset(category for category, _ in Post.CATEGORY_CHOICES)
+FREQUENCIES = frozenset(frequency for frequency, _ in Newsletter.FREQUENCY_CHOICES)
+CATEGORY_SEPARATOR_RE = re.compile(r'[;|\s]+')
+INACTIVE_VALUES = frozenset(['0', 'false', 'no', 'inactive', 'unsubscribed'])
+EMAIL_MAX_LENGTH = Newsletter._meta.get_field('email').max_length
+
+
+def parse_row(row):
+    """(email, frequency, categories, is_active) from a CSV row dict, or None if the row is invalid"""
+    email = BaseUserManager.normalize_email((row.get('email') or '').strip())
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    # Blank frequency/categories keep an existing subscriber's choice (or the defaults for a new one)
+    frequency = (row.get('frequency') or '').strip().lower() or None
+    categories = frozenset(CATEGORY_SEPARATOR_RE.split((row.get('categories') or '').strip().lower())) - {''}
+    if len(email) > EMAIL_MAX_LENGTH or (frequency and frequency not in FREQUENCIES) or not categories <= CATEGORIES:
+        return None
+    is_active = (row.get('is_active') or '').strip().lower() not in INACTIVE_VALUES
+    return email, frequency, categories, is_active
+
+
+def import_chunk(rows, stats, frequency, welcome):
+    """Import one chunk of CSV row dicts, adding the outcomes to stats"""
+    parsed = {}
+    for row in rows:
+        values = parse_row(row)
+        if values is None:
+            stats['invalid'] += 1
+            continue
+        key = values[0].lower()
+        if key in parsed:
+            stats['duplicate'] += 1
+        # The last occurrence of an email in the chunk wins
+        parsed[key] = values
+    if not parsed:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        # normalize_email only lowercases the domain, so existing rows are matched case-insensitively
+        lookup = Q()
+        for email, _, _, _ in parsed.values():
+            lookup |= Q(email__iexact=email)
+        existing = {subscriber.email.lower(): subscriber for subscriber in Newsletter.objects.filter(lookup)}
+
+        changed = []
+        preferences = []
+        for subscriber in existing.values():
+            _, new_frequency, categories, is_active = parsed[subscriber.email.lower()]
+            dirty = False
+            if new_frequency and subscriber.frequency != new_frequency:
+                subscriber.frequency = new_frequency
+                dirty = True
+            # Unsubscribes from the source list are honoured; an import never resubscribes anyone
+            if subscriber.is_active and not is_active:
+                subscriber.is_active = False
+                subscriber.unsubscribed_at = now
+                dirty = True
+            if dirty:
+                changed.append(subscriber)
+            # Existing preferences are only ever added to
+            preferences += [SubscriberCategory(newsletter_id=subscriber.pk, category=category) for category in categories]
+        Newsletter.objects.bulk_update(changed, ['frequency', 'is_active', 'unsubscribed_at'])
+        stats['updated'] += len(changed)
+        stats['unchanged'] += len(existing) - len(changed)
+
+        created = Newsletter.objects.bulk_create([
+            Newsletter(
+                email=email,
+                frequency=new_frequency or frequency,
+                is_active=is_active,
+                unsubscribed_at=None if is_active else now,
+                welcome_pending=welcome and is_active,
+            )
+            for email, new_frequency, _, is_active in parsed.values()
+            if email.lower() not in existing
+        ])
+        stats['created'] += len(created)
+        # New subscribers hear about every category unless the row says otherwise
+        for subscriber in created:
+            categories = parsed[subscriber.email.lower()][2] or CATEGORIES
+            preferences += [SubscriberCategory(newsletter_id=subscriber.pk, category=category) for category in categories]
+        SubscriberCategory.objects.bulk_create(preferences, ignore_conflicts=True, batch_size=IMPORT_CHUNK_SIZE)
+
+
+def import_subscribers(rows, frequency=Newsletter.FREQUENCY_INSTANT, welcome=True, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create or update subscribers from an iterable of CSV row dicts with an
+    `email` column and optional `frequency`, `categories` (separated by ';',
+    '|' or spaces) and `is_active` columns. Returns a Counter of created,
+    updated, unchanged, duplicate and invalid rows.
+    """
+    stats = Counter()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return stats
+        import_chunk(chunk, stats, frequency, welcome)
+
+
+def export_subscribers(file, active_only=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write subscribers to `file` as CSV in the format import_subscribers reads; returns the row count"""
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_FIELDS)
+    subscribers = Newsletter.objects.order_by('pk')
+    if active_only:
+        subscribers = subscribers.filter(is_active=True)
+
+    written = 0
+    last_pk = 0
+    while True:
+        page = list(
+            subscribers.filter(pk__gt=last_pk)
+            .values_list('pk', 'email', 'is_active', 'frequency', 'subscribed_at', 'unsubscribed_at')[:chunk_size]
+        )
+        if not page:
+            return written
+        # One range scan of the (newsletter, category) index per page
+        categories = defaultdict(list)
+        for newsletter_id, category in SubscriberCategory.objects.filter(
+            newsletter_id__gt=last_pk,
+            newsletter_id__lte=page[-1][0],
+        ).order_by('newsletter_id', 'category').values_list('newsletter_id', 'category'):
+            categories[newsletter_id].append(category)
+
+        writer.writerows(
+            [
+                email,
+                'true' if is_active else 'false',
+                frequency,
+                ';'.join(categories[pk]),
+                subscribed_at.isoformat(),
+                unsubscribed_at.isoformat() if unsubscribed_at else '',
+            ]
+            for pk, email, is_active, frequency, subscribed_at, unsubscribed_at in page
+        )
+        written += len(page)
+        last_pk = page[-1][0]
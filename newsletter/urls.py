@@ -3,5 +3,7 @@ from . import views
 
 urlpatterns = [
     path('subscribe/', views.newsletter_subscribe_view, name='newsletter_subscribe'),
+    path('subscribe/token/', views.newsletter_token_view, name='newsletter_token'),
+    path('preferences/<str:token>/', views.newsletter_preferences_view, name='newsletter_preferences'),
     path('unsubscribe/<str:email>/', views.newsletter_unsubscribe_view, name='newsletter_unsubscribe'),
 ]
@@ -1,126 +1,191 @@
-from django.core.mail import send_mail
+import logging
+import smtplib
+from itertools import islice
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.core import signing
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
 
+logger = logging.getLogger(__name__)
+
+# Recipients loaded and messages sent per batch during a new-post fan-out
+FAN_OUT_CHUNK_SIZE = 200
+
+WELCOME_SUBJECT = 'Welcome to Ofori Blog Newsletter!'
+
+# Placeholders left in shared renders and replaced per recipient
+UNSUBSCRIBE_TOKEN = '__UNSUBSCRIBE_URL__'
+PREFERENCES_TOKEN = '__PREFERENCES_URL__'
+
+# Namespaces the signatures in preferences links
+PREFERENCES_SALT = 'newsletter.preferences'
 
-def send_welcome_email(email):
-    """Send welcome email to new newsletter subscriber"""
-    subject = 'Welcome to Ofori Blog Newsletter!'
-
-    html_message = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #007bff;">Welcome to Ofori Blog!</h2>
-                <p>Thank you for subscribing to our newsletter. You'll now receive updates whenever we publish new content.</p>
-                <p>Stay tuned for:</p>
-                <ul>
-                    <li>Latest blog posts</li>
-                    <li>Technology insights</li>
-                    <li>Life advice and more</li>
-                </ul>
-                <p>We're excited to have you with us!</p>
-                <hr style="border: 1px solid #eee; margin: 20px 0;">
-                <p style="font-size: 12px; color: #666;">
-                    Don't want these emails?
-                    <a href="{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}/newsletter/unsubscribe/{email}/">Unsubscribe</a>
-                </p>
-            </div>
-        </body>
-    </html>
-    """
 
-    plain_message = strip_tags(html_message)
+def preferences_token(email):
+    """Signed token that stands in for the subscriber's email in preferences links"""
+    return signing.dumps(email, salt=PREFERENCES_SALT)
 
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-        html_message=html_message,
-        fail_silently=False,
+
+def preferences_email(token):
+    """The email a preferences token was issued for; raises signing.BadSignature if it was tampered with"""
+    return signing.loads(token, salt=PREFERENCES_SALT)
+
+
+def get_site_url():
+    """Base URL used for links in outgoing emails"""
+    return f"http://{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}"
+
+
+def render_email(name, context):
+    """
+    Render the HTML and plain-text variants of templates/newsletter/emails/<name>.
+
+    Templates come from the cached loader, so they are compiled once per
+    process. Recipient links are left as tokens for personalize().
+    """
+    context = {
+        'site_url': get_site_url(),
+        'unsubscribe_url': UNSUBSCRIBE_TOKEN,
+        'preferences_url': PREFERENCES_TOKEN,
+        **context,
+    }
+    html = get_template(f'newsletter/emails/{name}.html').render(context)
+    text = get_template(f'newsletter/emails/{name}.txt').render(context)
+    return html, text
+
+
+def personalize(body, email, html=False):
+    """Substitute the recipient-specific links into a rendered body"""
+    site_url = get_site_url()
+    unsubscribe_url = site_url + reverse('newsletter_unsubscribe', args=[email])
+    preferences_url = site_url + reverse('newsletter_preferences', args=[preferences_token(email)])
+    if html:
+        unsubscribe_url = escape(unsubscribe_url)
+        preferences_url = escape(preferences_url)
+    return body.replace(UNSUBSCRIBE_TOKEN, unsubscribe_url).replace(PREFERENCES_TOKEN, preferences_url)
+
+
+def build_message(subject, html, text, email):
+    """Create a multipart message for one recipient from shared renders"""
+    message = EmailMultiAlternatives(subject, personalize(text, email), settings.DEFAULT_FROM_EMAIL, [email])
+    message.attach_alternative(personalize(html, email, html=True), 'text/html')
+    return message
+
+
+def is_permanent_refusal(error):
+    """Whether the server refused every recipient with a 5xx code, so a retry cannot succeed"""
+    return isinstance(error, smtplib.SMTPRecipientsRefused) and all(
+        code >= 500 for code, _ in error.recipients.values()
     )
 
 
-def send_reactivation_email(email):
-    """Send reactivation email to returning subscriber"""
-    subject = 'Welcome Back to Ofori Blog!'
-
-    html_message = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #007bff;">Welcome Back!</h2>
-                <p>We're thrilled to have you back on our newsletter list.</p>
-                <p>You'll now receive updates about our latest posts and content.</p>
-                <p>Thank you for rejoining our community!</p>
-                <hr style="border: 1px solid #eee; margin: 20px 0;">
-                <p style="font-size: 12px; color: #666;">
-                    Don't want these emails?
-                    <a href="{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}/newsletter/unsubscribe/{email}/">Unsubscribe</a>
-                </p>
-            </div>
-        </body>
-    </html>
+def send_each(connection, messages, refused=None):
     """
+    Send messages one at a time over an open connection; returns whether each
+    went out. A refused message is logged and the rest are still sent; if the
+    connection cannot be reopened, the remaining ones are given up. The indexes
+    of messages whose recipients were permanently refused are added to the
+    `refused` set when one is given.
+    """
+    sent = []
+    for message in messages:
+        try:
+            sent.append(bool(connection.send_messages([message])))
+            continue
+        except (smtplib.SMTPException, OSError) as error:
+            logger.exception('Could not send %r to %s', message.subject, ', '.join(message.to))
+            if refused is not None and is_permanent_refusal(error):
+                refused.add(len(sent))
+            sent.append(False)
+        # Start over on a fresh connection in case the failure left it unusable
+        connection.close()
+        try:
+            connection.open()
+        except (smtplib.SMTPException, OSError):
+            logger.exception('Could not reconnect to the mail server; %s messages not sent', len(messages) - len(sent))
+            return sent + [False] * (len(messages) - len(sent))
+    return sent
 
-    plain_message = strip_tags(html_message)
 
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+def send_welcome_email(email):
+    """Send welcome email to new newsletter subscriber"""
+    html, text = render_email('welcome', {})
+    build_message(WELCOME_SUBJECT, html, text, email).send(fail_silently=False)
 
 
-def send_new_post_notification(post):
-    """Send email notification to all active subscribers when a new post is published"""
+def send_pending_welcome_emails():
+    """Send the welcome emails queued by bulk imports; returns the number sent"""
     from .models import Newsletter
 
-    active_subscribers = Newsletter.objects.filter(is_active=True)
+    pending = Newsletter.objects.filter(welcome_pending=True).order_by('pk')
+    html, text = render_email('welcome', {})
+    sent = failed = 0
+    last_pk = 0
+
+    # Subscribers are marked welcomed only once their email went out or was refused
+    # for good, so a failed run can simply be repeated for the ones left over
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        while batch := list(pending.filter(pk__gt=last_pk).values_list('pk', 'email', 'is_active')[:FAN_OUT_CHUNK_SIZE]):
+            last_pk = batch[-1][0]
+            # Subscribers who left before their welcome went out are skipped
+            recipients = [(pk, email) for pk, email, is_active in batch if is_active]
+            refused = set()
+            results = send_each(connection, [build_message(WELCOME_SUBJECT, html, text, email) for _, email in recipients], refused)
+            done = {pk for pk, _, is_active in batch if not is_active}
+            done.update(pk for i, ((pk, _), ok) in enumerate(zip(recipients, results)) if ok or i in refused)
+            Newsletter.objects.filter(pk__in=done).update(welcome_pending=False)
+            sent += sum(results)
+            failed += len(recipients) - sum(results) - len(refused)
+    finally:
+        connection.close()
+
+    if failed:
+        logger.warning('%s welcome emails were not sent and stay queued', failed)
+    return sent
 
-    if not active_subscribers.exists():
-        return
 
-    subject = f'New Post: {post.title}'
+def send_reactivation_email(email):
+    """Send reactivation email to returning subscriber"""
+    html, text = render_email('reactivation', {})
+    build_message('Welcome Back to Ofori Blog!', html, text, email).send(fail_silently=False)
+
+
+def send_new_post_notification(post):
+    """Send email notification to instant-delivery subscribers of the post's category; returns the number sent"""
+    from .models import Newsletter
 
-    for subscriber in active_subscribers:
-        html_message = f"""
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #007bff;">New Post Published!</h2>
-                    <h3>{post.title}</h3>
-                    <p><strong>By:</strong> {post.author.get_full_name() or post.author.username}</p>
-                    <p><strong>Category:</strong> {post.get_category_display()}</p>
-                    <p>{post.get_excerpt()}</p>
-                    <p>
-                        <a href="http://{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}{post.get_absolute_url()}"
-                           style="display: inline-block; padding: 10px 20px; background-color: #007bff; color: white; text-decoration: none; border-radius: 5px;">
-                            Read Full Post
-                        </a>
-                    </p>
-                    <hr style="border: 1px solid #eee; margin: 20px 0;">
-                    <p style="font-size: 12px; color: #666;">
-                        You're receiving this because you subscribed to Ofori Blog newsletter.
-                        <a href="http://{settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'}/newsletter/unsubscribe/{subscriber.email}/">Unsubscribe</a>
-                    </p>
-                </div>
-            </body>
-        </html>
-        """
-
-        plain_message = strip_tags(html_message)
-
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [subscriber.email],
-            html_message=html_message,
-            fail_silently=True,
-        )
+    # Daily and weekly subscribers get the post in their next digest instead
+    active_subscribers = Newsletter.objects.filter(
+        is_active=True,
+        frequency=Newsletter.FREQUENCY_INSTANT,
+    ).interested_in(post.category).order_by()
+
+    subject = f'New Post: {post.title}'
+    # The post-dependent body is rendered once for the whole send
+    html, text = render_email('new_post', {'post': post})
+    recipients = active_subscribers.values_list('pk', 'email').iterator(chunk_size=FAN_OUT_CHUNK_SIZE)
+    sent = failed = 0
+
+    # One SMTP connection for the whole fan-out; recipients are streamed in chunks,
+    # and only those whose message went out are stamped
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        while batch := list(islice(recipients, FAN_OUT_CHUNK_SIZE)):
+            results = send_each(connection, [build_message(subject, html, text, email) for _, email in batch])
+            sent_ids = [pk for (pk, _), ok in zip(batch, results) if ok]
+            Newsletter.objects.filter(pk__in=sent_ids).update(last_sent_at=timezone.now())
+            sent += len(sent_ids)
+            failed += len(batch) - len(sent_ids)
+    finally:
+        connection.close()
+
+    if failed:
+        logger.warning('New post %s: %s of %s notifications were not sent', post.pk, failed, sent + failed)
+    return sent
@@ -1,8 +1,26 @@
+import logging
+
+from django.core import signing
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from .forms import NewsletterPreferencesForm
 from .models import Newsletter
-from .utils import send_welcome_email, send_reactivation_email
+from .utils import preferences_email, send_welcome_email, send_reactivation_email
+from core.logs import logged_operation
+
+logger = logging.getLogger(__name__)
+
+
+@never_cache
+@ensure_csrf_cookie
+def newsletter_token_view(request):
+    """CSRF token for the footer form, which pre-rendered static pages cannot embed"""
+    return JsonResponse({'token': get_token(request)})
 
 
 def newsletter_subscribe_view(request):
@@ -28,21 +46,17 @@ def newsletter_subscribe_view(request):
                 existing_subscription.save()
 
                 # Send reactivation email
-                try:
+                with logged_operation(logger, 'newsletter.reactivation_email', subscriber_id=existing_subscription.pk):
                     send_reactivation_email(email)
-                except Exception as e:
-                    print(f"Error sending reactivation email: {e}")
 
                 messages.success(request, 'Welcome back! You have been resubscribed to our newsletter.')
         else:
-            # Create new subscription
-            Newsletter.objects.create(email=email)
+            # Create new subscription; it starts out interested in every category
+            subscription = Newsletter.objects.create(email=email)
 
             # Send welcome email
-            try:
+            with logged_operation(logger, 'newsletter.welcome_email', subscriber_id=subscription.pk):
                 send_welcome_email(email)
-            except Exception as e:
-                print(f"Error sending welcome email: {e}")
 
             messages.success(request, 'Successfully subscribed to our newsletter!')
 
@@ -68,3 +82,29 @@ def newsletter_unsubscribe_view(request, email):
     }
 
     return render(request, 'newsletter/unsubscribe.html', context)
+
+
+def newsletter_preferences_view(request, token):
+    """Choose instant, daily or weekly newsletter delivery"""
+    # Only the signed links from our emails open someone's preferences
+    try:
+        email = preferences_email(token)
+    except signing.BadSignature:
+        raise Http404('Invalid preferences link')
+    subscription = get_object_or_404(Newsletter, email=email)
+
+    if request.method == 'POST':
+        form = NewsletterPreferencesForm(request.POST, instance=subscription)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Your newsletter preferences have been updated.')
+            return redirect('home')
+    else:
+        form = NewsletterPreferencesForm(instance=subscription)
+
+    context = {
+        'subscription': subscription,
+        'form': form,
+    }
+
+    return render(request, 'newsletter/preferences.html', context)
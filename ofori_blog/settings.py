@@ -31,18 +31,24 @@ INSTALLED_APPS = [
     'corsheaders',
 
     # Local apps
+    'core',
     'users',
     'blog',
     'newsletter',
 ]
 
 MIDDLEWARE = [
+    'core.logs.RequestIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.coherence.CoherenceMiddleware',
+    'core.stale.StaleContentMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -53,8 +59,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process (also used for newsletter emails)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -72,10 +84,28 @@ WSGI_APPLICATION = 'ofori_blog.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': config('DATABASE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+        # Seconds a query waits for a lock before failing with "database is locked"
+        'OPTIONS': {'timeout': config('DATABASE_TIMEOUT', default=5, cast=float)},
     }
 }
 
+# Cache (set CACHE_BACKEND/CACHE_LOCATION to a shared cache such as Redis or
+# Memcached when running several workers)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ofori-blog'),
+    },
+    # Last-known-good copies of public pages (see core/stale.py), kept apart so
+    # they never push sessions out of the default cache
+    'stale': {
+        'BACKEND': config('STALE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('STALE_CACHE_LOCATION', default='ofori-blog-stale'),
+        'OPTIONS': {'MAX_ENTRIES': config('STALE_CACHE_MAX_ENTRIES', default=1000, cast=int)},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,7 +135,87 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = Path(config('MEDIA_ROOT', default=str(BASE_DIR / 'media')))
+
+# Media is served by core.media.protected_media_view, which checks access and
+# then delegates the transfer: 'nginx' (X-Accel-Redirect to MEDIA_ACCEL_PREFIX),
+# 'sendfile' (X-Sendfile for Apache/lighttpd) or '' to stream from Python
+MEDIA_ACCEL_MODE = config('MEDIA_ACCEL_MODE', default='')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_ACCESS_CACHE_SECONDS = 60
+# How long browsers and proxies may reuse files of published posts before revalidating,
+# since unpublishing the post makes them private again
+MEDIA_PUBLISHED_CACHE_SECONDS = config('MEDIA_PUBLISHED_CACHE_SECONDS', default=60, cast=int)
+
+# Uploads (post images, profile images and Summernote attachments) are stored
+# once per unique content under media/blobs/; see core/storage.py
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Chunked, resumable uploads of post images and editor attachments (core/uploads.py).
+# Chunks are kept under nginx's default 1MB client_max_body_size
+UPLOAD_CHUNK_SIZE = 512 * 1024
+UPLOAD_MAX_SIZE = config('UPLOAD_MAX_SIZE', default=50 * 1024 * 1024, cast=int)
+# Unfinished uploads per user, and hours before clear_uploads deletes an untouched one
+UPLOAD_MAX_PENDING = 10
+UPLOAD_SESSION_HOURS = 24
+
+# Production collectstatic writes content-hashed names, a manifest and
+# precompressed .gz/.br siblings (see README)
+if not DEBUG:
+    STORAGES['staticfiles']['BACKEND'] = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Dynamic response compression (brotli is used when the package is installed)
+COMPRESS_MIN_SIZE = config('COMPRESS_MIN_SIZE', default=200, cast=int)
+COMPRESS_BROTLI_QUALITY = config('COMPRESS_BROTLI_QUALITY', default=5, cast=int)
+
+# Sessions are read from the cache and written to the database only when they change;
+# flash messages travel in a signed cookie instead of the session
+SESSION_ENGINE = 'core.sessions'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Cross-process invalidation: every process applies other processes' events
+# at most this many seconds late (see core/coherence.py)
+COHERENCE_POLL_SECONDS = config('COHERENCE_POLL_SECONDS', default=1.0, cast=float)
+COHERENCE_RETENTION_SECONDS = config('COHERENCE_RETENTION_SECONDS', default=3600, cast=int)
+
+# Pending authors per page in the admin dashboard's approval queue
+APPROVAL_QUEUE_PAGE_SIZE = 50
+
+# Published posts per page on author profiles
+PROFILE_POSTS_PAGE_SIZE = 12
+
+# Longest run_scheduler sleeps between checks, so it notices newly scheduled posts
+SCHEDULER_MAX_SLEEP = config('SCHEDULER_MAX_SLEEP', default=60, cast=float)
+
+# Entries returned by the search-box autocomplete (/search/suggest/)
+SEARCH_SUGGEST_LIMIT = 8
+
+# Serve-stale mode: anonymous GETs of these pages keep a last-known-good copy
+# (refreshed at most every STALE_REFRESH_SECONDS, kept STALE_MAX_AGE seconds)
+# that is served when the database is locked or times out (see core/stale.py)
+STALE_URL_NAMES = [
+    'home', 'post_detail', 'user_profile', 'archive_year', 'archive_month',
+    'api_post_list', 'api_post_detail', 'api_author',
+]
+STALE_REFRESH_SECONDS = config('STALE_REFRESH_SECONDS', default=30, cast=int)
+STALE_MAX_AGE = config('STALE_MAX_AGE', default=86400, cast=int)
+# The breaker opens after THRESHOLD contention errors within WINDOW seconds and
+# retries after COOLDOWN seconds, doubling up to MAX_COOLDOWN while errors go on
+STALE_BREAKER_THRESHOLD = config('STALE_BREAKER_THRESHOLD', default=3, cast=int)
+STALE_BREAKER_WINDOW = 10.0
+STALE_BREAKER_COOLDOWN = config('STALE_BREAKER_COOLDOWN', default=2.0, cast=float)
+STALE_BREAKER_MAX_COOLDOWN = 60.0
+
+# Admin changelists count at most this many rows; larger unfiltered tables
+# show the database's estimate (see core/changelist.py)
+ADMIN_EXACT_COUNT_LIMIT = 10000
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -139,6 +249,49 @@ CSRF_TRUSTED_ORIGINS = [
     "http://157.173.118.68:8013",
 ]
 
+# Post rankings (refreshed by `manage.py refresh_rankings`)
+RANKING_HALF_LIFE_HOURS = config('RANKING_HALF_LIFE_HOURS', default=72, cast=float)
+RANKING_PAGE_SIZE = 30
+
+# Page-view counting: hits are buffered per worker and flushed in batches
+VIEW_COUNT_DEDUP_SECONDS = 30 * 60
+VIEW_COUNT_FLUSH_SECONDS = config('VIEW_COUNT_FLUSH_SECONDS', default=60, cast=int)
+VIEW_COUNT_FLUSH_SIZE = 500
+
+# Static pre-rendering of public pages for direct web-server serving (see README)
+PRERENDER_ENABLED = config('PRERENDER_ENABLED', default=False, cast=bool)
+PRERENDER_ROOT = Path(config('PRERENDER_ROOT', default=str(BASE_DIR / 'prerendered')))
+
+# On-demand request profiling (?_profile=1 or ?_profile=sample, staff only)
+PROFILE_DIR = BASE_DIR / 'profiles'
+PROFILE_KEEP = config('PROFILE_KEEP', default=50, cast=int)
+PROFILE_SAMPLE_INTERVAL = config('PROFILE_SAMPLE_INTERVAL', default=0.001, cast=float)
+
+# Logging: JSON lines written to stderr by a background queue listener
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            '()': 'core.logs.queue_handler',
+            'stream': 'ext://sys.stderr',
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        'django': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 # Summernote configuration
 SUMMERNOTE_CONFIG = {
     'summernote': {
@@ -156,6 +309,8 @@ SUMMERNOTE_CONFIG = {
         'height': '400px',
     },
     'attachment_require_authentication': True,
+    # Sends editor images through the chunked upload endpoints
+    'js': (STATIC_URL + 'core/js/chunked_upload.js',),
 }
 
 # Security settings for production
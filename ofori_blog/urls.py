@@ -6,6 +6,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from blog.views import home_view
+from core.media import protected_media_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -20,11 +21,17 @@ urlpatterns = [
     # Blog app
     path('', include('blog.urls')),
 
+    # Core app (request profiles)
+    path('', include('core.urls')),
+
     # Newsletter app
     path('newsletter/', include('newsletter.urls')),
+
+    # Media files: permission check in Django, transfer by the web server (MEDIA_ACCEL_MODE).
+    # Also serves media under DEBUG; a plain static() route would skip the permission check.
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", protected_media_view, name='media'),
 ]
 
-# Serve media files in development
+# Serve static files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,50 @@
+from datetime import datetime, time, timedelta
+
+from django import forms
+from django.utils import timezone
+
+
+class ApprovalFilterForm(forms.Form):
+    """Filters for the pending-author approval queue"""
+    POSTS_CHOICES = [
+        ('', 'Any number of posts'),
+        ('0', 'No posts'),
+        ('1', '1 or more posts'),
+        ('5', '5 or more posts'),
+    ]
+
+    joined_after = forms.DateField(required=False, widget=forms.DateInput(attrs={
+        'class': 'form-control form-control-sm',
+        'type': 'date',
+    }))
+    joined_before = forms.DateField(required=False, widget=forms.DateInput(attrs={
+        'class': 'form-control form-control-sm',
+        'type': 'date',
+    }))
+    domain = forms.CharField(required=False, max_length=253, widget=forms.TextInput(attrs={
+        'class': 'form-control form-control-sm',
+        'placeholder': 'Email domain, e.g. example.com',
+    }))
+    posts = forms.ChoiceField(required=False, choices=POSTS_CHOICES, widget=forms.Select(attrs={
+        'class': 'form-select form-select-sm',
+    }))
+
+    def filter(self, queryset):
+        """Apply the valid filters to a queryset annotated with post_count"""
+        self.is_valid()
+        data = getattr(self, 'cleaned_data', {})
+        if data.get('joined_after'):
+            queryset = queryset.filter(created_at__gte=self._start_of(data['joined_after']))
+        if data.get('joined_before'):
+            # Inclusive: everyone who joined on that day
+            queryset = queryset.filter(created_at__lt=self._start_of(data['joined_before'] + timedelta(days=1)))
+        if data.get('domain'):
+            queryset = queryset.filter(user__email__iendswith='@' + data['domain'].strip().lstrip('@'))
+        if data.get('posts') == '0':
+            queryset = queryset.filter(post_count=0)
+        elif data.get('posts'):
+            queryset = queryset.filter(post_count__gte=int(data['posts']))
+        return queryset
+
+    def _start_of(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['-created_at', '-id'], name='profile_pending_idx'),
+        ),
+    ]
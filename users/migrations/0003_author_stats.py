@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:03
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def compute_stats(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Like = apps.get_model('blog', 'Like')
+    UserProfile = apps.get_model('users', 'UserProfile')
+    published = Post.objects.filter(author=OuterRef('user_id'), status='published').order_by().values('author')
+    likes = (
+        Like.objects.filter(post__author=OuterRef('user_id'), post__status='published')
+        .order_by().values('post__author')
+    )
+    UserProfile.objects.update(
+        published_posts=Coalesce(Subquery(published.annotate(count=Count('pk')).values('count')), 0),
+        likes_received=Coalesce(Subquery(likes.annotate(count=Count('pk')).values('count')), 0),
+        latest_post_at=Subquery(published.annotate(latest=Max('created_at')).values('latest')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_pending_profile_index'),
+        ('blog', '0009_author_published_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='latest_post_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='likes_received',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='published_posts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compute_stats, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,32 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+PENDING = models.Q(is_approved=False)
+
+
+class UserProfileQuerySet(models.QuerySet):
+    def pending(self):
+        """Profiles awaiting approval, leaving out rejected (deactivated) accounts"""
+        return self.filter(PENDING, user__is_active=True)
+
+    def with_post_count(self):
+        """Annotate each profile with its user's post count from the author index"""
+        from blog.models import Post
+
+        posts = Post.objects.filter(author=models.OuterRef('user_id')).order_by().values('author')
+        count = posts.annotate(count=models.Count('pk')).values('count')
+        return self.annotate(post_count=Coalesce(models.Subquery(count), 0))
+
+    def approve(self):
+        """Approve every profile in the queryset with one UPDATE; returns the number approved"""
+        return self.filter(is_approved=False).update(is_approved=True, approved_at=timezone.now())
+
+    def reject(self):
+        """Deactivate the accounts (never staff) with one UPDATE; returns the number rejected"""
+        return User.objects.filter(profile__in=self.values('pk'), is_active=True, is_staff=False).update(is_active=False)
 
 
 class UserProfile(models.Model):
@@ -11,6 +37,12 @@ class UserProfile(models.Model):
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
     approved_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Cached author statistics, kept up to date by blog.authors
+    published_posts = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    latest_post_at = models.DateTimeField(blank=True, null=True)
+
+    objects = UserProfileQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -19,6 +51,10 @@ class UserProfile(models.Model):
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
         ordering = ['-created_at']
+        indexes = [
+            # Approval queue: pending profiles, newest registrations first
+            models.Index(fields=['-created_at', '-id'], condition=PENDING, name='profile_pending_idx'),
+        ]
 
 
 # Signal to automatically create UserProfile when a User is created
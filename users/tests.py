@@ -1,3 +1,81 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from blog.models import Post
+from .models import UserProfile
+
+
+class ApprovalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        cls.users = {
+            name: User.objects.create_user(name, f'{name}@{domain}', 'pw')
+            for name, domain in [('spam1', 'spam.test'), ('spam2', 'SPAM.test'), ('writer', 'example.com'), ('reader', 'example.com')]
+        }
+        Post.objects.create(title='Draft', author=cls.users['writer'], content='<p>Body</p>', created_at=timezone.now())
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def profile(self, name):
+        return UserProfile.objects.select_related('user').get(user__username=name)
+
+    def approved(self):
+        return set(UserProfile.objects.filter(is_approved=True).values_list('user__username', flat=True))
+
+    def active(self):
+        return set(User.objects.filter(is_active=True).values_list('username', flat=True))
+
+    def test_approve_selected(self):
+        selected = [self.profile('writer').pk, self.profile('reader').pk, 'x']
+        response = self.client.post(reverse('bulk_approval'), {'action': 'approve', 'selected': selected})
+        self.assertRedirects(response, reverse('admin_dashboard') + '?', fetch_redirect_response=False)
+        self.assertEqual(self.approved(), {'writer', 'reader'})
+        self.assertIsNotNone(self.profile('writer').approved_at)
+
+    def test_single_action(self):
+        self.client.post(reverse('bulk_approval'), {'action': f"reject:{self.profile('spam1').pk}"})
+        self.assertNotIn('spam1', self.active())
+        self.assertIn('spam2', self.active())
+
+    def test_scope_all_uses_the_filters(self):
+        url = reverse('bulk_approval') + '?domain=spam.test'
+        response = self.client.post(url, {'action': 'reject', 'scope': 'all'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(self.active(), {'admin', 'writer', 'reader'})
+        # Rejected accounts leave the queue, so a second run finds nobody
+        response = self.client.post(url, {'action': 'reject', 'scope': 'all'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['count'], 0)
+
+        self.client.post(reverse('bulk_approval') + '?posts=1', {'action': 'approve', 'scope': 'all'})
+        self.assertEqual(self.approved(), {'writer'})
+
+    def test_unknown_action(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.post(reverse('bulk_approval'), {'action': 'delete'}).status_code, 400)
+
+    def test_staff_only(self):
+        pk = self.profile('writer').pk
+        for user in [None, self.users['reader']]:
+            if user:
+                self.client.force_login(user)
+            else:
+                self.client.logout()
+            with self.subTest(user=user):
+                response = self.client.post(reverse('bulk_approval'), {'action': 'approve', 'scope': 'all'})
+                self.assertEqual(response.status_code, 302)
+                self.assertIn(reverse('login'), response['Location'])
+                self.client.get(reverse('approve_user', args=[pk]))
+        self.assertEqual(self.approved(), set())
+        self.assertEqual(len(self.active()), 5)
+
+    def test_approve_and_revoke(self):
+        url = reverse('approve_user', args=[self.profile('writer').pk])
+        self.assertRedirects(self.client.get(url), reverse('admin_dashboard'), fetch_redirect_response=False)
+        self.assertEqual(self.approved(), {'writer'})
+        self.client.get(url)
+        self.assertEqual(self.approved(), set())
+        self.assertIsNone(self.profile('writer').approved_at)
@@ -8,5 +8,6 @@ urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('admin-dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
     path('admin-dashboard/approve-user/<int:user_id>/', views.approve_user_view, name='approve_user'),
+    path('admin-dashboard/approvals/', views.bulk_approval_view, name='bulk_approval'),
     path('user/<str:username>/', views.user_profile_view, name='user_profile'),
 ]
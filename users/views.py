@@ -1,9 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.utils import timezone
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_POST
+from blog.models import Post, PostViewDaily
+from .forms import ApprovalFilterForm
 from .models import UserProfile
 
 
@@ -82,18 +91,32 @@ def logout_view(request):
     return redirect('home')
 
 
+class KnownCountPaginator(Paginator):
+    """Paginator told the number of items up front, so paging needs no COUNT query"""
+
+    def __init__(self, object_list, per_page, count):
+        super().__init__(object_list, per_page)
+        self.count = count
+
+
 def user_profile_view(request, username):
-    """View user profile and their posts"""
-    user = get_object_or_404(User, username=username)
+    """View user profile, their cached stats and a page of their published posts"""
+    user = get_object_or_404(User.objects.select_related('profile'), username=username)
     profile = user.profile
 
-    # Get user's published posts
-    posts = user.posts.filter(status='published').order_by('-created_at')
+    # One page off the (author, created_at) index of published posts; the total comes from the profile
+    posts = (
+        Post.objects.filter(author=user, status='published')
+        .order_by('-created_at', '-id')
+        .with_like_count()
+    )
+    paginator = KnownCountPaginator(posts, getattr(settings, 'PROFILE_POSTS_PAGE_SIZE', 12), profile.published_posts)
+    page = paginator.get_page(request.GET.get('page'))
 
     context = {
         'profile_user': user,
         'profile': profile,
-        'posts': posts,
+        'page': page,
     }
 
     return render(request, 'users/profile.html', context)
@@ -102,18 +125,29 @@ def user_profile_view(request, username):
 @login_required
 def dashboard_view(request):
     """User dashboard showing all their posts"""
-    posts = request.user.posts.all().order_by('-created_at')
+    # Likes and views (from the daily rollups) come from correlated subqueries in the same query
+    daily_views = (
+        PostViewDaily.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        .annotate(total=Sum('views')).values('total')
+    )
+    posts = list(
+        request.user.posts.with_like_count('like_total')
+        .annotate(view_total=Coalesce(Subquery(daily_views), 0))
+        .order_by('-created_at')
+    )
 
     # Count stats
-    total_posts = posts.count()
-    published_posts = posts.filter(status='published').count()
-    draft_posts = posts.filter(status='draft').count()
+    total_posts = len(posts)
+    published_posts = sum(1 for post in posts if post.status == 'published')
+    draft_posts = sum(1 for post in posts if post.status == 'draft')
 
     context = {
         'posts': posts,
         'total_posts': total_posts,
         'published_posts': published_posts,
         'draft_posts': draft_posts,
+        'total_views': sum(post.view_total for post in posts),
+        'total_likes': sum(post.like_total for post in posts),
     }
 
     return render(request, 'users/dashboard.html', context)
@@ -124,32 +158,81 @@ def is_admin(user):
     return user.is_authenticated and user.is_staff
 
 
+def is_ajax(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def filter_query(request):
+    """The approval-queue filters of the current request as a query string, without the page"""
+    query = request.GET.copy()
+    query.pop('page', None)
+    return query.urlencode()
+
+
 @user_passes_test(is_admin)
 def admin_dashboard_view(request):
-    """Admin dashboard for managing user approvals"""
-    pending_users = UserProfile.objects.filter(is_approved=False).select_related('user')
+    """Admin dashboard with the paginated, filterable queue of authors awaiting approval"""
+    filter_form = ApprovalFilterForm(request.GET)
+    pending_users = filter_form.filter(
+        UserProfile.objects.pending().with_post_count().select_related('user').order_by('-created_at', '-id')
+    )
+    paginator = Paginator(pending_users, getattr(settings, 'APPROVAL_QUEUE_PAGE_SIZE', 50))
+    page = paginator.get_page(request.GET.get('page'))
 
     context = {
-        'pending_users': pending_users,
+        'page': page,
+        'filter_form': filter_form,
+        'filter_query': filter_query(request),
     }
 
-    return render(request, 'users/admin_dashboard.html', context)
+    # AJAX requests refresh just the queue after a bulk action
+    template = 'users/approval_queue.html' if is_ajax(request) else 'users/admin_dashboard.html'
+    response = render(request, template, context)
+    patch_vary_headers(response, ['X-Requested-With'])
+    return response
+
+
+@require_POST
+@user_passes_test(is_admin)
+def bulk_approval_view(request):
+    """Approve or reject the selected pending authors, or every one matching the filters, in one UPDATE"""
+    action, _, single_id = request.POST.get('action', '').partition(':')
+    if action not in ('approve', 'reject'):
+        return HttpResponseBadRequest('Unknown action')
+
+    profiles = UserProfile.objects.pending()
+    if single_id:
+        profiles = profiles.filter(pk=single_id if single_id.isdigit() else None)
+    elif request.POST.get('scope') == 'all':
+        profiles = ApprovalFilterForm(request.GET).filter(profiles.with_post_count())
+    else:
+        profiles = profiles.filter(pk__in=[pk for pk in request.POST.getlist('selected') if pk.isdigit()])
+
+    if action == 'approve':
+        count = profiles.approve()
+        message = f'Approved {count} author{"s" if count != 1 else ""}.'
+    else:
+        count = profiles.reject()
+        message = f'Rejected {count} author{"s" if count != 1 else ""}; their accounts are deactivated.'
+
+    if is_ajax(request):
+        return JsonResponse({'action': action, 'count': count, 'message': message})
+
+    messages.success(request, message)
+    return redirect(f"{reverse('admin_dashboard')}?{filter_query(request)}")
 
 
 @user_passes_test(is_admin)
 def approve_user_view(request, user_id):
-    """Approve a user to allow them to create posts"""
-    profile = get_object_or_404(UserProfile, id=user_id)
+    """Approve a user to allow them to create posts, or revoke an approval"""
+    profiles = UserProfile.objects.filter(id=user_id)
+    profile = get_object_or_404(profiles.select_related('user'))
 
     if not profile.is_approved:
-        profile.is_approved = True
-        profile.approved_at = timezone.now()
-        profile.save()
+        profiles.approve()
         messages.success(request, f'{profile.user.username} has been approved!')
     else:
-        profile.is_approved = False
-        profile.approved_at = None
-        profile.save()
+        profiles.update(is_approved=False, approved_at=None)
         messages.info(request, f'{profile.user.username} approval has been revoked.')
 
     return redirect('admin_dashboard')